@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.params
+    -----------------
+
+    Compares query-string parsing against the previous `parse_qs` based one.
+
+    Run with `python -m benchmarks.params` from the repository root.
+"""
+
+import timeit
+
+from urllib.parse import parse_qs, urlencode
+
+from emmett.datastructures import sdict
+from emmett.wrappers.helpers import parse_params
+
+
+def parse_params_legacy(data):
+    rv = sdict()
+    for key, values in parse_qs(data, keep_blank_values=True).items():
+        if len(values) == 1:
+            rv[key] = values[0]
+            continue
+        rv[key] = values
+    return rv
+
+
+def build_query(size, quoted=False):
+    params = [
+        (f"param{idx}", f"value {idx}/x" if quoted else f"value{idx}")
+        for idx in range(size)
+    ]
+    params.append(("param0", "repeated"))
+    return urlencode(params)
+
+
+def run(number=50000):
+    for size in (5, 10, 20):
+        for quoted in (False, True):
+            data = build_query(size, quoted)
+            assert parse_params(data) == parse_params_legacy(data)
+            legacy = timeit.timeit(
+                lambda: parse_params_legacy(data), number=number
+            )
+            current = timeit.timeit(lambda: parse_params(data), number=number)
+            print(
+                f"{size:>2} params{' (quoted)' if quoted else ''}: "
+                f"parse_qs {legacy / number * 1e6:.2f}us, "
+                f"parse_params {current / number * 1e6:.2f}us "
+                f"({legacy / current:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    run()
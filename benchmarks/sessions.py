@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.sessions
+    -------------------
+
+    Measures cookie sessions open/close cost per codec, and compares
+    sessions backends.
+
+    Run with `python -m benchmarks.sessions` from the repository root.
+"""
+
+import asyncio
+import tempfile
+import time
+
+from emmett import App
+from emmett.asgi.wrappers import Request
+from emmett.ctx import RequestContext, current
+from emmett.sessions import CookieSessionPipe, SessionManager
+from emmett.testing.env import ScopeBuilder
+from emmett.wrappers.response import Response
+
+
+class BenchRequestContext(RequestContext):
+    def __init__(self, cookies=None, app=None):
+        headers = [('cookie', cookies)] if cookies else []
+        scope, _ = ScopeBuilder(headers=headers).get_data()
+        self.app = app
+        self.request = Request(scope, None, None)
+        self.response = Response()
+        self.session = None
+
+
+def build_session(size):
+    return {
+        'auth': {
+            'user': {'id': 1, 'email': 'walter@massivedynamics.com'},
+            'expiration': 3600,
+            'remember': False
+        },
+        '_flashes': [['message', 'Welcome back']],
+        'items': [
+            {'id': idx, 'name': f'item {idx}', 'qty': idx % 5}
+            for idx in range(size)
+        ]
+    }
+
+
+async def cycle(pipe, cookies, modify, cold=False, app=None):
+    if cold:
+        pipe._decrypt_cache.clear()
+    token = current._init_(BenchRequestContext(cookies, app))
+    try:
+        await pipe.open_request()
+        if modify:
+            current.session.counter = (current.session.counter or 0) + 1
+        await pipe.close_request()
+        return current.response.cookies
+    finally:
+        current._close_(token)
+
+
+def serialize_cookies(cookies):
+    return "; ".join(
+        f"{key}={morsel.coded_value}" for key, morsel in cookies.items()
+    )
+
+
+async def bench(codec, size, number):
+    pipe = CookieSessionPipe('benchmark', cookie_name='bench', codec=codec)
+    token = current._init_(BenchRequestContext())
+    await pipe.open_request()
+    current.session.update(build_session(size))
+    await pipe.close_request()
+    cookies = serialize_cookies(current.response.cookies)
+    current._close_(token)
+    rv = []
+    for modify, cold in ((False, True), (False, False), (True, False)):
+        start = time.perf_counter()
+        for _ in range(number):
+            await cycle(pipe, cookies, modify, cold)
+        rv.append((time.perf_counter() - start) / number * 1e6)
+    return len(cookies), rv
+
+
+def build_backends(app):
+    yield 'cookies', lambda: SessionManager.cookies(
+        'benchmark', cookie_name='bench'
+    )
+    yield 'files', lambda: SessionManager.files(
+        cookie_name='bench', sweep_interval=0
+    )
+    yield 'memory', lambda: SessionManager.memory(cookie_name='bench')
+    yield 'memory (shared)', lambda: SessionManager.memory(
+        cookie_name='bench', shared=True, shared_name='emt_sess_bench'
+    )
+    try:
+        from redis import Redis
+        redis = Redis()
+        redis.ping()
+    except Exception as exc:
+        yield 'redis', exc
+    else:
+        yield 'redis', lambda: SessionManager.redis(redis, cookie_name='bench')
+
+
+async def bench_backend(app, builder, number):
+    token = current._init_(BenchRequestContext(app=app))
+    pipe = builder()
+    await pipe.open_request()
+    current.session.update(build_session(5))
+    await pipe.close_request()
+    cookies = serialize_cookies(current.response.cookies)
+    current._close_(token)
+    rv = []
+    for modify in (False, True):
+        start = time.perf_counter()
+        for _ in range(number):
+            await cycle(pipe, cookies, modify, app=app)
+        rv.append((time.perf_counter() - start) / number * 1e6)
+    if getattr(pipe, 'shared', False):
+        pipe.store._shm.close()
+        pipe.store._shm.unlink()
+    return rv
+
+
+def run_backends(number=500):
+    with tempfile.TemporaryDirectory() as path:
+        app = App(__name__, root_path=path)
+        for name, builder in build_backends(app):
+            if isinstance(builder, Exception):
+                print(f"{name}: skipped ({builder})")
+                continue
+            unchanged, modified = asyncio.run(
+                bench_backend(app, builder, number)
+            )
+            print(
+                f"{name}: unchanged {unchanged:.2f}us, "
+                f"modified {modified:.2f}us"
+            )
+
+
+def run(number=500):
+    for size in (5, 50):
+        for codec in ('pickle', 'json', 'msgpack'):
+            try:
+                length, (cold, unchanged, modified) = asyncio.run(
+                    bench(codec, size, number)
+                )
+            except RuntimeError as exc:
+                print(f"{size:>2} items, {codec}: skipped ({exc})")
+                continue
+            print(
+                f"{size:>2} items, {codec}: cookie {length} bytes, "
+                f"cold {cold:.2f}us, unchanged {unchanged:.2f}us, "
+                f"modified {modified:.2f}us"
+            )
+
+
+if __name__ == "__main__":
+    run()
+    run_backends()
@@ -54,6 +54,9 @@ class Config(ConfigData):
             url_default_namespace=None,
             request_max_content_length=None,
             request_body_timeout=None,
+            request_min_transfer_rate=None,
+            request_max_headers=None,
+            request_max_headers_size=None,
             response_timeout=None
         )
         self._handle_static = True
@@ -295,7 +298,8 @@ class App:
         template_folder: Optional[str] = None,
         template_path: Optional[str] = None,
         cache: Optional[RouteCacheRule] = None,
-        output: str = 'auto'
+        output: str = 'auto',
+        limits: Optional[Dict[str, Any]] = None
     ) -> RoutingCtx:
         if callable(paths):
             raise SyntaxError('Use @route(), not @route.')
@@ -312,7 +316,8 @@ class App:
             template_folder=template_folder,
             template_path=template_path,
             cache=cache,
-            output=output
+            output=output,
+            limits=limits
         )
 
     def websocket(
@@ -439,6 +444,9 @@ class App:
     def __rsgi_init__(self, loop):
         self.send_signal(Signals.after_loop, loop=loop)
 
+    def __rsgi_del__(self, loop):
+        self.send_signal(Signals.before_shutdown, loop=loop)
+
     def module(
         self,
         import_name: str,
@@ -143,6 +143,9 @@ class LifeSpanHandler(Handler):
         send: Send,
         event: Event
     ):
+        self.app.send_signal(
+            Signals.before_shutdown, loop=asyncio.get_event_loop()
+        )
         await send({'type': 'lifespan.shutdown.complete'})
 
 
@@ -320,7 +323,10 @@ class HTTPHandler(RequestHandler):
             receive,
             send,
             max_content_length=self.app.config.request_max_content_length,
-            body_timeout=self.app.config.request_body_timeout
+            body_timeout=self.app.config.request_body_timeout,
+            min_transfer_rate=self.app.config.request_min_transfer_rate,
+            max_headers=self.app.config.request_max_headers,
+            max_headers_size=self.app.config.request_max_headers_size
         )
         response = Response()
         ctx = RequestContext(self.app, request, response)
@@ -9,16 +9,12 @@
     :license: BSD-3-Clause
 """
 
-import asyncio
-
 from datetime import datetime
 from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
-from urllib.parse import parse_qs
 
 from ..datastructures import sdict
-from ..http import HTTP
 from ..utils import cachedprop
-from ..wrappers.helpers import regex_client
+from ..wrappers.helpers import parse_params, regex_client
 from ..wrappers.request import Request as _Request
 from ..wrappers.websocket import Websocket as _Websocket
 from .helpers import RequestCancelled
@@ -34,20 +30,42 @@ _push_headers = {
 
 
 class Headers(Mapping[str, str]):
-    __slots__ = ["_data"]
+    __slots__ = ["_raw", "_lookups", "_map"]
 
     def __init__(self, scope: Dict[str, Any]):
-        self._data: Dict[bytes, bytes] = {
-            key: val for key, val in scope["headers"]
-        }
+        self._raw: List[Tuple[bytes, bytes]] = scope["headers"]
+        self._lookups: Dict[str, Optional[bytes]] = {}
+        self._map: Optional[Dict[bytes, bytes]] = None
 
     __hash__ = None  # type: ignore
 
+    @property
+    def _data(self) -> Dict[bytes, bytes]:
+        if self._map is None:
+            self._map = {key: val for key, val in self._raw}
+        return self._map
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        #: scan the raw list on demand, keeping the last value of duplicates
+        try:
+            return self._lookups[key]
+        except KeyError:
+            pass
+        bkey, rv = key.lower().encode("latin-1"), None
+        for hkey, hval in self._raw:
+            if hkey == bkey:
+                rv = hval
+        self._lookups[key] = rv
+        return rv
+
     def __getitem__(self, key: str) -> str:
-        return self._data[key.lower().encode("latin-1")].decode("latin-1")
+        rv = self._lookup(key)
+        if rv is None:
+            raise KeyError(key)
+        return rv.decode("latin-1")
 
     def __contains__(self, key: str) -> bool:  # type: ignore
-        return key.lower().encode("latin-1") in self._data
+        return self._lookup(key) is not None
 
     def __iter__(self) -> Iterator[str]:
         for key in self._data.keys():
@@ -62,7 +80,7 @@ class Headers(Mapping[str, str]):
         default: Optional[Any] = None,
         cast: Optional[Callable[[Any], Any]] = None
     ) -> Any:
-        rv = self._data.get(key.lower().encode("latin-1"))
+        rv = self._lookup(key)
         rv = rv.decode() if rv is not None else default  # type: ignore
         if cast is None:
             return rv
@@ -85,33 +103,24 @@ class Headers(Mapping[str, str]):
 
 
 class Body:
-    __slots__ = ('_data', '_receive', '_max_content_length')
+    __slots__ = ('_receive',)
 
-    def __init__(self, receive, max_content_length=None):
-        self._data = bytearray()
+    def __init__(self, receive):
         self._receive = receive
-        self._max_content_length = max_content_length
-
-    def append(self, data: bytes):
-        if data == b'':
-            return
-        self._data.extend(data)
-        if (
-            self._max_content_length is not None and
-            len(self._data) > self._max_content_length
-        ):
-            raise HTTP(413, 'Request entity too large')
 
-    async def __load(self) -> bytes:
+    async def __aiter__(self):
         while True:
             event = await self._receive()
             if event['type'] == 'http.request':
-                self.append(event['body'])
+                if event['body']:
+                    yield event['body']
                 if not event.get('more_body', False):
                     break
             elif event['type'] == 'http.disconnect':
                 raise RequestCancelled
-        return bytes(self._data)
+
+    async def __load(self) -> bytes:
+        return b''.join([chunk async for chunk in self])
 
     def __await__(self):
         return self.__load().__await__()
@@ -136,15 +145,7 @@ class ASGIIngressMixin:
 
     @cachedprop
     def query_params(self) -> sdict[str, Union[str, List[str]]]:
-        rv: sdict[str, Any] = sdict()
-        for key, values in parse_qs(
-            self._scope['query_string'].decode('latin-1'), keep_blank_values=True
-        ).items():
-            if len(values) == 1:
-                rv[key] = values[0]
-                continue
-            rv[key] = values
-        return rv
+        return parse_params(self._scope['query_string'].decode('latin-1'))
 
     @cachedprop
     def client(self) -> str:
@@ -168,30 +169,31 @@ class Request(ASGIIngressMixin, _Request):
         receive: Receive,
         send: Send,
         max_content_length: Optional[int] = None,
-        body_timeout: Optional[int] = None
+        body_timeout: Optional[int] = None,
+        min_transfer_rate: Optional[int] = None,
+        max_headers: Optional[int] = None,
+        max_headers_size: Optional[int] = None
     ):
         super().__init__(scope, receive, send)
         self.max_content_length = max_content_length
         self.body_timeout = body_timeout
+        self.min_transfer_rate = min_transfer_rate
+        self.max_headers = max_headers
+        self.max_headers_size = max_headers_size
         self._now = datetime.utcnow()
         self.method = scope['method']
 
+    @property
+    def _headers_stats(self) -> Tuple[int, int]:
+        headers = self._scope['headers']
+        return len(headers), sum(len(key) + len(val) for key, val in headers)
+
     @cachedprop
     def _input(self):
-        return Body(self._receive, self.max_content_length)
+        return Body(self._receive)
 
-    @cachedprop
-    async def body(self) -> bytes:
-        if (
-            self.max_content_length and
-            self.content_length > self.max_content_length
-        ):
-            raise HTTP(413, 'Request entity too large')
-        try:
-            rv = await asyncio.wait_for(self._input, timeout=self.body_timeout)
-        except asyncio.TimeoutError:
-            raise HTTP(408, 'Request timeout')
-        return rv
+    def _input_stream(self):
+        return self._input.__aiter__()
 
     async def push_promise(self, path: str):
         if "http.response.push" not in self._scope.get("extensions", {}):
@@ -54,16 +54,59 @@ class ConfigData(sdict[KT, VT]):
 
 
 class SessionData(sdict):
-    __slots__ = ('__sid', '__hash', '__expires', '__dump')
+    #: tracks writes to flag the session as modified. Mutations of nested
+    #  objects are invisible to the flag, so `track_mutations` also keeps
+    #  a digest of the initial contents to compare against on request end.
+    __slots__ = ('__sid', '__hash', '__expires', '__dump', '__dirty')
 
-    def __init__(self, initial=None, sid=None, expires=None):
+    def __init__(self, initial=None, sid=None, expires=None, track_mutations=False):
         sdict.__init__(self, initial or ())
-        object.__setattr__(
-            self, '_SessionData__dump', pickle.dumps(sdict(self)))
-        h = hashlib.md5(self._dump).hexdigest()
+        h = None
+        if track_mutations:
+            h = hashlib.md5(pickle.dumps(sdict(self))).hexdigest()
         object.__setattr__(self, '_SessionData__sid', sid)
         object.__setattr__(self, '_SessionData__hash', h)
         object.__setattr__(self, '_SessionData__expires', expires)
+        object.__setattr__(self, '_SessionData__dump', None)
+        object.__setattr__(self, '_SessionData__dirty', False)
+
+    def _mark_modified(self):
+        object.__setattr__(self, '_SessionData__dirty', True)
+        object.__setattr__(self, '_SessionData__dump', None)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._mark_modified()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._mark_modified()
+
+    __setattr__ = __setitem__
+    __delattr__ = __delitem__
+
+    def pop(self, *args):
+        rv = dict.pop(self, *args)
+        self._mark_modified()
+        return rv
+
+    def popitem(self):
+        rv = dict.popitem(self)
+        self._mark_modified()
+        return rv
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._mark_modified()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._mark_modified()
+
+    def clear(self):
+        dict.clear(self)
+        self._mark_modified()
 
     @property
     def _sid(self):
@@ -71,10 +114,14 @@ class SessionData(sdict):
 
     @property
     def _modified(self):
+        if self.__dirty:
+            return True
+        if self.__hash is None:
+            return False
         dump = pickle.dumps(sdict(self))
-        h = hashlib.md5(dump).hexdigest()
-        if h != self.__hash:
+        if hashlib.md5(dump).hexdigest() != self.__hash:
             object.__setattr__(self, '_SessionData__dump', dump)
+            object.__setattr__(self, '_SessionData__dirty', True)
             return True
         return False
 
@@ -84,7 +131,9 @@ class SessionData(sdict):
 
     @property
     def _dump(self):
-        # note: self.__dump is updated only on _modified call
+        if self.__dump is None:
+            object.__setattr__(
+                self, '_SessionData__dump', pickle.dumps(sdict(self)))
         return self.__dump
 
     def _expires_after(self, value):
@@ -29,6 +29,7 @@ class Signals(str, Enum):
     before_database = "before_database"
     before_route = "before_route"
     before_routes = "before_routes"
+    before_shutdown = "before_shutdown"
 
 
 class listen_signal:
@@ -99,7 +99,8 @@ class BaseForm(HtmlTag):
             return
         if not hasattr(current, "session"):
             raise RuntimeError("You need sessions to use csrf in forms.")
-        current.session._csrf = current.session._csrf or CSRFStorage()
+        if not isinstance(current.session._csrf, CSRFStorage):
+            current.session._csrf = CSRFStorage(current.session._csrf or {})
 
     @property
     def _submitted(self):
@@ -171,9 +172,12 @@ class BaseForm(HtmlTag):
                 self.accepted = True
                 if self.csrf:
                     del current.session._csrf[self.input_params._csrf_token]
+                    #: reassign to flag the session as modified
+                    current.session._csrf = current.session._csrf
         # CSRF protection logic
         if self.csrf and not self.accepted:
             self.formkey = current.session._csrf.gen_token()
+            current.session._csrf = current.session._csrf
         # reset default values in form
         if (
             write_defaults and (
@@ -74,9 +74,9 @@ def stream_dbfile(db: Any, name: str):
 
 def flash(message: str, category: str = 'message'):
     #: Flashes a message to the next request.
-    if current.session._flashes is None:
-        current.session._flashes = []
-    current.session._flashes.append((category, message))
+    current.session._flashes = (
+        (current.session._flashes or []) + [(category, message)]
+    )
 
 
 def get_flashed_messages(
@@ -93,8 +93,10 @@ def get_flashed_messages(
         flashes = list(current.session._flashes or [])
         if category_filter:
             flashes = list(filter(lambda f: f[0] in category_filter, flashes))
-        for el in flashes:
-            current.session._flashes.remove(el)
+        if flashes:
+            current.session._flashes = [
+                el for el in current.session._flashes if el not in flashes
+            ]
         if not with_categories:
             return [x[1] for x in flashes]
     except Exception:
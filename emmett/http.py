@@ -11,19 +11,24 @@
 
 from __future__ import annotations
 
+import asyncio
 import errno
 import os
+import re
 import stat
 
 from email.utils import formatdate
 from hashlib import md5
-from typing import Any, AsyncIterable, BinaryIO, Dict, Generator, Iterable, Tuple
+from typing import (
+    Any, AsyncIterable, BinaryIO, Dict, Generator, Iterable, Optional, Tuple
+)
 
-from granian.rsgi import HTTPProtocol
+from granian.rsgi import HTTPProtocol, ProtocolClosed
 
 from ._internal import loop_open_file
 from .ctx import current
 from .libs.contenttype import contenttype
+from .serializers import Serializers
 
 
 status_codes = {
@@ -62,6 +67,7 @@ status_codes = {
     416: '416 REQUESTED RANGE NOT SATISFIABLE',
     417: '417 EXPECTATION FAILED',
     422: '422 UNPROCESSABLE ENTITY',
+    431: '431 REQUEST HEADER FIELDS TOO LARGE',
     500: '500 INTERNAL SERVER ERROR',
     501: '501 NOT IMPLEMENTED',
     502: '502 BAD GATEWAY',
@@ -356,6 +362,158 @@ class HTTPAiter(HTTPResponse):
             await trx.send_bytes(chunk)
 
 
+class HTTPEventStream(HTTPResponse):
+    _default_headers = {
+        'content-type': 'text/event-stream',
+        'cache-control': 'no-cache',
+        'x-accel-buffering': 'no'
+    }
+    _event_fields = ('event', 'id', 'retry')
+    _keepalive_frame = b': keepalive\n\n'
+    _re_newlines = re.compile(r'\r\n|\r|\n')
+
+    def __init__(
+        self,
+        iter: AsyncIterable[Any],
+        headers: Dict[str, str] = {},
+        cookies: Dict[str, Any] = {},
+        keepalive: Optional[float] = 15,
+        queue_size: int = 16,
+        retry: Optional[int] = None
+    ):
+        super().__init__(
+            200,
+            headers={**self._default_headers, **headers},
+            cookies=cookies
+        )
+        self.iter = iter
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self.retry = retry
+        self._receive = getattr(current.get('request'), '_receive', None)
+
+    @classmethod
+    def encode_event(cls, event: Any) -> bytes:
+        lines = []
+        if isinstance(event, dict):
+            for key in cls._event_fields:
+                value = event.get(key)
+                if value is not None:
+                    value = cls._re_newlines.sub('', str(value))
+                    lines.append(f'{key}: {value}')
+            data = event.get('data')
+        else:
+            data = event
+        if data is not None:
+            if isinstance(data, bytes):
+                data = data.decode('utf8')
+            elif not isinstance(data, str):
+                data = Serializers.get_for('json')(data)
+                if isinstance(data, bytes):
+                    data = data.decode('utf8')
+            lines.extend(
+                f'data: {line}' for line in cls._re_newlines.split(data)
+            )
+        lines.append('\n')
+        return '\n'.join(lines).encode('utf8')
+
+    async def _produce(self, queue: asyncio.Queue):
+        try:
+            async for event in self.iter:
+                await queue.put(self.encode_event(event))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put(exc)
+        else:
+            await queue.put(None)
+        finally:
+            if hasattr(self.iter, 'aclose'):
+                await self.iter.aclose()
+
+    async def _stream(self, send_chunk, closed: asyncio.Event):
+        #: the bounded queue makes the producer wait for slow clients
+        queue = asyncio.Queue(maxsize=max(self.queue_size, 1))
+        producer = asyncio.ensure_future(self._produce(queue))
+        closer = asyncio.ensure_future(closed.wait())
+        getter = None
+        try:
+            if self.retry is not None:
+                await send_chunk(self.encode_event({'retry': self.retry}))
+            while not closed.is_set():
+                if getter is None:
+                    getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    (getter, closer),
+                    timeout=self.keepalive,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if closed.is_set():
+                    break
+                if not getter.done():
+                    await send_chunk(self._keepalive_frame)
+                    continue
+                chunk, getter = getter.result(), None
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                await send_chunk(chunk)
+        finally:
+            for task in (producer, closer, getter):
+                if task is not None:
+                    task.cancel()
+
+    async def _watch_disconnect(self, closed: asyncio.Event):
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                closed.set()
+                return
+
+    async def asgi(self, scope, send):
+        await self._send_headers(send)
+        closed = asyncio.Event()
+        watcher = (
+            asyncio.ensure_future(self._watch_disconnect(closed))
+            if self._receive else None
+        )
+
+        async def send_chunk(chunk):
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True
+            })
+
+        try:
+            await self._stream(send_chunk, closed)
+        finally:
+            if watcher:
+                watcher.cancel()
+        if not closed.is_set():
+            await send({
+                'type': 'http.response.body',
+                'body': b'',
+                'more_body': False
+            })
+
+    async def rsgi(self, protocol: HTTPProtocol):
+        trx = protocol.response_stream(
+            self.status_code,
+            list(self.rsgi_headers)
+        )
+        closed = asyncio.Event()
+
+        async def send_chunk(chunk):
+            try:
+                await trx.send_bytes(chunk)
+            except ProtocolClosed:
+                closed.set()
+
+        await self._stream(send_chunk, closed)
+
+
 def redirect(location: str, status_code: int = 303):
     response = current.response
     response.status = status_code
@@ -24,7 +24,12 @@ from .adapters import (
     _push_transaction,
     _pop_transaction,
     _transaction_depth,
-    _top_transaction
+    _top_transaction,
+    _server_side_cursor,
+    _execute_server_side,
+    _close_server_side_cursors,
+    _execute_with_params,
+    _execute_statement
 )
 from .connection import (
     ConnectionManager,
@@ -34,6 +39,7 @@ from .connection import (
     _connect_loop,
     _close_sync,
     _close_loop,
+    _run_loop,
     _connection_getter,
     _connection_setter,
     _cursors_getter,
@@ -51,6 +57,13 @@ def _patch_adapter_cls():
     setattr(BaseAdapter, 'top_transaction', _top_transaction)
     setattr(BaseAdapter, '_connection_manager_cls', PooledConnectionManager)
     setattr(BaseAdapter, 'begin', _begin)
+    setattr(BaseAdapter, '_server_side_cursor', _server_side_cursor)
+    setattr(BaseAdapter, 'execute_server_side', _execute_server_side)
+    setattr(
+        BaseAdapter, 'close_server_side_cursors', _close_server_side_cursors
+    )
+    setattr(BaseAdapter, '_execute_with_params', _execute_with_params)
+    setattr(BaseAdapter, '_execute_statement', _execute_statement)
     setattr(SQLite, '_connection_manager_cls', ConnectionManager)
 
 
@@ -60,6 +73,7 @@ def _patch_adapter_connection():
     setattr(ConnectionPool, 'reconnect_loop', _connect_loop)
     setattr(ConnectionPool, 'close', _close_sync)
     setattr(ConnectionPool, 'close_loop', _close_loop)
+    setattr(ConnectionPool, 'run_loop', _run_loop)
     setattr(
         ConnectionPool,
         'connection',
@@ -12,6 +12,7 @@
 import sys
 
 from functools import wraps
+from itertools import groupby
 
 from pydal.adapters.base import SQLAdapter
 from pydal.adapters.mssql import (
@@ -31,10 +32,13 @@ from pydal.adapters.postgres import (
     PostgrePG8000New
 )
 from pydal.helpers.classes import SQLALL
+from pydal.helpers.methods import use_common_filters
 from pydal.helpers.regex import REGEX_TABLE_DOT_FIELD
+from pydal.objects import Field as _Field, Query, Table as _Table
 from pydal.parsers import ParserMethodWrapper, for_type as _parser_for_type
 from pydal.representers import TReprMethodWrapper, for_type as _representer_for_type
 
+from ..cache import CacheHandler
 from .engines import adapters
 from .helpers import GeoFieldWrapper, PasswordFieldWrapper, typed_row_reference
 from .objects import Expression, Field, Row, IterRows
@@ -69,6 +73,7 @@ def patch_adapter(adapter):
         _expand_all_with_concrete_tables, adapter
     )
     adapter._parse = _wrap_on_obj(_parse, adapter)
+    adapter._parse_many = _wrap_on_obj(_parse_many, adapter)
     adapter._parse_expand_colnames = _wrap_on_obj(_parse_expand_colnames, adapter)
     adapter.iterparse = _wrap_on_obj(iterparse, adapter)
     adapter.parse = _wrap_on_obj(parse, adapter)
@@ -82,7 +87,12 @@ def patch_adapter(adapter):
     adapter._select_wcols_inner = adapter._select_wcols
     adapter._select_wcols = _wrap_on_obj(_select_wcols, adapter)
     adapter.insert = _wrap_on_obj(insert, adapter)
+    adapter.bulk_insert = _wrap_on_obj(bulk_insert, adapter)
+    adapter.upsert = _wrap_on_obj(upsert, adapter)
+    adapter.bulk_update = _wrap_on_obj(bulk_update, adapter)
     adapter.iterselect = _wrap_on_obj(iterselect, adapter)
+    adapter.select = _wrap_on_obj(select, adapter)
+    adapter.count = _wrap_on_obj(count, adapter)
     patch_dialect(adapter.dialect)
 
 
@@ -94,6 +104,14 @@ def patch_dialect(dialect):
     dialect.create_table = _wrap_on_obj(
         _create_table_map.get(dialect.adapter.dbengine, _create_table), dialect
     )
+    _upsert_map = {
+        'postgres': _upsert,
+        'sqlite': _upsert,
+        'mysql': _upsert_mysql
+    }
+    dialect.upsert = _wrap_on_obj(
+        _upsert_map.get(dialect.adapter.dbengine, _upsert_unsupported), dialect
+    )
     dialect.add_foreign_key_constraint = _wrap_on_obj(_add_fk_constraint, dialect)
     dialect.drop_constraint = _wrap_on_obj(_drop_constraint, dialect)
 
@@ -150,6 +168,204 @@ def insert(adapter, table, fields):
     return rid
 
 
+def _insert_ids(table, items, rows):
+    if not table._id:
+        return [
+            typed_row_reference({
+                field.name: val for field, val in fields
+                if field.name in table._primarykey
+            } or None, table) for fields in items
+        ]
+    if table._id.type == 'id':
+        return [typed_row_reference(row[0], table) for row in rows]
+    return [
+        typed_row_reference(
+            {field.name: val for field, val in fields}.get(table._id.name),
+            table
+        ) for fields in items
+    ]
+
+
+def bulk_insert(adapter, table, items, returning=False):
+    #: consecutive rows sharing the same columns go in a single statement
+    fetch_ids = (
+        returning and table._id is not None and table._id.type == 'id'
+    )
+    if fetch_ids and not getattr(adapter, 'supports_returning', False):
+        return [adapter.insert(table, fields) for fields in items]
+    rv = [] if returning else 0
+    for columns, group in groupby(
+        items, key=lambda fields: tuple(field.name for field, _ in fields)
+    ):
+        group = list(group)
+        if not columns:
+            ids = [adapter.insert(table, fields) for fields in group]
+            if returning:
+                rv.extend(ids)
+            else:
+                rv += len(group)
+            continue
+        adapter.execute(
+            "INSERT INTO %s(%s) VALUES %s%s;" % (
+                table._rname,
+                ','.join(field._rname for field, _ in group[0]),
+                ','.join(
+                    '(%s)' % ','.join(
+                        adapter.expand(val, field.type)
+                        for field, val in fields
+                    ) for fields in group
+                ),
+                f" RETURNING {table._id._rname}" if fetch_ids else ""
+            )
+        )
+        rows = adapter.cursor.fetchall() if fetch_ids else []
+        if returning:
+            rv.extend(_insert_ids(table, group, rows))
+        else:
+            rv += len(group)
+    return rv
+
+
+def upsert(adapter, table, items, conflict, update):
+    rv = 0
+    for columns, group in groupby(
+        items, key=lambda fields: tuple(field.name for field, _ in fields)
+    ):
+        group = list(group)
+        adapter.execute(
+            adapter.dialect.upsert(
+                table._rname,
+                [field._rname for field, _ in group[0]],
+                [
+                    '(%s)' % ','.join(
+                        adapter.expand(val, field.type)
+                        for field, val in fields
+                    ) for fields in group
+                ],
+                [field._rname for field in conflict],
+                [field._rname for field in update if field.name in columns]
+            )
+        )
+        rv += adapter.cursor.rowcount
+    return rv
+
+
+def bulk_update(adapter, table, query, items):
+    #: every column gets a `CASE` on the primary key, so records not
+    #  involved in the column update keep their current value
+    key = table._id
+    query_env = dict(current_scope=[table._tablename])
+    columns = {}
+    for key_value, fields in items:
+        for field, val in fields:
+            columns.setdefault(field.name, (field, []))[1].append(
+                (key_value, val)
+            )
+    sql_v = ','.join(
+        '%s=CASE %s %s ELSE %s END' % (
+            field._rname,
+            key._rname,
+            ' '.join(
+                'WHEN %s THEN %s' % (
+                    adapter.expand(key_value, key.type, query_env=query_env),
+                    adapter.expand(val, field.type, query_env=query_env)
+                ) for key_value, val in values
+            ),
+            field._rname
+        ) for field, values in columns.values()
+    )
+    query = query & key.belongs([key_value for key_value, _ in items])
+    if use_common_filters(query):
+        query = adapter.common_filter(query, [table])
+    adapter.execute(
+        adapter.dialect.update(
+            table, sql_v, adapter.expand(query, query_env=query_env)
+        )
+    )
+    return adapter.cursor.rowcount
+
+
+def select(adapter, query, fields, attributes):
+    cache = attributes.get('cache', None)
+    if cache and (
+        attributes.get('cacheable', False) or
+        not isinstance(cache[0], CacheHandler)
+    ):
+        #: pyDAL cache models, keyed on the statement with no invalidation
+        colnames, sql = adapter._select_wcols(query, fields, **attributes)
+        return adapter._cached_select(
+            cache, sql, fields, attributes, colnames
+        )
+    cache = attributes.pop('cache', None)
+    if cache is not None:
+        #: results depend on every table involved, not just the selected ones
+        tablenames = list(_involved_tablenames(
+            query,
+            fields,
+            attributes.get('join', None),
+            attributes.get('left', None),
+            attributes.get('orderby', None),
+            attributes.get('groupby', None)
+        ))
+        #: skip the cache on tables with changes not committed yet
+        changed = any(
+            txn._changed_tables.intersection(tablenames)
+            for txn in adapter._connection_manager.state.transactions
+        )
+        cache = None if changed else (cache, tablenames)
+    reader = _reader(adapter, attributes)
+    statements = adapter.db._statements_cache
+    if statements is not None:
+        statement, params = statements.get(adapter, query, fields, attributes)
+        if statement is not None:
+            return adapter._select_aux(
+                statement.sql, fields, attributes, statement.colnames,
+                statement=statement, params=params, cache=cache,
+                reader=reader
+            )
+    colnames, sql = adapter._select_wcols(query, fields, **attributes)
+    return adapter._select_aux(
+        sql, fields, attributes, colnames, cache=cache, reader=reader
+    )
+
+
+def _involved_tablenames(*items):
+    #: unlike `adapter.tables`, walks lists, joined tables and `ALL` fields,
+    #  resolving aliases to the real tables
+    rv = set()
+    for item in items:
+        if isinstance(item, (list, tuple)):
+            rv.update(_involved_tablenames(*item))
+        elif isinstance(item, _Table):
+            rv.add(item._dalname)
+        elif isinstance(item, SQLALL):
+            rv.add(item._table._dalname)
+        elif isinstance(item, _Field):
+            if getattr(item, 'table', None) is not None:
+                rv.add(item.table._dalname)
+        elif isinstance(item, (Expression, Query)):
+            rv.update(_involved_tablenames(item.first, item.second))
+        elif isinstance(item, str):
+            match = REGEX_TABLE_DOT_FIELD.match(item)
+            if match:
+                rv.add(match.group(1))
+    return rv
+
+
+def _reader(adapter, attributes):
+    #: the adapter to run read statements on, replicas when available
+    replicas = adapter.db._replicas
+    if replicas is None or attributes.get('for_update', False):
+        return adapter
+    return replicas.route(adapter)
+
+
+def count(adapter, query, distinct=None):
+    reader = _reader(adapter, {})
+    reader.execute(adapter._count(query, distinct))
+    return reader.cursor.fetchone()[0]
+
+
 def iterselect(adapter, query, fields, attributes):
     colnames, sql = adapter._select_wcols(query, fields, **attributes)
     return adapter.iterparse(sql, fields, colnames, **attributes)
@@ -211,8 +427,25 @@ def _select_wcols(
     )
 
 
-def _select_aux(adapter, sql, fields, attributes, colnames):
-    rows = adapter._select_aux_execute(sql)
+def _select_rows(adapter, sql, statement=None, params=None):
+    if statement is None:
+        return adapter._select_aux_execute(sql)
+    return adapter._execute_statement(statement, params).fetchall()
+
+
+def _select_aux(
+    adapter, sql, fields, attributes, colnames, statement=None, params=None,
+    cache=None, reader=None
+):
+    reader = reader or adapter
+    if cache is None:
+        rows = _select_rows(reader, sql, statement, params)
+    else:
+        cache, tablenames = cache
+        rows = adapter.db._query_cache.fetch(
+            cache, tablenames, sql, params,
+            lambda: _select_rows(reader, sql, statement, params)
+        )
     if isinstance(rows, tuple):
         rows = list(rows)
     limitby = attributes.get('limitby', None) or (0,)
@@ -227,18 +460,16 @@ def _select_aux(adapter, sql, fields, attributes, colnames):
 
 def parse(adapter, rows, fields, colnames, **options):
     fdata, tables = _parse_expand_colnames(adapter, fields)
-    new_rows = [
-        _parse(
-            adapter,
-            row,
-            fdata,
-            tables,
-            options['concrete_tables'],
-            fields,
-            colnames,
-            options.get('blob_decode', True)
-        ) for row in rows
-    ]
+    new_rows = _parse_many(
+        adapter,
+        rows,
+        fdata,
+        tables,
+        options['concrete_tables'],
+        fields,
+        colnames,
+        options.get('blob_decode', True)
+    )
     rowsobj = adapter.db.Rows(adapter.db, new_rows, colnames, rawrows=rows)
     return rowsobj
 
@@ -249,7 +480,10 @@ def iterparse(adapter, sql, fields, colnames, **options):
         sql,
         fields,
         options.get('_concrete_tables', []),
-        colnames
+        colnames,
+        fetch_size=options.get('fetch_size'),
+        server_side=options.get('server_side', False),
+        itersize=options.get('itersize')
     )
 
 
@@ -305,6 +539,67 @@ def _parse(adapter, row, fdata, tables, concrete_tables, fields, colnames, blob_
     return new_row
 
 
+def _value_parser(adapter, fit, ft, blob_decode):
+    #: resolve the parser upfront, avoiding pyDAL lookups on every value
+    if not isinstance(ft, str):
+        return lambda value: adapter.parse_value(value, fit, ft, blob_decode)
+    if (ft == 'blob' and not blob_decode) or fit not in adapter.parser.registered:
+        return None
+    parser = adapter.parser.registered[fit]
+    return lambda value: value if value is None else parser(value, ft)
+
+
+def _parse_many(
+    adapter, rows, fdata, tables, concrete_tables, fields, colnames, blob_decode
+):
+    #: columns parsing data gets computed once for the whole batch
+    columns = []
+    for (idx, colname) in enumerate(colnames):
+        fd = fdata[idx]
+        if fd:
+            (tablename, fieldname, table, field, ft, fit) = fd
+            columns.append((
+                idx, tablename, fieldname,
+                _value_parser(adapter, fit, ft, blob_decode),
+                field.filter_out, None
+            ))
+            continue
+        new_column_name = adapter._regex_select_as_parser(colname)
+        columns.append((
+            idx, None, colname,
+            _value_parser(
+                adapter, fields[idx]._itype, fields[idx].type, blob_decode
+            ),
+            None,
+            new_column_name.groups(0)[0] if new_column_name is not None
+            else None
+        ))
+    rv = []
+    for row in rows:
+        new_row, rows_cls, rows_accum = _build_newrow_wtables(
+            adapter, tables, concrete_tables
+        )
+        extras = adapter.db.Row()
+        for idx, tablename, name, parser, filter_out, alias in columns:
+            value = row[idx]
+            if parser is not None:
+                value = parser(value)
+            if tablename is not None:
+                if filter_out:
+                    value = filter_out(value)
+                rows_accum[tablename][name] = value
+                continue
+            extras[name] = value
+            if alias is not None:
+                new_row[alias] = value
+        for key, val in rows_cls.items():
+            new_row[key] = val._from_engine(rows_accum[key])
+        if extras:
+            new_row['_extra'] = extras
+        rv.append(new_row)
+    return rv
+
+
 def _build_newrow_wtables(adapter, tables, concrete_tables):
     row, cls_map, accum = adapter.db.Row(), {}, {}
     for name, table in tables.items():
@@ -347,6 +642,36 @@ def _create_table_firebird(dialect, tablename, fields):
     return rv
 
 
+def _upsert(dialect, tablename, fields, values, conflict, update):
+    if update:
+        action = 'DO UPDATE SET %s' % ','.join(
+            '%s=EXCLUDED.%s' % (field, field) for field in update
+        )
+    else:
+        action = 'DO NOTHING'
+    return 'INSERT INTO %s(%s) VALUES %s ON CONFLICT (%s) %s;' % (
+        tablename, ','.join(fields), ','.join(values), ','.join(conflict),
+        action
+    )
+
+
+def _upsert_mysql(dialect, tablename, fields, values, conflict, update):
+    if not update:
+        return 'INSERT IGNORE INTO %s(%s) VALUES %s;' % (
+            tablename, ','.join(fields), ','.join(values)
+        )
+    return 'INSERT INTO %s(%s) VALUES %s ON DUPLICATE KEY UPDATE %s;' % (
+        tablename, ','.join(fields), ','.join(values),
+        ','.join('%s=VALUES(%s)' % (field, field) for field in update)
+    )
+
+
+def _upsert_unsupported(dialect, *args, **kwargs):
+    raise NotImplementedError(
+        f"Upserts are not supported on {dialect.adapter.dbengine}"
+    )
+
+
 def _add_fk_constraint(
     dialect,
     name,
@@ -405,8 +730,13 @@ def _initialize(adapter, *args, **kwargs):
     adapter._find_work_folder()
     adapter._connection_manager.configure(
         max_connections=adapter.db._pool_size,
+        min_connections=adapter.db._pool_min_size,
+        prepared_size=adapter.db._prepared_statements,
         connect_timeout=adapter.db._connect_timeout,
-        stale_timeout=adapter.db._keep_alive_timeout)
+        stale_timeout=adapter.db._keep_alive_timeout,
+        max_lifetime=adapter.db._pool_max_lifetime,
+        idle_timeout=adapter.db._pool_idle_timeout,
+        pre_ping=adapter.db._pool_pre_ping)
 
 
 def _begin(adapter):
@@ -432,3 +762,74 @@ def _transaction_depth(adapter):
 def _top_transaction(adapter):
     if adapter._connection_manager.state.transactions:
         return adapter._connection_manager.state.transactions[-1]
+
+
+def _execute_with_params(adapter, sql, params):
+    #: expose parameters to execution handlers
+    stats = adapter.db._adapter._connection_manager.state.execution
+    if stats is not None:
+        stats.params = params
+    try:
+        adapter.execute(sql, params)
+    finally:
+        if stats is not None:
+            stats.params = None
+    return adapter.cursor
+
+
+def _execute_statement(adapter, statement, params):
+    return adapter._execute_with_params(statement.sql, params)
+
+
+class ServerSideCursor:
+    __slots__ = ['connection', 'cursor', 'available']
+
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.cursor = cursor
+        self.available = False
+
+    def lock(self):
+        self.available = False
+
+    def release(self):
+        #: server-side cursors are bound to their statement
+        pass
+
+
+def _server_side_cursor(adapter, itersize):
+    #: unbuffered cursors stream rows on MySQL drivers, while other engines
+    #  fallback to a dedicated standard cursor
+    cursors = getattr(adapter.driver, 'cursors', None)
+    if adapter.dbengine == 'mysql' and hasattr(cursors, 'SSCursor'):
+        return adapter.connection.cursor(cursors.SSCursor)
+    return adapter.connection.cursor()
+
+
+def _execute_server_side(adapter, sql, itersize):
+    cursor = adapter._server_side_cursor(itersize)
+    adapter.cursors[id(cursor)] = ServerSideCursor(adapter.connection, cursor)
+    command = adapter.filter_sql_command(sql)
+    handlers = adapter._build_handlers_for_execution()
+    for handler in handlers:
+        handler.before_execute(command)
+    try:
+        cursor.execute(command)
+    except Exception:
+        adapter.close_cursor(cursor)
+        raise
+    for handler in handlers:
+        handler.after_execute(command)
+    return cursor
+
+
+def _close_server_side_cursors(adapter):
+    #: server-side cursors don't survive the end of their transaction
+    for handler in list(adapter.cursors.values()):
+        if not isinstance(handler, ServerSideCursor):
+            continue
+        try:
+            handler.cursor.close()
+        except Exception:
+            pass
+        del adapter.cursors[id(handler.cursor)]
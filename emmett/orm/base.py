@@ -17,7 +17,6 @@ import threading
 
 from functools import wraps
 from pydal import DAL as _pyDAL
-from pydal._globals import THREAD_LOCAL
 
 from ..datastructures import sdict
 from ..extensions import Signals
@@ -25,9 +24,14 @@ from ..pipeline import Pipe
 from ..security import uuid as _uuid
 from ..serializers import _json_default, xml
 from .adapters import patch_adapter
+from .caching import QueryCache
 from .objects import Table, Field, Set, Row, Rows
-from .helpers import ConnectionContext, TimingHandler
+from .helpers import (
+    ConnectionContext, IdentityMap, MonitorHandler, TimingHandler
+)
 from .models import MetaModel, Model
+from .replicas import ReplicaRouter, _use_primary
+from .statements import StatementCache
 from .transactions import _atomic, _transaction, _savepoint
 
 
@@ -39,10 +43,16 @@ class DatabasePipe(Pipe):
         await self.db.connection_open_loop()
 
     async def on_pipe_success(self):
-        self.db.commit()
+        if self.db._pipe_commit_async:
+            await self.db.commit_async()
+        else:
+            self.db.commit()
 
     async def on_pipe_failure(self):
-        self.db.rollback()
+        if self.db._pipe_commit_async:
+            await self.db.rollback_async()
+        else:
+            self.db.rollback()
 
     async def close(self):
         await self.db.connection_close_loop()
@@ -87,8 +97,20 @@ class Database(_pyDAL):
         app,
         config=None,
         pool_size=None,
+        pool_min_size=0,
+        pool_max_lifetime=0,
+        pool_idle_timeout=0,
+        pool_pre_ping=False,
         keep_alive_timeout=3600,
         connect_timeout=60,
+        statement_cache_size=0,
+        prepared_statements=0,
+        identity_map=False,
+        query_cache=None,
+        replicas=None,
+        replica_selection='round_robin',
+        replica_sticky_window=0,
+        pipe_commit_async=False,
         folder=None,
         **kwargs
     ):
@@ -129,35 +151,127 @@ class Database(_pyDAL):
                     os.mkdir(folder)
         #: set pool_size
         pool_size = self.config.pool_size or pool_size or 5
+        self._pool_min_size = self.config.pool_min_size or pool_min_size
+        self._pool_max_lifetime = (
+            self.config.pool_max_lifetime or pool_max_lifetime)
+        self._pool_idle_timeout = (
+            self.config.pool_idle_timeout or pool_idle_timeout)
+        self._pool_pre_ping = self.config.get('pool_pre_ping', pool_pre_ping)
         self._keep_alive_timeout = (
             keep_alive_timeout if self.config.keep_alive_timeout is None
             else self.config.keep_alive_timeout)
         self._connect_timeout = (
             connect_timeout if self.config.connect_timeout is None
             else self.config.connect_timeout)
-        #: add timings storage if requested
+        #: setup compiled statements cache if requested, prepared
+        #  statements rely on it
+        self._prepared_statements = (
+            self.config.prepared_statements or prepared_statements)
+        statement_cache_size = (
+            self.config.statement_cache_size or statement_cache_size or
+            (500 if self._prepared_statements else 0))
+        self._statements_cache = (
+            StatementCache(statement_cache_size) if statement_cache_size
+            else None)
+        self._use_identity_map = self.config.get(
+            'identity_map', identity_map)
+        query_cache = self.config.query_cache or query_cache
+        if query_cache is not None and not isinstance(
+            query_cache, (list, tuple)
+        ):
+            query_cache = [query_cache]
+        self._query_cache = QueryCache(query_cache)
+        #: commits of the pipe run in the connection thread, off the loop
+        self._pipe_commit_async = self.config.get(
+            'pipe_commit_async', pipe_commit_async)
+        #: add timings storage and queries monitoring if requested
+        self.execution_handlers = list(self.execution_handlers)
         if config.store_execution_timings:
             self.execution_handlers.append(TimingHandler)
+        if config.slow_query_threshold or config.query_budget:
+            self.execution_handlers.append(MonitorHandler)
         #: finally setup pyDAL instance
         super(Database, self).__init__(
             self.config.uri, pool_size, folder, **kwargs)
         patch_adapter(self._adapter)
+        #: setup read replicas, every one with its own connections pool
+        replicas = self.config.replicas or replicas
+        self._replicas = ReplicaRouter.from_config(
+            self,
+            replicas,
+            strategy=self.config.replica_selection or replica_selection,
+            sticky_window=(
+                self.config.replica_sticky_window or replica_sticky_window)
+        ) if replicas else None
+        if (
+            self._pool_min_size or
+            self._pool_max_lifetime or
+            self._pool_idle_timeout
+        ):
+            self._pool_tasks = []
+            app._extensions_listeners[Signals.after_loop].append(
+                self._start_pool_tasks
+            )
         Model._init_inheritable_dicts_()
         app.send_signal(Signals.after_database, database=self)
 
+    def _start_pool_tasks(self, loop):
+        adapters = [self._adapter]
+        if self._replicas is not None:
+            adapters.extend(self._replicas.adapters)
+        for adapter in adapters:
+            manager = adapter._connection_manager
+            self._pool_tasks.append(loop.create_task(manager.prewarm_loop()))
+            if self._pool_max_lifetime or self._pool_idle_timeout:
+                self._pool_tasks.append(
+                    loop.create_task(manager.reap_loop()))
+
+    def pool_stats(self):
+        return self._adapter._connection_manager.stats()
+
+    def replicas_pool_stats(self):
+        if self._replicas is None:
+            return []
+        return self._replicas.stats()
+
+    def invalidate_statements(self):
+        if self._statements_cache is not None:
+            self._statements_cache.clear()
+        self._adapter._connection_manager.invalidate_prepared()
+
+    def statement_cache_stats(self):
+        if self._statements_cache is None:
+            return None
+        return self._statements_cache.stats()
+
     @property
     def pipe(self):
         return DatabasePipe(self)
 
+    @property
+    def identity_map(self):
+        if not self._use_identity_map:
+            return None
+        state = self._adapter._connection_manager.state
+        if state.connection is None:
+            return None
+        rv = state.identity
+        if rv is None:
+            rv = state.identity = IdentityMap()
+        return rv
+
     @property
     def execution_timings(self):
-        return getattr(THREAD_LOCAL, '_emtdal_timings_', [])
+        stats = self._adapter._connection_manager.state.execution
+        return stats.timings if stats is not None else []
 
     def connection_open(self, with_transaction=True, reuse_if_open=True):
         return self._adapter.reconnect(
             with_transaction=with_transaction, reuse_if_open=reuse_if_open)
 
     def connection_close(self):
+        if self._replicas is not None:
+            self._replicas.close()
         self._adapter.close()
 
     def connection(
@@ -171,12 +285,19 @@ class Database(_pyDAL):
             reuse_if_open=reuse_if_open
         )
 
-    def connection_open_loop(self, with_transaction=True, reuse_if_open=True):
-        return self._adapter.reconnect_loop(
+    async def connection_open_loop(
+        self, with_transaction=True, reuse_if_open=True
+    ):
+        rv = await self._adapter.reconnect_loop(
             with_transaction=with_transaction, reuse_if_open=reuse_if_open)
+        if self._replicas is not None:
+            await self._replicas.open_loop()
+        return rv
 
-    def connection_close_loop(self):
-        return self._adapter.close_loop()
+    async def connection_close_loop(self):
+        if self._replicas is not None:
+            await self._replicas.close_loop()
+        return await self._adapter.close_loop()
 
     def define_models(self, *models):
         if len(models) == 1 and isinstance(models[0], (list, tuple)):
@@ -246,6 +367,13 @@ class Database(_pyDAL):
     def savepoint(self):
         return _savepoint(self._adapter)
 
+    def use(self, target):
+        if target != 'primary':
+            raise ValueError(
+                f"Invalid database target '{target}', only 'primary' "
+                "can be forced")
+        return _use_primary(self._replicas)
+
     def commit(self):
         txn = self._adapter.top_transaction()
         if txn:
@@ -256,6 +384,15 @@ class Database(_pyDAL):
         if txn:
             txn.rollback()
 
+    def run_async(self, f, *args, **kwargs):
+        return self._adapter.run_loop(f, *args, **kwargs)
+
+    def commit_async(self):
+        return self.run_async(self.commit)
+
+    def rollback_async(self):
+        return self.run_async(self.rollback)
+
 
 def _Database_unpickler(db_uid):
     fake_app_obj = sdict(config=sdict(db=sdict()))
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+    emmett.orm.caching
+    ------------------
+
+    Provides selections results cache on top of Emmett cache handlers.
+
+    :copyright: 2014 Giovanni Barillari
+    :license: BSD-3-Clause
+"""
+
+import hashlib
+import threading
+import uuid
+
+
+class QueryCache:
+    key_prefix = 'emt_orm_q:'
+    version_prefix = 'emt_orm_v:'
+
+    def __init__(self, handlers=None):
+        #: handlers given upfront get invalidated even before being used
+        #  for selections by this process
+        self.handlers = list(handlers or [])
+        self._lock = threading.Lock()
+
+    def _register(self, handler):
+        with self._lock:
+            if not any(item is handler for item in self.handlers):
+                self.handlers.append(handler)
+
+    @staticmethod
+    def _new_version():
+        return uuid.uuid4().hex
+
+    def _versions(self, handler, tablenames):
+        #: every table gets a version stored in the handler itself, so
+        #  invalidations are seen also by other processes sharing it
+        rv = []
+        for tablename in sorted(tablenames):
+            key = self.version_prefix + tablename
+            version = handler.get(key)
+            if version is None:
+                version = self._new_version()
+                handler.set(key, version, None)
+            rv.append(version)
+        return rv
+
+    def key(self, handler, tablenames, sql, params):
+        data = '\x00'.join(
+            [sql, repr(params)] + self._versions(handler, tablenames)
+        )
+        return self.key_prefix + hashlib.sha1(
+            data.encode('utf8')
+        ).hexdigest()
+
+    def fetch(self, cache, tablenames, sql, params, loader):
+        handler, duration = cache
+        self._register(handler)
+        key = self.key(handler, tablenames, sql, params)
+        rows = handler.get(key)
+        if rows is None:
+            rows = list(loader())
+            handler.set(key, rows, duration)
+        return list(rows)
+
+    def invalidate(self, tablenames):
+        if not tablenames:
+            return
+        for handler in list(self.handlers):
+            for tablename in tablenames:
+                handler.set(
+                    self.version_prefix + tablename, self._new_version(), None
+                )
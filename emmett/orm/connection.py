@@ -14,28 +14,38 @@
 """
 
 import asyncio
+import bisect
 import contextvars
-import heapq
+import random
 import threading
 import time
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 from ..ctx import current
+from ..datastructures import sdict
 from ..utils import cachedprop
 from .errors import MaxConnectionsExceeded
+from .helpers import ExecutionStats
 from .transactions import _transaction
 
 
 class ConnectionStateCtxVars:
-    __slots__ = ('_connection', '_transactions', '_cursors', '_closed')
+    __slots__ = (
+        '_connection', '_transactions', '_cursors', '_closed', '_execution',
+        '_identity'
+    )
 
     def __init__(self):
         self._connection = contextvars.ContextVar('_emt_orm_cs_connection')
         self._transactions = contextvars.ContextVar('_emt_orm_cs_transactions')
         self._cursors = contextvars.ContextVar('_emt_orm_cs_cursors')
         self._closed = contextvars.ContextVar('_emt_orm_cs_closed')
+        self._execution = contextvars.ContextVar(
+            '_emt_orm_cs_execution', default=None)
+        self._identity = contextvars.ContextVar('_emt_orm_cs_identity')
         self.reset()
 
     @property
@@ -54,11 +64,26 @@ class ConnectionStateCtxVars:
     def closed(self):
         return self._closed.get()
 
+    @property
+    def execution(self):
+        return self._execution.get()
+
+    @property
+    def identity(self):
+        return self._identity.get()
+
+    @identity.setter
+    def identity(self, value):
+        self._identity.set(value)
+
     def __set(self, connection, closed):
         self._connection.set(connection)
+        self._identity.set(None)
         self._transactions.set([])
         self._cursors.set(OrderedDict())
         self._closed.set(closed)
+        if not closed:
+            self._execution.set(ExecutionStats())
 
     def set_connection(self, connection):
         self.__set(connection, False)
@@ -68,9 +93,13 @@ class ConnectionStateCtxVars:
 
 
 class ConnectionState:
-    __slots__ = ('_connection', '_transactions', '_cursors', '_closed')
+    __slots__ = (
+        '_connection', '_transactions', '_cursors', '_closed', 'execution',
+        'identity'
+    )
 
     def __init__(self, connection=None):
+        self.execution = None
         self.connection = connection
         self._transactions = []
         self._cursors = OrderedDict()
@@ -83,6 +112,12 @@ class ConnectionState:
     def connection(self, value):
         self._connection = value
         self._closed = not bool(value)
+        #: executed statements stats are scoped to the connection, and
+        #  kept after close until a new one gets opened
+        if value:
+            self.execution = ExecutionStats()
+        #: loaded records never outlive the connection
+        self.identity = None
 
 
 class ConnectionStateCtl:
@@ -122,6 +157,18 @@ class ConnectionStateCtl:
     def closed(self):
         return self.ctx._closed
 
+    @property
+    def execution(self):
+        return self.ctx.execution
+
+    @property
+    def identity(self):
+        return self.ctx.identity
+
+    @identity.setter
+    def identity(self, value):
+        self.ctx.identity = value
+
     def set_connection(self, connection):
         self.ctx.connection = connection
 
@@ -138,6 +185,7 @@ class ConnectionManager:
     def __init__(self, adapter, **kwargs):
         self.adapter = adapter
         self.state = self.__class__.state_cls()
+        self.executors = {}
 
     def configure(self, **kwargs):
         for key, value in kwargs.items():
@@ -156,14 +204,25 @@ class ConnectionManager:
         return self._connector_sync(), True
 
     async def _connection_open_loop(self):
-        return (
-            await self._loop.run_in_executor(
-                None, self._connector_loop
-            ),
-            True
+        future = self._loop.run_in_executor(None, self._connector_loop)
+        try:
+            connection = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._connection_open_cancelled)
+            raise
+        return connection, True
+
+    def _connection_open_cancelled(self, future):
+        #: connector threads can't be interrupted, so the connections they
+        #  open once the caller got cancelled have to be closed
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._loop.run_in_executor(
+            None, self._connection_close_sync, future.result()
         )
 
     def _connection_close_sync(self, connection, *args, **kwargs):
+        self._executor_shutdown(connection)
         try:
             connection.close()
         except Exception:
@@ -174,8 +233,47 @@ class ConnectionManager:
             None, partial(self._connection_close_sync, connection)
         )
 
-    connect_sync = _connection_open_sync
-    connect_loop = _connection_open_loop
+    def executor(self, connection):
+        #: every connection gets its own thread, so that its statements
+        #  get serialized as DB-API drivers expect
+        key = id(connection)
+        if key not in self.executors:
+            self.executors[key] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='emmett_orm'
+            )
+        return self.executors[key]
+
+    def _executor_shutdown(self, connection):
+        executor = self.executors.pop(id(connection), None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def prewarm_sync(self):
+        pass
+
+    async def prewarm_loop(self):
+        pass
+
+    def reap(self):
+        return 0
+
+    async def reap_loop(self):
+        pass
+
+    def stats(self):
+        return None
+
+    def prepared_statements(self, connection):
+        return None, False
+
+    def invalidate_prepared(self):
+        pass
+
+    def connect_sync(self, wait=True):
+        return self._connection_open_sync()
+
+    async def connect_loop(self, wait=True):
+        return await self._connection_open_loop()
 
     disconnect_sync = _connection_close_sync
     disconnect_loop = _connection_close_loop
@@ -187,164 +285,458 @@ class ConnectionManager:
 
 class PooledConnectionManager(ConnectionManager):
     __slots__ = [
-        'max_connections', 'connect_timeout', 'stale_timeout',
-        'connections_map', 'connections_sync',
-        'in_use', '_lock_sync'
+        'max_connections', 'min_connections',
+        'connect_timeout', 'stale_timeout',
+        'max_lifetime', 'idle_timeout', 'pre_ping',
+        'connections_map', 'connections', 'lifetimes', 'in_use', 'opening',
+        'waiters', 'connects', 'recycles', 'ping_failures', 'wait_times',
+        'prepared_size', 'prepared', 'prepared_generation',
+        '_lock_sync', '_cond_sync', '_waiters_loop'
     ]
 
+    #: fraction of `max_lifetime` randomly subtracted to every connection,
+    #  avoiding the whole pool to be recycled at the same time
+    lifetime_jitter = 0.1
+    reap_interval = 30
+    ping_statement = 'SELECT 1;'
+    wait_time_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+    #: executions of a statement needed before preparing it on connections
+    prepare_threshold = 5
+
     def __init__(
         self,
         adapter,
         max_connections=5,
+        min_connections=0,
         connect_timeout=0,
-        stale_timeout=0
+        stale_timeout=0,
+        max_lifetime=0,
+        idle_timeout=0,
+        pre_ping=False,
+        prepared_size=0
     ):
         super().__init__(adapter)
         self.max_connections = max(max_connections, 1)
+        self.min_connections = min(min_connections, self.max_connections)
         self.connect_timeout = connect_timeout
         self.stale_timeout = stale_timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.prepared_size = prepared_size
+        #: prepared statements LRU per connection, tagged with the
+        #  generation they were prepared in
+        self.prepared = {}
+        self.prepared_generation = 0
         self.connections_map = {}
-        self.connections_sync = []
+        #: idle connections, the most recently released one is the last
+        self.connections = []
+        self.lifetimes = {}
         self.in_use = {}
+        self.opening = 0
+        self.waiters = 0
+        self.connects = 0
+        self.recycles = 0
+        self.ping_failures = 0
+        self.wait_times = [0] * (len(self.wait_time_buckets) + 1)
         self._lock_sync = threading.RLock()
+        self._cond_sync = threading.Condition(self._lock_sync)
+        self._waiters_loop = deque()
 
-    @cachedprop
-    def _lock_loop(self):
-        return asyncio.Lock()
-
-    @cachedprop
-    def connections_loop(self):
-        return asyncio.LifoQueue()
+    def configure(self, **kwargs):
+        super().configure(**kwargs)
+        self.max_connections = max(self.max_connections, 1)
+        self.min_connections = min(self.min_connections, self.max_connections)
 
     def is_stale(self, timestamp):
         return (time.time() - timestamp) > self.stale_timeout
 
-    def connect_sync(self):
-        if not self.connect_timeout:
-            return self._acquire_sync()
-        expires = time.time() + self.connect_timeout
-        while time.time() < expires:
-            try:
-                rv = self._acquire_sync()
-            except MaxConnectionsExceeded:
-                time.sleep(0.1)
-            else:
-                return rv
-        raise MaxConnectionsExceeded()
-
-    async def connect_loop(self):
-        return await asyncio.wait_for(
-            self._acquire_loop(), self.connect_timeout or None
+    def _expired(self, key):
+        created, deadline = self.lifetimes[key]
+        return (
+            (self.stale_timeout and self.is_stale(created)) or
+            (deadline is not None and time.time() > deadline)
         )
 
-    def _acquire_sync(self):
-        _opened = False
-        while True:
-            try:
-                with self._lock_sync:
-                    ts, key = heapq.heappop(self.connections_sync)
-            except IndexError:
-                ts = key = conn = None
+    def _drop(self, key):
+        #: removes a connection from the pool; needs the lock
+        self.lifetimes.pop(key)
+        return self.connections_map.pop(key)
+
+    def _checkout(self, stale):
+        #: picks the most recently used idle connection, or reserves a slot
+        #  for a new one when the pool is not full; needs the lock
+        while self.connections:
+            _, key = self.connections.pop()
+            if self._expired(key):
+                self.recycles += 1
+                stale.append(self._drop(key))
+                continue
+            self.in_use[key] = time.time()
+            return self.connections_map[key]
+        if len(self.connections_map) + self.opening < self.max_connections:
+            self.opening += 1
+            return _pool_slot
+        return None
+
+    def _register(self, connection, idle=False):
+        with self._lock_sync:
+            self.opening -= 1
+            self.connects += 1
+            ts, key = time.time(), id(connection)
+            self.connections_map[key] = connection
+            self.lifetimes[key] = (
+                ts,
+                ts + self.max_lifetime * (
+                    1 - random.random() * self.lifetime_jitter
+                ) if self.max_lifetime else None
+            )
+            if idle:
+                self.connections.append((ts, key))
+                self._notify()
+            else:
+                self.in_use[key] = ts
+
+    def _unregister_slot(self):
+        with self._lock_sync:
+            self.opening -= 1
+            self._notify()
+
+    def _notify(self):
+        #: wakes up a waiter in both sync and loop modes; needs the lock
+        self._cond_sync.notify()
+        while self._waiters_loop:
+            waiter = self._waiters_loop.popleft()
+            if not waiter.done():
+                waiter.get_loop().call_soon_threadsafe(_wake_waiter, waiter)
                 break
+
+    def _checkin(self, connection, close_connection, recycle=False):
+        key = id(connection)
+        with self._lock_sync:
+            self.in_use.pop(key)
+            if close_connection or self._expired(key):
+                if recycle or not close_connection:
+                    self.recycles += 1
+                self._drop(key)
             else:
-                if self.stale_timeout and self.is_stale(ts):
-                    self._connection_close_sync(self.connections_map.pop(key))
-                else:
-                    conn = self.connections_map[key]
-                    break
-        if conn is None:
-            if len(self.connections_map) >= self.max_connections:
-                raise MaxConnectionsExceeded()
+                self.connections.append((time.time(), key))
+                connection = None
+            self._notify()
+        return connection
+
+    def _track_wait(self, started):
+        elapsed = time.monotonic() - started
+        idx = bisect.bisect_left(self.wait_time_buckets, elapsed)
+        with self._lock_sync:
+            self.wait_times[idx] += 1
+
+    def _ping(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.ping_statement)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def _ping_failed(self, connection):
+        with self._lock_sync:
+            self.ping_failures += 1
+        return self._checkin(connection, True, recycle=True)
+
+    def _open_slot_sync(self, idle=False):
+        try:
             conn, _opened = self._connection_open_sync()
-            ts, key = time.time(), id(conn)
-            self.connections_map[key] = conn
-        self.in_use[key] = ts
+        except BaseException:
+            self._unregister_slot()
+            raise
+        self._register(conn, idle)
         return conn, _opened
 
-    async def _acquire_loop(self):
-        _opened = False
+    async def _open_slot_loop(self, idle=False):
+        try:
+            conn, _opened = await self._connection_open_loop()
+        except asyncio.CancelledError:
+            #: the slot is released once the pending connect completes
+            raise
+        except BaseException:
+            self._unregister_slot()
+            raise
+        self._register(conn, idle)
+        return conn, _opened
+
+    def _connection_open_cancelled(self, future):
+        super()._connection_open_cancelled(future)
+        self._unregister_slot()
+
+    def _ping_cancelled(self, connection, future):
+        #: the connection checked out by a cancelled acquire goes back to
+        #  the pool once its ping completes
+        if not future.cancelled() and future.result():
+            connection = self._checkin(connection, False)
+        else:
+            connection = self._ping_failed(connection)
+        if connection is not None:
+            self._loop.run_in_executor(
+                None, self._connection_close_sync, connection
+            )
+
+    def connect_sync(self, wait=True):
+        started = time.monotonic()
         while True:
-            if len(self.connections_map) < self.max_connections:
-                async with self._lock_loop:
-                    if len(self.connections_map) < self.max_connections:
-                        conn, _opened = await self._connection_open_loop()
-                        ts, key = time.time(), id(conn)
-                        self.connections_map[key] = conn
-                        break
-            ts, key = await self.connections_loop.get()
-            if self.stale_timeout and self.is_stale(ts):
-                await self._connection_close_loop(
-                    self.connections_map.pop(key)
-                )
-            else:
-                conn = self.connections_map[key]
+            conn, _opened = self._acquire_sync(started, wait)
+            if _opened or not self.pre_ping or self._ping(conn):
                 break
-        self.in_use[key] = ts
+            self._connection_close_sync(self._ping_failed(conn))
+        self._track_wait(started)
         return conn, _opened
 
-    def disconnect_sync(self, connection, close_connection=False):
-        key = id(connection)
-        ts = self.in_use.pop(key)
-        if close_connection:
-            self.connections_map.pop(key)
-            self._connection_close_sync(connection)
-        else:
-            if self.stale_timeout and self.is_stale(ts):
-                self.connections_map.pop(key)
+    def _acquire_sync(self, started, wait=True):
+        #: without `wait` a full pool fails right away
+        expires = started + (self.connect_timeout if wait else 0)
+        stale = []
+        try:
+            with self._cond_sync:
+                while True:
+                    conn = self._checkout(stale)
+                    if conn is not None:
+                        break
+                    remaining = expires - time.monotonic()
+                    if remaining <= 0:
+                        raise MaxConnectionsExceeded()
+                    self.waiters += 1
+                    try:
+                        woken = self._cond_sync.wait(remaining)
+                    finally:
+                        self.waiters -= 1
+                    if not woken:
+                        raise MaxConnectionsExceeded()
+        finally:
+            for connection in stale:
                 self._connection_close_sync(connection)
-            else:
+        if conn is _pool_slot:
+            return self._open_slot_sync()
+        return conn, False
+
+    async def connect_loop(self, wait=True):
+        started = time.monotonic()
+        rv = await asyncio.wait_for(
+            self._acquire_loop(wait), self.connect_timeout or None
+        )
+        self._track_wait(started)
+        return rv
+
+    async def _acquire_loop(self, wait=True):
+        loop = asyncio.get_running_loop()
+        while True:
+            conn, _opened = await self._acquire_loop_conn(wait)
+            if _opened or not self.pre_ping:
+                return conn, _opened
+            future = loop.run_in_executor(None, self._ping, conn)
+            try:
+                alive = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(partial(self._ping_cancelled, conn))
+                raise
+            if alive:
+                return conn, _opened
+            await self._connection_close_loop(self._ping_failed(conn))
+
+    async def _acquire_loop_conn(self, wait=True):
+        while True:
+            stale, waiter = [], None
+            with self._lock_sync:
+                conn = self._checkout(stale)
+                if conn is None and wait:
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters_loop.append(waiter)
+            for connection in stale:
+                await self._connection_close_loop(connection)
+            if conn is None and not wait:
+                #: without `wait` a full pool fails right away
+                raise MaxConnectionsExceeded()
+            if waiter is None:
+                break
+            try:
+                await waiter
+            except BaseException:
                 with self._lock_sync:
-                    heapq.heappush(self.connections_sync, (ts, key))
+                    if waiter in self._waiters_loop:
+                        self._waiters_loop.remove(waiter)
+                    else:
+                        #: pass the wake up to the next waiter
+                        self._notify()
+                raise
+        if conn is _pool_slot:
+            return await self._open_slot_loop()
+        return conn, False
+
+    def prewarm_sync(self):
+        while True:
+            with self._lock_sync:
+                if (
+                    len(self.connections_map) + self.opening >=
+                    self.min_connections
+                ):
+                    return
+                self.opening += 1
+            self._open_slot_sync(idle=True)
+
+    async def prewarm_loop(self):
+        while True:
+            with self._lock_sync:
+                if (
+                    len(self.connections_map) + self.opening >=
+                    self.min_connections
+                ):
+                    return
+                self.opening += 1
+            await self._open_slot_loop(idle=True)
+
+    def reap(self):
+        #: closes expired connections and the ones idle for too long,
+        #  keeping at least `min_connections` in the pool
+        now, reaped, idle = time.time(), [], []
+        with self._lock_sync:
+            for released, key in self.connections:
+                if self._expired(key) or (
+                    self.idle_timeout and
+                    now - released > self.idle_timeout and
+                    len(self.connections_map) > self.min_connections
+                ):
+                    self.recycles += 1
+                    reaped.append(self._drop(key))
+                else:
+                    idle.append((released, key))
+            self.connections[:] = idle
+            if reaped:
+                self._notify()
+        for connection in reaped:
+            self._connection_close_sync(connection)
+        return len(reaped)
 
-    async def disconnect_loop(self, connection, close_connection=False):
+    async def reap_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await loop.run_in_executor(None, self.reap)
+                await self.prewarm_loop()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock_sync:
+            return sdict(
+                size=len(self.connections_map),
+                min_size=self.min_connections,
+                max_size=self.max_connections,
+                idle=len(self.connections),
+                in_use=len(self.in_use),
+                opening=self.opening,
+                waiters=self.waiters + sum(
+                    not waiter.done() for waiter in self._waiters_loop
+                ),
+                connects=self.connects,
+                recycles=self.recycles,
+                ping_failures=self.ping_failures,
+                wait_times=list(zip(
+                    self.wait_time_buckets + (float('inf'),),
+                    self.wait_times
+                ))
+            )
+
+    def prepared_statements(self, connection):
+        #: returns the prepared statements LRU of the connection, and
+        #  whether the ones previously prepared should be deallocated
+        if not self.prepared_size:
+            return None, False
         key = id(connection)
-        ts = self.in_use.pop(key)
-        if close_connection:
-            self.connections_map.pop(key)
+        generation, statements = self.prepared.get(key, (None, None))
+        if generation == self.prepared_generation:
+            return statements, False
+        self.prepared[key] = (self.prepared_generation, OrderedDict())
+        return self.prepared[key][1], bool(statements)
+
+    def invalidate_prepared(self):
+        self.prepared_generation += 1
+
+    def _connection_close_sync(self, connection, *args, **kwargs):
+        self.prepared.pop(id(connection), None)
+        super()._connection_close_sync(connection, *args, **kwargs)
+
+    def disconnect_sync(self, connection, close_connection=False):
+        connection = self._checkin(connection, close_connection)
+        if connection is not None:
+            self._connection_close_sync(connection)
+
+    async def disconnect_loop(self, connection, close_connection=False):
+        connection = self._checkin(connection, close_connection)
+        if connection is not None:
             await self._connection_close_loop(connection)
-        else:
-            if self.stale_timeout and self.is_stale(ts):
-                self.connections_map.pop(key)
-                await self._connection_close_loop(connection)
-            else:
-                self.connections_loop.put_nowait((ts, key))
 
     def disconnect_all(self):
-        for connection in self.connections_map.values():
-            self.disconnect_sync(connection, close_connection=True)
+        with self._lock_sync:
+            connections = list(self.connections_map.values())
+            self.connections_map.clear()
+            self.connections.clear()
+            self.lifetimes.clear()
+            self.in_use.clear()
+        for connection in connections:
+            self._connection_close_sync(connection)
 
     def __del__(self):
         self.disconnect_all()
 
 
+_pool_slot = object()
+
+
+def _wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
 def _connection_init(self, *args, **kwargs):
     self._connection_manager = self._connection_manager_cls(self)
 
 
-def _connect_sync(self, with_transaction=True, reuse_if_open=False):
+def _connect_sync(
+    self, with_transaction=True, reuse_if_open=False, wait=True
+):
     if not self._connection_manager.state.closed:
         if reuse_if_open:
             return False
         raise RuntimeError('Connection already opened.')
-    self.connection, _opened = self._connection_manager.connect_sync()
+    self.connection, _opened = self._connection_manager.connect_sync(wait)
     if _opened:
         self.after_connection_hook()
     if with_transaction:
         txn = _transaction(self)
+        txn.implicit = True
         txn.__enter__()
     return True
 
 
-async def _connect_loop(self, with_transaction=True, reuse_if_open=False):
+async def _connect_loop(
+    self, with_transaction=True, reuse_if_open=False, wait=True
+):
     if not self._connection_manager.state.closed:
         if reuse_if_open:
             return False
         raise RuntimeError('Connection already opened.')
-    self.connection, _opened = await self._connection_manager.connect_loop()
+    self.connection, _opened = await self._connection_manager.connect_loop(
+        wait
+    )
     if _opened:
         self.after_connection_hook()
     if with_transaction:
         txn = _transaction(self)
+        txn.implicit = True
         txn.__enter__()
     return True
 
@@ -361,6 +753,7 @@ def _close_sync(self, action='commit', really=True):
         except Exception:
             succeeded = False
         really = not succeeded
+    self.close_server_side_cursors()
     try:
         self._connection_manager.disconnect_sync(self.connection, really)
     finally:
@@ -380,6 +773,7 @@ async def _close_loop(self, action='commit', really=True):
         except Exception:
             succeeded = False
         really = not succeeded
+    self.close_server_side_cursors()
     try:
         await self._connection_manager.disconnect_loop(self.connection, really)
     finally:
@@ -387,6 +781,16 @@ async def _close_loop(self, action='commit', really=True):
     return is_open
 
 
+async def _run_loop(self, f, *args, **kwargs):
+    if self._connection_manager.state.closed:
+        raise RuntimeError('no connection available')
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        self._connection_manager.executor(self.connection),
+        partial(ctx.run, f, *args, **kwargs)
+    )
+
+
 def _connection_getter(self):
     return self._connection_manager.state.connection
 
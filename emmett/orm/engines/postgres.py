@@ -9,6 +9,8 @@
     :license: BSD-3-Clause
 """
 
+from uuid import uuid4
+
 from pydal.adapters.postgres import (
     PostgreBoolean,
     PostgrePsycoBoolean,
@@ -124,6 +126,8 @@ class JSONBPostgreRepresenter(PostgreArraysRepresenter):
 
 
 class PostgresAdapterMixin:
+    supports_returning = True
+
     def _load_dependencies(self):
         super()._load_dependencies()
         self.dialect = JSONBPostgreDialect(self)
@@ -151,6 +155,43 @@ class PostgresAdapterMixin:
             )
         return self.dialect.insert_empty(table._rname)
 
+    def _server_side_cursor(self, itersize):
+        #: named cursors keep the result set on the server, fetching
+        #  `itersize` records for every round trip
+        if self.driver_name != 'psycopg2':
+            return self.connection.cursor()
+        cursor = self.connection.cursor(name=f'emt_{uuid4().hex}')
+        cursor.itersize = itersize
+        return cursor
+
+    def _execute_statement(self, statement, params):
+        #: hot statements get prepared on the connection, so that the
+        #  server can skip parsing and planning on next executions
+        manager = self._connection_manager
+        prepared, invalidated = manager.prepared_statements(self.connection)
+        if prepared is None:
+            return super()._execute_statement(statement, params)
+        if invalidated:
+            self.execute('DEALLOCATE ALL;')
+        if statement.name in prepared:
+            prepared.move_to_end(statement.name)
+        elif statement.hits >= manager.prepare_threshold:
+            self.execute(
+                f'PREPARE {statement.name} AS {statement.prepared_sql}'
+            )
+            prepared[statement.name] = True
+            while len(prepared) > manager.prepared_size:
+                name, _ = prepared.popitem(last=False)
+                self.execute(f'DEALLOCATE {name};')
+        else:
+            return super()._execute_statement(statement, params)
+        if not params:
+            return self._execute_with_params(f'EXECUTE {statement.name};', ())
+        return self._execute_with_params(
+            f'EXECUTE {statement.name} ({", ".join(["%s"] * len(params))});',
+            params
+        )
+
     def lastrowid(self, table):
         if self._last_insert:
             return self.cursor.fetchone()[0]
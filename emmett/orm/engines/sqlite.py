@@ -9,6 +9,8 @@
     :license: BSD-3-Clause
 """
 
+import sqlite3
+
 from pydal.adapters.sqlite import SQLite as _SQLite
 
 from . import adapters
@@ -16,6 +18,8 @@ from . import adapters
 
 @adapters.register_for('sqlite', 'sqlite:memory')
 class SQLite(_SQLite):
+    supports_returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+
     def _initialize_(self, do_connect):
         super()._initialize_(do_connect)
         self.driver_args['isolation_level'] = None
@@ -19,10 +19,10 @@ import time
 from functools import reduce, wraps
 from typing import TYPE_CHECKING, Any, Callable
 
-from pydal._globals import THREAD_LOCAL
 from pydal.helpers.classes import ExecutionHandler
 from pydal.objects import Field as _Field
 
+from ..ctx import current
 from ..datastructures import sdict
 from ..utils import cachedprop
 
@@ -39,6 +39,11 @@ class RowReferenceMeta:
         self.caster = caster
 
     def fetch(self, val):
+        identity = self.table._db.identity_map
+        if identity is not None:
+            rv = identity.get(self.table._tablename, (self.caster(val),))
+            if rv is not None:
+                return rv
         return self.table._db(self.table._id == self.caster(val)).select(
             limitby=(0, 1),
             orderby_on_limitby=False
@@ -57,6 +62,14 @@ class RowReferenceMultiMeta:
         self.casters = {pk: self._casters[table[pk].type] for pk in self.pks}
 
     def fetch(self, val):
+        identity = self.table._db.identity_map
+        if identity is not None:
+            rv = identity.get(self.table._tablename, tuple(
+                self.casters[pk](self.caster.__getitem__(val, idx))
+                for pk, idx in self.pks_idx.items()
+            ))
+            if rv is not None:
+                return rv
         query = reduce(
             operator.and_, [
                 self.table[pk] == self.casters[pk](self.caster.__getitem__(val, idx))
@@ -462,22 +475,126 @@ class Callback(object):
         return None
 
 
+class ExecutionStats:
+    __slots__ = ['timings', 'queries', 'budget_warned', 'params']
+
+    def __init__(self):
+        self.timings = []
+        self.queries = 0
+        self.budget_warned = False
+        self.params = None
+
+
+class IdentityMap:
+    __slots__ = ['tables']
+
+    def __init__(self):
+        self.tables = {}
+
+    @staticmethod
+    def key(record, pks):
+        rv = tuple(record.get(pk) for pk in pks)
+        return None if None in rv else rv
+
+    def get(self, tablename, key):
+        return self.tables.get(tablename, {}).get(key)
+
+    def add(self, tablename, key, record):
+        self.tables.setdefault(tablename, {})[key] = record
+
+    def discard(self, tablename, key=None):
+        if key is None:
+            self.tables.pop(tablename, None)
+            return
+        self.tables.get(tablename, {}).pop(key, None)
+
+    def clear(self):
+        self.tables.clear()
+
+    def __len__(self):
+        return sum(len(records) for records in self.tables.values())
+
+
 class TimingHandler(ExecutionHandler):
-    def _timings(self):
-        THREAD_LOCAL._emtdal_timings_ = getattr(
-            THREAD_LOCAL, '_emtdal_timings_', [])
-        return THREAD_LOCAL._emtdal_timings_
+    @cachedprop
+    def stats(self):
+        #: replicas statements belong to the primary connection scope
+        return self.adapter.db._adapter._connection_manager.state.execution
+
+    def before_execute(self, command):
+        self.t = time.perf_counter()
+
+    def after_execute(self, command):
+        dt = time.perf_counter() - self.t
+        if self.stats is not None:
+            self.stats.timings.append((command, dt))
+
+
+class MonitorHandler(ExecutionHandler):
+    explain_prefixes = {'sqlite': 'EXPLAIN QUERY PLAN '}
 
     @cachedprop
-    def timings(self):
-        return self._timings()
+    def stats(self):
+        #: replicas statements belong to the primary connection scope
+        return self.adapter.db._adapter._connection_manager.state.execution
+
+    @cachedprop
+    def config(self):
+        return self.adapter.db.config
+
+    @staticmethod
+    def _route():
+        wrapper = current.get('request') or current.get('websocket')
+        return getattr(wrapper, 'name', None)
+
+    def _explain(self, command, params):
+        if not command.lstrip()[:6].upper() == 'SELECT':
+            return None
+        prefix = self.explain_prefixes.get(self.adapter.dbengine, 'EXPLAIN ')
+        cursor = self.adapter.connection.cursor()
+        try:
+            cursor.execute(prefix + command, *((params,) if params else ()))
+            return cursor.fetchall()
+        except Exception:
+            return None
+        finally:
+            cursor.close()
 
     def before_execute(self, command):
-        self.t = time.time()
+        self.t = time.perf_counter()
 
     def after_execute(self, command):
-        dt = time.time() - self.t
-        self.timings.append((command, dt))
+        dt = time.perf_counter() - self.t
+        threshold = self.config.slow_query_threshold
+        if threshold and dt >= threshold:
+            self.log_slow_query(command, dt)
+        budget = self.config.query_budget
+        if budget and self.stats is not None:
+            self.stats.queries += 1
+            if self.stats.queries > budget and not self.stats.budget_warned:
+                self.stats.budget_warned = True
+                self.adapter.db.logger.warning(
+                    "Route %s exceeded the query budget of %d queries",
+                    self._route() or '<none>', budget
+                )
+
+    def log_slow_query(self, command, duration):
+        params = self.stats.params if self.stats is not None else None
+        lines = [
+            f"Slow query ({duration:.3f}s) on route "
+            f"{self._route() or '<none>'}:",
+            command
+        ]
+        if params:
+            lines.append(f"Parameters: {params!r}")
+        if self.config.slow_query_explain:
+            plan = self._explain(command, params)
+            if plan:
+                lines.append("Query plan:")
+                lines.extend(
+                    " | ".join(str(col) for col in row) for row in plan
+                )
+        self.adapter.db.logger.warning("\n".join(lines))
 
 
 class ConnectionContext:
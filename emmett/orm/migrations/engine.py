@@ -102,6 +102,7 @@ class Engine(MetaEngine):
     def _log_and_exec(self, sql):
         self.db.logger.debug("executing SQL:\n%s" % sql)
         self.adapter.execute(sql)
+        self.db.invalidate_statements()
 
     def create_table(self, name, columns, primary_keys, **kwargs):
         sql_list = self._new_table_sql(name, columns, primary_keys, **kwargs)
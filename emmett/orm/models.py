@@ -47,7 +47,7 @@ from .helpers import (
     wrap_scope_on_model,
     wrap_virtual_on_model
 )
-from .objects import Field, StructuredRow
+from .objects import Field, Row, StructuredRow
 from .wrappers import HasOneWrap, HasOneViaWrap, HasManyWrap, HasManyViaWrap
 
 
@@ -758,11 +758,13 @@ class Model(metaclass=MetaModel):
                     "_before_commit_delete",
                     "_before_commit_save",
                     "_before_commit_destroy",
+                    "_before_commit_upsert",
                     "_after_commit_insert",
                     "_after_commit_update",
                     "_after_commit_delete",
                     "_after_commit_save",
-                    "_after_commit_destroy"
+                    "_after_commit_destroy",
+                    "_after_commit_upsert"
                 ]:
                     getattr(self.table, t).append(
                         lambda a, obj=obj, self=self: obj.f(self, a)
@@ -953,6 +955,37 @@ class Model(metaclass=MetaModel):
                 kwargs[local_field] = kwargs[field][foreign_field]
         return cls.table.validate_and_insert(skip_callbacks=skip_callbacks, **kwargs)
 
+    @classmethod
+    def bulk_create(
+        cls,
+        rows,
+        batch_size=500,
+        returning=False,
+        validate=True,
+        skip_callbacks=False
+    ):
+        inst, response = cls._instance_(), Row()
+        response.errors, items = sdict(), []
+        for idx, fields in enumerate(rows):
+            fields = dict(fields)
+            for field in set(inst._compound_relations_.keys()) & set(fields.keys()):
+                reldata = inst._compound_relations_[field]
+                for local_field, foreign_field in reldata.coupled_fields:
+                    fields[local_field] = fields[field][foreign_field]
+            if validate:
+                validation, fields = cls.table._validate_fields(fields)
+                if validation.errors:
+                    response.errors[idx] = validation.errors
+                    continue
+            items.append(fields)
+        response.ret = cls.table.bulk_insert(
+            items,
+            batch_size=batch_size,
+            returning=returning,
+            skip_callbacks=skip_callbacks
+        )
+        return response
+
     @classmethod
     def validate(cls, row, write_values: bool = False):
         inst, errors = cls._instance_(), sdict()
@@ -1001,16 +1034,29 @@ class Model(metaclass=MetaModel):
                 if isinstance(args[0], tuple):
                     args = args[0]
                 elif isinstance(args[0], dict) and not kwargs:
-                    return cls.table(**args[0])
+                    return cls._get_from_identity_(args[0])
             if len(args) != len(inst._fieldset_pk):
                 raise SyntaxError(
                     f"{cls.__name__}.get requires the same number of arguments "
                     "as its primary keys"
                 )
             pks = inst.primary_keys or ["id"]
-            return cls.table(
-                **{pks[idx]: val for idx, val in enumerate(args)}
+            return cls._get_from_identity_(
+                {pks[idx]: val for idx, val in enumerate(args)}
+            )
+        return cls._get_from_identity_(kwargs)
+
+    @classmethod
+    def _get_from_identity_(cls, kwargs):
+        identity = cls.db.identity_map
+        pks = cls.table._primary_keys
+        if identity is not None and kwargs and set(kwargs) == set(pks):
+            rv = identity.get(
+                cls.table._tablename, tuple(kwargs[pk] for pk in pks)
             )
+            if rv is not None:
+                return rv
+        #: misses get stored by the select itself
         return cls.table(**kwargs)
 
     @rowmethod('update_record')
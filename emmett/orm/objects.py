@@ -9,9 +9,12 @@
     :license: BSD-3-Clause
 """
 
+import asyncio
 import copy
+import csv
 import datetime
 import decimal
+import io
 import operator
 import types
 
@@ -28,13 +31,14 @@ from pydal.objects import (
     Rows as _Rows,
     IterRows as _IterRows,
     Query,
+    SQLALL,
     Expression
 )
 
 from ..ctx import current
 from ..datastructures import sdict
 from ..html import tag
-from ..serializers import xml_encode
+from ..serializers import Serializers, xml_encode
 from ..utils import cachedprop
 from ..validators import ValidateFromDict
 from .helpers import (
@@ -48,6 +52,12 @@ from .helpers import (
 type_int = int
 
 
+def _pure_reference(value):
+    if isinstance(value, RowReferenceMixin):
+        return value.__pure__()
+    return value
+
+
 class Table(_Table):
     def __init__(self, db, tablename, *fields, **kwargs):
         _primary_keys, _notnulls = list(kwargs.get('primarykey', [])), {}
@@ -66,12 +76,14 @@ class Table(_Table):
         self._before_commit_delete = []
         self._before_commit_save = []
         self._before_commit_destroy = []
+        self._before_commit_upsert = []
         self._after_commit = []
         self._after_commit_insert = []
         self._after_commit_update = []
         self._after_commit_delete = []
         self._after_commit_save = []
         self._after_commit_destroy = []
+        self._after_commit_upsert = []
         self._unique_fields_validation_ = {}
         self._primary_keys = _primary_keys
         #: avoid pyDAL mess in ops and migrations
@@ -127,6 +139,15 @@ class Table(_Table):
             self._after_commit_destroy
         ])
 
+    @cachedprop
+    def _has_commit_upsert_callbacks(self):
+        return any([
+            self._before_commit,
+            self._after_commit,
+            self._before_commit_upsert,
+            self._after_commit_upsert
+        ])
+
     def _create_references(self):
         self._referenced_by = []
         self._referenced_by_list = []
@@ -136,11 +157,34 @@ class Table(_Table):
         fields = {key: row[key] for key in fieldset}
         return op_method(fields)
 
+    def _forget_identities_(self, row=None):
+        #: drops the records changed by a write from the identity map,
+        #  the whole table goes when we can't tell which ones
+        identity = self._db.identity_map
+        if identity is None:
+            return
+        key = None
+        if row is not None:
+            key = identity.key(row, self._primary_keys)
+        identity.discard(self._tablename, key)
+
+    def _track_changes_(self):
+        #: cached results get invalidated once the changes are committed,
+        #  while reads stick to the primary database
+        if self._db._replicas is not None:
+            self._db._replicas.track_write()
+        txn = self._db._adapter.top_transaction()
+        if txn:
+            txn._changed_tables.add(self._tablename)
+            return
+        self._db._query_cache.invalidate([self._tablename])
+
     def insert(self, skip_callbacks=False, **fields):
         row = self._fields_and_values_for_insert(fields)
         if not skip_callbacks and any(f(row) for f in self._before_insert):
             return 0
         ret = self._db._adapter.insert(self, row.op_values())
+        self._track_changes_()
         if not skip_callbacks:
             if self._has_commit_insert_callbacks:
                 txn = self._db._adapter.top_transaction()
@@ -158,12 +202,117 @@ class Table(_Table):
                     f(row, ret)
         return ret
 
+    def insert_async(self, skip_callbacks=False, **fields):
+        return self._db._adapter.run_loop(
+            self.insert, skip_callbacks=skip_callbacks, **fields
+        )
+
     def validate_and_insert(self, skip_callbacks=False, **fields):
         response, new_fields = self._validate_fields(fields)
         if not response.errors:
             response.id = self.insert(skip_callbacks=skip_callbacks, **new_fields)
         return response
 
+    def bulk_insert(
+        self,
+        rows,
+        batch_size=500,
+        returning=False,
+        skip_callbacks=False
+    ):
+        #: rows are inserted with multi-row statements, running insert
+        #  callbacks for every row and gathering commit operations per batch
+        items = []
+        for fields in rows:
+            row = self._fields_and_values_for_insert(fields)
+            if not skip_callbacks and any(f(row) for f in self._before_insert):
+                continue
+            items.append(row)
+        #: after callbacks need the generated ids, even when the caller
+        #  just asked for the number of inserted rows
+        fetch_ids = returning or bool(
+            not skip_callbacks and self._after_insert
+        )
+        ret = [] if returning else 0
+        for idx in range(0, len(items), batch_size):
+            batch = items[idx:idx + batch_size]
+            batch_ret = self._db._adapter.bulk_insert(
+                self, [row.op_values() for row in batch], returning=fetch_ids
+            )
+            self._track_changes_()
+            if returning:
+                ret.extend(batch_ret)
+            else:
+                ret += len(batch_ret) if fetch_ids else batch_ret
+            if skip_callbacks:
+                continue
+            batch_ids = batch_ret if fetch_ids else [None] * len(batch)
+            if self._has_commit_insert_callbacks:
+                txn = self._db._adapter.top_transaction()
+                if txn:
+                    txn._add_ops([
+                        TransactionOp(
+                            TransactionOps.insert,
+                            self,
+                            TransactionOpContext(values=row, ret=row_id)
+                        ) for row, row_id in zip(batch, batch_ids)
+                    ])
+            if self._after_insert:
+                for row, row_id in zip(batch, batch_ids):
+                    for f in self._after_insert:
+                        f(row, row_id)
+        return ret
+
+    def upsert(
+        self,
+        rows,
+        conflict,
+        update=None,
+        batch_size=500,
+        skip_callbacks=False
+    ):
+        #: insert and update callbacks don't apply, as the database decides
+        #  the outcome of every row; commit operations are still gathered
+        rows = list(rows)
+        conflict = [
+            field if isinstance(field, str) else field.name
+            for field in conflict
+        ]
+        if update is None:
+            update = []
+            for fields in rows:
+                update.extend(
+                    key for key in fields
+                    if key not in conflict and key not in update
+                )
+        update = [
+            field if isinstance(field, str) else field.name
+            for field in update
+        ]
+        items = [self._fields_and_values_for_insert(fields) for fields in rows]
+        ret = 0
+        for idx in range(0, len(items), batch_size):
+            batch = items[idx:idx + batch_size]
+            ret += self._db._adapter.upsert(
+                self,
+                [row.op_values() for row in batch],
+                [self[key] for key in conflict],
+                [self[key] for key in update]
+            )
+            self._forget_identities_()
+            self._track_changes_()
+            if not skip_callbacks and self._has_commit_upsert_callbacks:
+                txn = self._db._adapter.top_transaction()
+                if txn:
+                    txn._add_ops([
+                        TransactionOp(
+                            TransactionOps.upsert,
+                            self,
+                            TransactionOpContext(values=row)
+                        ) for row in batch
+                    ])
+        return ret
+
     def _insert_from_save(self, row, skip_callbacks=False):
         if not skip_callbacks and any(f(row) for f in self._before_save):
             return row
@@ -528,18 +677,65 @@ class Set(_Set):
 
     def select(self, *fields, **options):
         obj = self
-        pagination, including = (
+        pagination, including, prefetch = (
             options.pop('paginate', None),
-            options.pop('including', None)
+            options.pop('including', None),
+            options.pop('prefetch', None)
         )
         if pagination:
             options['limitby'] = self._parse_paginate(pagination)
         if including and self._model_ is not None:
             options['left'], jdata = self._parse_left_rjoins(including)
             obj = self._left_join_set_builder(jdata)
-        return obj._run_select_(*fields, **options)
+        rv = obj._run_select_(*fields, **options)
+        if self._model_ is not None and self._selects_records_(fields):
+            self._remember_identities_(rv)
+        if prefetch and self._model_ is not None:
+            self._prefetch_(
+                self._model_._instance_(), list(rv),
+                self._parse_prefetch_paths(prefetch)
+            )
+        return rv
+
+    def _selects_records_(self, fields):
+        table = self._model_.table
+        return all(
+            isinstance(field, SQLALL) and field._table is table
+            for field in fields
+        )
+
+    def _remember_identities_(self, rows):
+        identity = self.db.identity_map
+        if identity is None:
+            return
+        model = self._model_._instance_()
+        pks = model.table._primary_keys
+        for row in rows:
+            if not isinstance(row, model._rowclass_):
+                continue
+            key = identity.key(row, pks)
+            if key is not None:
+                identity.add(model.table._tablename, key, row)
+
+    def select_async(self, *fields, **options):
+        return self.db._adapter.run_loop(self.select, *fields, **options)
+
+    def count_async(self, distinct=None, cache=None):
+        return self.db._adapter.run_loop(self.count, distinct, cache)
+
+    def update_async(self, skip_callbacks=False, **update_fields):
+        return self.db._adapter.run_loop(
+            self.update, skip_callbacks=skip_callbacks, **update_fields
+        )
+
+    def delete_async(self, skip_callbacks=False):
+        return self.db._adapter.run_loop(
+            self.delete, skip_callbacks=skip_callbacks
+        )
 
     def iterselect(self, *fields, **options):
+        #: `fetch_size` sets the records fetched at once from the cursor,
+        #  `server_side` streams them using server-side cursors
         pagination = options.pop('paginate', None)
         if pagination:
             options['limitby'] = self._parse_paginate(pagination)
@@ -556,6 +752,140 @@ class Set(_Set):
         options['_concrete_tables'] = concrete_tables
         return self.db._adapter.iterselect(self.query, fields, options)
 
+    _stream_formats = ('ndjson', 'csv')
+
+    def stream(self, *fields, format='ndjson', chunk_rows=1000, **options):
+        if format not in self._stream_formats:
+            raise ValueError(f"Unsupported stream format: {format}")
+        pagination = options.pop('paginate', None)
+        if pagination:
+            options['limitby'] = self._parse_paginate(pagination)
+        adapter = self.db._adapter
+        tablemap = adapter.tables(
+            self.query,
+            options.get('join', None),
+            options.get('left', None),
+            options.get('orderby', None),
+            options.get('groupby', None)
+        )
+        fields, _ = adapter._expand_all_with_concrete_tables(fields, tablemap)
+        colnames, sql = adapter._select_wcols(self.query, fields, **options)
+        encoder = getattr(self, f'_stream_encoder_{format}')(fields, colnames)
+        return self._stream_chunks(
+            current.ctx, sql, encoder, max(chunk_rows, 1)
+        )
+
+    @staticmethod
+    def _stream_keys(fields, colnames):
+        tables = {
+            field.table._tablename for field in fields
+            if isinstance(field, Field)
+        }
+        return [
+            (
+                (field.name if len(tables) == 1 else field.longname)
+                if isinstance(field, Field) else colname
+            ) for field, colname in zip(fields, colnames)
+        ]
+
+    def _stream_values(self, fields):
+        parse_value = self.db._adapter.parse_value
+        types = [(field._itype, field.type) for field in fields]
+        filters = [
+            field.filter_out if isinstance(field, Field) else None
+            for field in fields
+        ]
+
+        def values(db_row):
+            rv = []
+            for value, (itype, ftype), filter_out in zip(
+                db_row, types, filters
+            ):
+                value = parse_value(value, itype, ftype, True)
+                if filter_out:
+                    value = filter_out(value)
+                rv.append(value)
+            return rv
+        return values
+
+    def _stream_encoder_ndjson(self, fields, colnames):
+        keys = self._stream_keys(fields, colnames)
+        values = self._stream_values(fields)
+        dumps = Serializers.get_for('json')
+
+        def encode(db_rows, first):
+            chunks = []
+            for db_row in db_rows:
+                data = {}
+                for key, value in zip(keys, values(db_row)):
+                    if isinstance(value, decimal.Decimal):
+                        value = float(value)
+                    data[key] = value
+                chunk = dumps(data)
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf8')
+                chunks.append(chunk)
+            chunks.append(b'')
+            return b'\n'.join(chunks)
+        return encode
+
+    def _stream_encoder_csv(self, fields, colnames):
+        keys = self._stream_keys(fields, colnames)
+        values = self._stream_values(fields)
+
+        def encode(db_rows, first):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if first:
+                writer.writerow(keys)
+            writer.writerows(values(db_row) for db_row in db_rows)
+            return buffer.getvalue().encode('utf8')
+        return encode
+
+    async def _stream_chunks(self, ctx, sql, encoder, chunk_rows):
+        #: the chunks are usually consumed after the request context has been
+        #  closed, so we re-bind it and use our own connection for the export
+        adapter = self.db._adapter
+        token = current._init_(ctx)
+        try:
+            opened = await self.db.connection_open_loop()
+            try:
+                cursor = await self.db.run_async(
+                    adapter.execute_server_side, sql, chunk_rows
+                )
+                executor = adapter._connection_manager.executor(
+                    adapter.connection
+                )
+            except Exception:
+                if opened:
+                    await self.db.connection_close_loop()
+                raise
+        finally:
+            current._close_(token)
+        loop = asyncio.get_running_loop()
+        first = True
+        try:
+            while True:
+                #: every fetch might need a round trip to the server
+                db_rows = await loop.run_in_executor(
+                    executor, cursor.fetchmany, chunk_rows
+                )
+                if not db_rows:
+                    if first:
+                        yield encoder(db_rows, first)
+                    break
+                yield encoder(db_rows, first)
+                first = False
+        finally:
+            token = current._init_(ctx)
+            try:
+                if id(cursor) in adapter.cursors:
+                    await self.db.run_async(adapter.close_cursor, cursor)
+                if opened:
+                    await self.db.connection_close_loop()
+            finally:
+                current._close_(token)
+
     def update(self, skip_callbacks=False, **update_fields):
         table = self._get_table_from_query()
         row = table._fields_and_values_for_update(update_fields)
@@ -564,6 +894,8 @@ class Set(_Set):
         if not skip_callbacks and any(f(self, row) for f in table._before_update):
             return 0
         ret = self.db._adapter.update(table, self.query, row.op_values())
+        table._forget_identities_()
+        table._track_changes_()
         if not skip_callbacks:
             if table._has_commit_update_callbacks:
                 txn = self._db._adapter.top_transaction()
@@ -580,11 +912,64 @@ class Set(_Set):
             ret and [f(self, row) for f in table._after_update]
         return ret
 
+    def bulk_update(self, mapping, skip_callbacks=False):
+        #: updates are compiled into a single statement, while callbacks
+        #  run for every record with a set selecting just that record
+        table = self._get_table_from_query()
+        if table._id is None:
+            raise ValueError("Bulk updates require a single primary key")
+        items = []
+        for key, update_fields in mapping.items():
+            row = table._fields_and_values_for_update(update_fields)
+            if not row._values:
+                raise ValueError("No fields to update")
+            dbset = Set(
+                self.db,
+                self.query & (table._id == key),
+                model=self._model_
+            )
+            if not skip_callbacks and any(
+                f(dbset, row) for f in table._before_update
+            ):
+                continue
+            items.append((key, row, dbset))
+        if not items:
+            return 0
+        ret = self.db._adapter.bulk_update(
+            table,
+            self.query,
+            [(key, row.op_values()) for key, row, _ in items]
+        )
+        table._forget_identities_()
+        table._track_changes_()
+        if not skip_callbacks:
+            if table._has_commit_update_callbacks:
+                txn = self._db._adapter.top_transaction()
+                if txn:
+                    txn._add_ops([
+                        TransactionOp(
+                            TransactionOps.update,
+                            table,
+                            TransactionOpContext(
+                                values=row,
+                                dbset=dbset,
+                                ret=ret
+                            )
+                        ) for _, row, dbset in items
+                    ])
+            if ret:
+                for _, row, dbset in items:
+                    for f in table._after_update:
+                        f(dbset, row)
+        return ret
+
     def delete(self, skip_callbacks=False):
         table = self._get_table_from_query()
         if not skip_callbacks and any(f(self) for f in table._before_delete):
             return 0
         ret = self.db._adapter.delete(table, self.query)
+        table._forget_identities_()
+        table._track_changes_()
         if not skip_callbacks:
             if table._has_commit_delete_callbacks:
                 txn = self._db._adapter.top_transaction()
@@ -632,6 +1017,8 @@ class Set(_Set):
                 ret = self.db._adapter.update(
                     table, self.query, row.op_values()
                 )
+                table._forget_identities_()
+                table._track_changes_()
                 if not skip_callbacks and ret:
                     for f in table._after_update:
                         f(self, row)
@@ -648,6 +1035,8 @@ class Set(_Set):
         if not skip_callbacks and any(f(self, fields) for f in table._before_update):
             return False
         ret = self.db._adapter.update(table, self.query, fields.op_values())
+        table._forget_identities_(row)
+        table._track_changes_()
         if not skip_callbacks:
             if table._has_commit_update_callbacks or table._has_commit_save_callbacks:
                 txn = self._db._adapter.top_transaction()
@@ -683,6 +1072,8 @@ class Set(_Set):
             return False
         if not skip_callbacks and any(f(self) for f in table._before_delete):
             return 0
+        table._forget_identities_(row)
+        table._track_changes_()
         ret = self.db._adapter.delete(table, self.query)
         if ret:
             model._unset_row_persistence(row)
@@ -776,6 +1167,185 @@ class Set(_Set):
             jdata.append((arg, table._tablename, rel_type))
         return joins, jdata
 
+    @staticmethod
+    def _parse_prefetch_paths(paths):
+        if not isinstance(paths, (list, tuple)):
+            paths = [paths]
+        rv = OrderedDict()
+        for path in paths:
+            node = rv
+            for name in path.split('.'):
+                node = node.setdefault(name, OrderedDict())
+        return rv
+
+    @staticmethod
+    def _prefetch_keys_query(fields, keys):
+        if len(fields) == 1:
+            return fields[0].belongs([key[0] for key in keys])
+        return reduce(
+            operator.or_, [
+                reduce(
+                    operator.and_, [
+                        field == key[idx] for idx, field in enumerate(fields)
+                    ]
+                ) for key in keys
+            ]
+        )
+
+    @staticmethod
+    def _prefetch_group(records, key_builder):
+        rv = OrderedDict()
+        for record in records:
+            key = key_builder(record)
+            if None in key:
+                continue
+            rv[key] = rv.get(key, [])
+            rv[key].append(record)
+        return rv
+
+    def _prefetch_(self, model, records, paths):
+        #: loads every relation with a single query for all the records,
+        #  then moves on the loaded ones for nested paths
+        for name, nested in paths.items():
+            if not records:
+                return
+            if name in model._belongs_fks_:
+                loaded, rmodel = self._prefetch_belongs_(model, records, name)
+            else:
+                rel, many = model._hasmany_ref_.get(name), True
+                if not rel:
+                    rel, many = model._hasone_ref_.get(name), False
+                if not rel:
+                    raise RuntimeError(
+                        f'Unable to find {name} relation of '
+                        f'{model.__class__.__name__} model'
+                    )
+                builder = (
+                    self._prefetch_via_ if rel.via else self._prefetch_many_
+                )
+                loaded, rmodel = builder(model, records, rel, many)
+            if nested:
+                self._prefetch_(rmodel, loaded, nested)
+
+    def _prefetch_belongs_(self, model, records, name):
+        rel = model._belongs_fks_[name]
+        rmodel = self.db[rel.model]._model_
+        local_fields = [local for local, _ in rel.coupled_fields]
+        foreign_fields = [foreign for _, foreign in rel.coupled_fields]
+        owners = self._prefetch_group(
+            records, lambda row: tuple(
+                _pure_reference(row[field]) for field in local_fields
+            )
+        )
+        if not owners:
+            return [], rmodel
+        related = OrderedDict()
+        keys = owners
+        identity = self.db.identity_map
+        if (
+            identity is not None and
+            foreign_fields == rmodel.table._primary_keys
+        ):
+            #: only load the records we don't know already
+            keys = []
+            for key in owners:
+                record = identity.get(rmodel.table._tablename, key)
+                if record is None:
+                    keys.append(key)
+                else:
+                    related[key] = record
+        if keys:
+            for record in self.db.where(
+                self._prefetch_keys_query(
+                    [rmodel.table[field] for field in foreign_fields], keys
+                ),
+                model=rmodel.__class__
+            ).select():
+                related[
+                    tuple(record[field] for field in foreign_fields)
+                ] = record
+        for key, rows in owners.items():
+            record = related.get(key)
+            if record is None:
+                continue
+            for row in rows:
+                row[name] = typed_row_reference_from_record(record, rmodel)
+        return list(related.values()), rmodel
+
+    def _prefetch_attach_(self, owners, related, name, many):
+        for key, rows in owners.items():
+            records = related.get(key, [])
+            for row in rows:
+                relset = row.get(name)
+                if relset is None:
+                    continue
+                relset._cached_resultset = (
+                    Rows(self.db, list(records), []) if many else
+                    (records[0] if records else None)
+                )
+
+    def _prefetch_many_(self, model, records, rel, many):
+        builder = RelationBuilder(rel, model)
+        rmodel = rel.model_instance
+        fields = rel.fields_instances
+        caster = str if rel.cast else _pure_reference
+        owners = self._prefetch_group(
+            records, lambda row: tuple(
+                caster(val) for val in builder._make_refid(row)
+            )
+        )
+        if not owners:
+            return [], rmodel
+        query = rel.dbset.where(
+            builder._patch_query_with_scopes(
+                rel, self._prefetch_keys_query(fields, owners)
+            )
+        ).query
+        loaded = list(
+            self.db.where(query, model=rmodel.__class__).select(
+                rmodel.table.ALL
+            )
+        )
+        related = self._prefetch_group(
+            loaded, lambda record: tuple(
+                caster(record[field.name]) for field in fields
+            )
+        )
+        self._prefetch_attach_(owners, related, rel.name, many)
+        return loaded, rmodel
+
+    def _prefetch_via_(self, model, records, rel, many):
+        query, sel_field = RelationBuilder(rel, model).via()[:2]
+        rmodel = sel_field._table._model_
+        pks = model.primary_keys or ['id']
+        owners = self._prefetch_group(
+            records, lambda row: tuple(row[pk] for pk in pks)
+        )
+        if not owners:
+            return [], rmodel
+        if sel_field._table is model.table:
+            #: self referencing relations can't be selected together with
+            #  the originating table, load them per record
+            loaded = []
+            for rows in owners.values():
+                for row in rows:
+                    rv = row[rel.name]()
+                    loaded.extend(rv if many else [rv] if rv else [])
+            return loaded, rmodel
+        pk_fields = [model.table[pk] for pk in pks]
+        rows = self.db(
+            query & self._prefetch_keys_query(pk_fields, owners)
+        ).select(sel_field, *pk_fields)
+        related = OrderedDict()
+        for row in rows:
+            key = tuple(row[model.tablename][pk] for pk in pks)
+            related[key] = related.get(key, [])
+            related[key].append(row[rmodel.tablename])
+        self._prefetch_attach_(owners, related, rel.name, many)
+        return [
+            record for records in related.values() for record in records
+        ], rmodel
+
     def _jcolnames_from_rowstmps(self, tmps):
         colnames = []
         all_colnames = {}
@@ -1119,7 +1689,10 @@ class JoinedSet(Set):
             fields, tablemap
         )
         colnames, sql = self.db._adapter._select_wcols(self.query, fields, **options)
-        return JoinIterRows(self.db, sql, fields, concrete_tables, colnames)
+        return JoinIterRows(
+            self.db, sql, fields, concrete_tables, colnames,
+            fetch_size=options.get('fetch_size')
+        )
 
     def _split_joins(self, joins):
         rv = {'belongs': [], 'one': [], 'many': []}
@@ -1146,6 +1719,12 @@ class JoinedSet(Set):
         return row[tuple(self._pks_)[0]]
 
     def _run_select_(self, *fields, **options):
+        #: joined records get rebuilt while iterating the cursor
+        if options.get('cache') is not None:
+            raise RuntimeError(
+                "Selections cache is not supported with 'including' "
+                "or joined sets"
+            )
         #: build parsers
         belongs_j, one_j, many_j = self._split_joins(self._jdata_)
         belongs_l, one_l, many_l = self._split_joins(self._ljdata_)
@@ -1558,16 +2137,37 @@ class Rows(_Rows):
 
 
 class IterRows(_IterRows):
-    def __init__(self, db, sql, fields, concrete_tables, colnames):
+    #: number of records fetched from the cursor and parsed at once
+    fetch_size = 1000
+
+    def __init__(
+        self,
+        db,
+        sql,
+        fields,
+        concrete_tables,
+        colnames,
+        fetch_size=None,
+        server_side=False,
+        itersize=None
+    ):
         self.db = db
         self.fields = fields
         self.concrete_tables = concrete_tables
         self.colnames = colnames
         self.fdata, self.tables = self.db._adapter._parse_expand_colnames(fields)
-        self.cursor = self.db._adapter.cursor
-        self.db._adapter.execute(sql)
-        self.db._adapter.lock_cursor(self.cursor)
+        if fetch_size or itersize:
+            self.fetch_size = max(fetch_size or itersize, 1)
+        if server_side:
+            self.cursor = self.db._adapter.execute_server_side(
+                sql, itersize or self.fetch_size
+            )
+        else:
+            self.cursor = self.db._adapter.cursor
+            self.db._adapter.execute(sql)
+            self.db._adapter.lock_cursor(self.cursor)
         self._head = None
+        self._buffer = iter(())
         self.last_item = None
         self.last_item_id = None
         self.compact = True
@@ -1575,12 +2175,12 @@ class IterRows(_IterRows):
         self.cacheable = False
         self.sql = sql
 
-    def __next__(self):
-        db_row = self.cursor.fetchone()
-        if db_row is None:
-            raise StopIteration
-        row = self.db._adapter._parse(
-            db_row,
+    def _fetch(self):
+        db_rows = self.cursor.fetchmany(self.fetch_size)
+        if not db_rows:
+            return False
+        rows = self.db._adapter._parse_many(
+            db_rows,
             self.fdata,
             self.tables,
             self.concrete_tables,
@@ -1589,22 +2189,42 @@ class IterRows(_IterRows):
             self.blob_decode
         )
         if self.compact:
-            keys = list(row.keys())
+            keys = list(rows[0].keys())
             if len(keys) == 1 and keys[0] != '_extra':
-                row = row[keys[0]]
-        return row
+                rows = [row[keys[0]] for row in rows]
+        self._buffer = iter(rows)
+        return True
+
+    def __next__(self):
+        for row in self._buffer:
+            return row
+        if not self._fetch():
+            raise StopIteration
+        return next(self._buffer)
 
     def __iter__(self):
         if self._head:
             yield self._head
+        #: cursors get closed also when the iteration stops early
         try:
             row = next(self)
             while row is not None:
                 yield row
                 row = next(self)
         except StopIteration:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if id(self.cursor) in self.db._adapter.cursors:
             self.db._adapter.close_cursor(self.cursor)
-        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 class JoinRows(Rows):
@@ -1643,6 +2263,7 @@ class TransactionOps(str, Enum):
     delete = "delete"
     save = "save"
     destroy = "destroy"
+    upsert = "upsert"
 
 
 class TransactionOpContext:
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+    emmett.orm.replicas
+    -------------------
+
+    Provides read replicas routing for Emmett databases.
+
+    :copyright: 2014 Giovanni Barillari
+    :license: BSD-3-Clause
+"""
+
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+
+from functools import wraps
+from pydal.adapters import adapters
+from pydal.helpers.regex import REGEX_DBNAME
+
+from ..ctx import current
+from ..datastructures import sdict
+from .adapters import patch_adapter
+from .errors import MaxConnectionsExceeded
+from .transactions import callable_context_manager
+
+
+def _on_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class _use_primary(callable_context_manager):
+    def __init__(self, router=None):
+        self.router = router
+        self._token = None
+
+    def __enter__(self):
+        if self.router is not None:
+            self._token = self.router._forced.set(True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._token is not None:
+            self.router._forced.reset(self._token)
+        self._token = None
+
+    def __call__(self, fn):
+        #: every call needs its own token
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with self.__class__(self.router):
+                return fn(*args, **kwargs)
+        return inner
+
+
+class ReplicaRouter:
+    strategies = ('round_robin', 'least_connections')
+    session_key = '_db_primary_until'
+
+    def __init__(self, db, adapters, strategy='round_robin', sticky_window=0):
+        if strategy not in self.strategies:
+            raise SyntaxError(
+                f"Invalid replica selection '{strategy}', "
+                f"use one of: {', '.join(self.strategies)}"
+            )
+        self.db = db
+        self.adapters = adapters
+        self.strategy = strategy
+        self.sticky_window = sticky_window
+        self._forced = contextvars.ContextVar(
+            f'_emt_orm_primary_{id(self)}', default=False)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, db, replicas, **kwargs):
+        return cls(
+            db, [cls.build_adapter(db, replica) for replica in replicas],
+            **kwargs
+        )
+
+    @staticmethod
+    def build_adapter(db, replica):
+        if isinstance(replica, dict):
+            replica = sdict(replica)
+            uri = replica.uri or db.uri_from_config(replica)
+        else:
+            uri = replica
+        adapter = adapters.get_for(REGEX_DBNAME.match(uri).group())(
+            db=db,
+            uri=uri,
+            pool_size=db._pool_size,
+            folder=db._adapter.folder,
+            db_codec=db._db_codec,
+            driver_args=db._driver_args or {},
+            adapter_args=db._adapter_args or {},
+            do_connect=False
+        )
+        patch_adapter(adapter)
+        return adapter
+
+    def _sticky(self):
+        if not self.sticky_window:
+            return False
+        session = current.get('session')
+        if not session:
+            return False
+        return (session.get(self.session_key) or 0) > time.time()
+
+    def track_write(self):
+        if not self.sticky_window:
+            return
+        session = current.get('session')
+        if session is not None:
+            session[self.session_key] = time.time() + self.sticky_window
+
+    def pinned(self, adapter):
+        #: reads stay on the primary when explicitly requested, within
+        #  transactions, after writes and within the sticky window
+        if self._forced.get():
+            return True
+        state = adapter._connection_manager.state
+        if state.closed:
+            return True
+        for txn in state.transactions:
+            if not txn.implicit or txn._changed_tables:
+                return True
+        return self._sticky()
+
+    def _candidates(self):
+        if self.strategy == 'least_connections':
+            return sorted(
+                self.adapters,
+                key=lambda adapter: len(
+                    getattr(adapter._connection_manager, 'in_use', ())
+                )
+            )
+        with self._lock:
+            start = next(self._counter) % len(self.adapters)
+        return self.adapters[start:] + self.adapters[:start]
+
+    def _opened(self):
+        for adapter in self.adapters:
+            if not adapter._connection_manager.state.closed:
+                return adapter
+        return None
+
+    def _connect_failed(self, replica):
+        self.db.logger.warning(
+            "Unable to connect to database replica #%d, skipping it",
+            self.adapters.index(replica), exc_info=True
+        )
+
+    def route(self, adapter):
+        if self.pinned(adapter):
+            return adapter
+        rv = self._opened()
+        if rv is not None:
+            return rv
+        #: on the loop replicas get opened by `open_loop`, connecting here
+        #  would block it
+        if _on_loop():
+            return adapter
+        for replica in self._candidates():
+            #: never wait for a busy replica, the primary can serve the read
+            try:
+                replica.reconnect(
+                    with_transaction=True, reuse_if_open=True, wait=False
+                )
+            except MaxConnectionsExceeded:
+                continue
+            except Exception:
+                self._connect_failed(replica)
+                continue
+            return replica
+        return adapter
+
+    async def open_loop(self):
+        if self._opened() is not None:
+            return
+        for replica in self._candidates():
+            try:
+                await replica.reconnect_loop(
+                    with_transaction=True, reuse_if_open=True, wait=False
+                )
+            except MaxConnectionsExceeded:
+                continue
+            except Exception:
+                self._connect_failed(replica)
+                continue
+            return
+
+    def close(self):
+        for adapter in self.adapters:
+            adapter.close()
+
+    async def close_loop(self):
+        for adapter in self.adapters:
+            await adapter.close_loop()
+
+    def stats(self):
+        return [
+            adapter._connection_manager.stats() for adapter in self.adapters
+        ]
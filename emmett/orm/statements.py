@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+    emmett.orm.statements
+    ---------------------
+
+    Provides compiled SQL statements cache.
+
+    :copyright: 2014 Giovanni Barillari
+    :license: BSD-3-Clause
+"""
+
+import datetime
+import decimal
+import itertools
+import re
+import threading
+
+from collections import OrderedDict
+
+from pydal.helpers.methods import use_common_filters
+from pydal.objects import Expression, Field, Query, Table
+
+from ..datastructures import sdict
+
+
+class Uncacheable(Exception):
+    pass
+
+
+class SQLParam(Expression):
+    #: renders as `(__emt_p<idx>__)`, replaced by the driver placeholder
+    #  once the statement is compiled
+    def __init__(self, db, idx):
+        super().__init__(db, f'__emt_p{idx}__')
+
+
+class Statement:
+    __slots__ = ['name', 'sql', 'prepared_sql', 'colnames', 'order', 'hits']
+
+    _names = itertools.count()
+
+    def __init__(self, sql, prepared_sql, colnames, order):
+        self.name = f'emt_s{next(self._names)}'
+        self.sql = sql
+        self.prepared_sql = prepared_sql
+        self.colnames = colnames
+        self.order = order
+        self.hits = 0
+
+    def params(self, values):
+        return tuple(values[idx] for idx in self.order)
+
+
+class StatementCache:
+    placeholders = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}
+    inline_types = (
+        bool, int, float, str, bytes, decimal.Decimal,
+        datetime.date, datetime.datetime, datetime.time
+    )
+    bindable_ops = {'eq', 'ne', 'lt', 'lte', 'gt', 'gte', 'belongs'}
+    supported_attributes = {
+        'orderby', 'groupby', 'distinct', 'limitby', 'for_update',
+        'orderby_on_limitby', 'left', 'join', 'having', 'outer_scoped',
+        'cacheable', '_concrete_tables'
+    }
+    _re_params = re.compile(r'\(__emt_p(\d+)__\)')
+
+    def __init__(self, max_size=500):
+        self.max_size = max_size
+        self.statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return sdict(
+            size=len(self.statements),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses
+        )
+
+    def clear(self):
+        with self._lock:
+            self.statements.clear()
+
+    @staticmethod
+    def _bind_kind(adapter, field):
+        ftype = field.type
+        if not isinstance(ftype, str):
+            return None
+        if ftype.startswith(('reference ', 'big-reference ')):
+            rtname, _, rfname = ftype.split(' ', 1)[1].partition('.')
+            rtable = adapter.db.get(rtname)
+            if rtable is None:
+                return None
+            rfield = rtable[rfname] if rfname else rtable._id
+            if rfield is None:
+                return None
+            ftype = rfield.type
+        if ftype in ('id', 'integer', 'bigint'):
+            return int
+        if ftype in ('string', 'text', 'password'):
+            return str
+        if ftype in ('float', 'double'):
+            return float
+        return None
+
+    @staticmethod
+    def _bind_value(kind, value):
+        if value is None or isinstance(value, bool):
+            return None
+        if kind is int and isinstance(value, int):
+            return int(value)
+        if kind is str and isinstance(value, str):
+            return str(value)
+        if kind is float and isinstance(value, (int, float)):
+            return float(value)
+        return None
+
+    def _inline_key(self, value):
+        if value is None or isinstance(value, self.inline_types):
+            return (type(value).__name__, value)
+        if isinstance(value, (list, tuple)):
+            return tuple(self._inline_key(item) for item in value)
+        if isinstance(value, (set, frozenset)):
+            return frozenset(self._inline_key(item) for item in value)
+        raise Uncacheable
+
+    def _node_key(self, adapter, node, values):
+        #: `values` collects the parameters to bind, pass `None` to inline
+        #  every value in the key
+        if node is None:
+            return None
+        if isinstance(node, Field):
+            return ('F', node.longname)
+        if isinstance(node, Table):
+            return ('T', str(node))
+        if isinstance(node, (Expression, Query)):
+            if isinstance(node.op, str):
+                op = node.op
+            elif getattr(node.op, '__self__', None) is adapter.dialect:
+                op = node.op.__name__
+            else:
+                raise Uncacheable
+            first = self._node_key(adapter, node.first, values)
+            second = self._param_key(adapter, node, op, values)
+            if second is None:
+                second = self._node_key(adapter, node.second, values)
+            return (
+                op, first, second,
+                getattr(node, 'ignore_common_filters', None),
+                self._inline_key(getattr(node, 'type', None)),
+                tuple(
+                    (key, self._node_key(adapter, val, None))
+                    for key, val in sorted(self._optional_args(node).items())
+                )
+            )
+        if isinstance(node, (list, tuple)):
+            return tuple(self._node_key(adapter, item, values) for item in node)
+        return self._inline_key(node)
+
+    @staticmethod
+    def _optional_args(node):
+        #: pyDAL stores the rendering environment in the optional args
+        return {
+            key: val for key, val in (node.optional_args or {}).items()
+            if key != 'query_env'
+        }
+
+    def _param_key(self, adapter, node, op, values):
+        if (
+            values is None or op not in self.bindable_ops or
+            not isinstance(node.first, Field)
+        ):
+            return None
+        kind = self._bind_kind(adapter, node.first)
+        if kind is None:
+            return None
+        items = node.second if op == 'belongs' else [node.second]
+        if not isinstance(items, (list, tuple, set, frozenset)) or not items:
+            return None
+        bound = [self._bind_value(kind, item) for item in items]
+        if any(item is None for item in bound):
+            return None
+        values.extend(bound)
+        return ('P', len(bound))
+
+    def _build_query(self, adapter, node, counter):
+        if isinstance(node, (Expression, Query)) and not isinstance(
+            node, Field
+        ):
+            op = node.op if isinstance(node.op, str) else node.op.__name__
+            first = self._build_query(adapter, node.first, counter)
+            if self._param_key(adapter, node, op, []) is not None:
+                items = node.second if op == 'belongs' else [node.second]
+                params = []
+                for _ in items:
+                    params.append(SQLParam(adapter.db, counter[0]))
+                    counter[0] += 1
+                second = params if op == 'belongs' else params[0]
+            else:
+                second = self._build_query(adapter, node.second, counter)
+            if isinstance(node, Query):
+                return Query(
+                    node.db, node.op, first, second,
+                    ignore_common_filters=node.ignore_common_filters,
+                    **self._optional_args(node)
+                )
+            return Expression(
+                node.db, node.op, first, second, node.type,
+                **self._optional_args(node)
+            )
+        if isinstance(node, (list, tuple)):
+            return type(node)(
+                self._build_query(adapter, item, counter) for item in node
+            )
+        return node
+
+    def _key(self, adapter, query, fields, attributes, values):
+        if set(attributes) - self.supported_attributes:
+            raise Uncacheable
+        if (
+            use_common_filters(query) and
+            any(table._common_filter for table in adapter.db) and
+            any(
+                table._common_filter
+                for table in adapter.tables(query).values()
+            )
+        ):
+            raise Uncacheable
+        return (
+            self._node_key(adapter, query, values),
+            self._node_key(adapter, list(fields), None),
+            tuple(
+                (key, self._node_key(adapter, attributes[key], None))
+                for key in sorted(attributes) if key != '_concrete_tables'
+            )
+        )
+
+    def _compile(self, adapter, query, fields, attributes, nvalues):
+        placeholder = self.placeholders.get(
+            getattr(adapter.driver, 'paramstyle', None)
+        )
+        if placeholder is None:
+            raise Uncacheable
+        pquery = self._build_query(adapter, query, [0])
+        colnames, sql = adapter._select_wcols(pquery, fields, **attributes)
+        order = [int(idx) for idx in self._re_params.findall(sql)]
+        if sorted(set(order)) != list(range(nvalues)):
+            raise Uncacheable
+        #: avoid dealing with drivers escaping rules on `format` paramstyle
+        if placeholder == '%s' and '%' in sql:
+            raise Uncacheable
+        #: server-side prepared statements use numbered parameters
+        numbers = itertools.count(1)
+        return Statement(
+            self._re_params.sub(placeholder, sql),
+            self._re_params.sub(lambda _: f'${next(numbers)}', sql),
+            colnames,
+            order
+        )
+
+    def get(self, adapter, query, fields, attributes):
+        values = []
+        try:
+            key = self._key(adapter, query, fields, attributes, values)
+        except Uncacheable:
+            return None, None
+        with self._lock:
+            if key in self.statements:
+                self.statements.move_to_end(key)
+                statement = self.statements[key]
+                if statement is None:
+                    return None, None
+                self.hits += 1
+                statement.hits += 1
+                return statement, statement.params(values)
+            self.misses += 1
+        try:
+            statement = self._compile(
+                adapter, query, fields, attributes, len(values)
+            )
+        except Uncacheable:
+            #: store the shape anyway, so we don't try compiling it again
+            statement = None
+        with self._lock:
+            self.statements[key] = statement
+            while len(self.statements) > self.max_size:
+                self.statements.popitem(last=False)
+        if statement is None:
+            return None, None
+        return statement, statement.params(values)
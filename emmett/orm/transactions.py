@@ -18,6 +18,18 @@ import uuid
 from functools import wraps
 
 
+def _invalidate_queries(adapter, tablenames):
+    adapter.db._query_cache.invalidate(tablenames)
+    tablenames.clear()
+
+
+def _forget_identities(adapter):
+    #: records loaded within a rolled back transaction might be gone
+    identity = adapter.db.identity_map
+    if identity is not None:
+        identity.clear()
+
+
 class callable_context_manager(object):
     def __call__(self, fn):
         @wraps(fn)
@@ -43,10 +55,14 @@ class _atomic(callable_context_manager):
 
 
 class _transaction(callable_context_manager):
+    #: set on the transactions opened together with connections
+    implicit = False
+
     def __init__(self, adapter, lock_type=None):
         self.adapter = adapter
         self._lock_type = lock_type
         self._ops = []
+        self._changed_tables = set()
 
     def _add_op(self, op):
         self._ops.append(op)
@@ -66,6 +82,7 @@ class _transaction(callable_context_manager):
                 callback(op.op_type, op.context)
             for callback in getattr(op.table, f"_before_commit_{op.op_type}"):
                 callback(op.context)
+        self.adapter.close_server_side_cursors()
         self.adapter.commit()
         for op in self._ops:
             for callback in op.table._after_commit:
@@ -73,12 +90,16 @@ class _transaction(callable_context_manager):
             for callback in getattr(op.table, f"_after_commit_{op.op_type}"):
                 callback(op.context)
         self._ops.clear()
+        _invalidate_queries(self.adapter, self._changed_tables)
         if begin:
             self._begin()
 
     def rollback(self, begin=True):
         self._ops.clear()
+        self.adapter.close_server_side_cursors()
         self.adapter.rollback()
+        _forget_identities(self.adapter)
+        self._changed_tables.clear()
         if begin:
             self._begin()
 
@@ -103,11 +124,14 @@ class _transaction(callable_context_manager):
 
 
 class _savepoint(callable_context_manager):
+    implicit = False
+
     def __init__(self, adapter, sid=None):
         self.adapter = adapter
         self.sid = sid or 's' + uuid.uuid4().hex
         self.quoted_sid = self.adapter.dialect.quote(self.sid)
         self._ops = []
+        self._changed_tables = set()
         self._parent = None
 
     def _add_op(self, op):
@@ -127,6 +151,8 @@ class _savepoint(callable_context_manager):
     def rollback(self):
         self._ops.clear()
         self.adapter.execute('ROLLBACK TO SAVEPOINT %s;' % self.quoted_sid)
+        _forget_identities(self.adapter)
+        self._changed_tables.clear()
 
     def __enter__(self):
         self._parent = self.adapter.top_transaction()
@@ -143,6 +169,11 @@ class _savepoint(callable_context_manager):
                     self.commit(begin=False)
                     if self._parent:
                         self._parent._add_ops(self._ops)
+                        self._parent._changed_tables |= self._changed_tables
+                    else:
+                        _invalidate_queries(
+                            self.adapter, self._changed_tables
+                        )
                 except Exception:
                     self.rollback()
                     raise
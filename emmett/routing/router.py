@@ -31,7 +31,7 @@ from .rules import RoutingRule, HTTPRoutingRule, WebsocketRoutingRule
 
 
 RouteRecReq = namedtuple(
-    "RouteRecReq", ["name", "match", "dispatch"]
+    "RouteRecReq", ["name", "match", "dispatch", "limits"]
 )
 RouteRecWS = namedtuple(
     "RouteRecWS", ["name", "match", "dispatch", "flow_recv", "flow_send"]
@@ -217,7 +217,8 @@ class HTTPRouter(Router):
                 routing_dict[slot][key] = self._routing_rec_builder(
                     name=route.name,
                     match=route.match,
-                    dispatch=route.dispatchers[method].dispatch
+                    dispatch=route.dispatchers[method].dispatch,
+                    limits=route.limits
                 )
         self.routes_out[route.name] = {
             'host': route.hostname,
@@ -246,6 +247,9 @@ class HTTPRouter(Router):
         if not match:
             raise HTTP(404, body="Resource not found\n")
         request.name = match.name
+        if match.limits:
+            request._apply_limits(match.limits)
+        request._check_limits()
         return await match.dispatch(reqargs, response)
 
 
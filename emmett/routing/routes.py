@@ -204,11 +204,12 @@ class Route:
 
 
 class HTTPRoute(Route):
-    __slots__ = ['methods', 'dispatchers']
+    __slots__ = ['methods', 'dispatchers', 'limits']
 
     def __init__(self, rule, path, idx):
         super().__init__(rule, path, idx)
         self.methods = tuple(method.upper() for method in rule.methods)
+        self.limits = rule.limits
         self.build_dispatchers(rule)
 
     def build_dispatchers(self, rule):
@@ -17,6 +17,7 @@ from typing import Any, Callable
 
 from ..cache import RouteCacheRule
 from ..pipeline import RequestPipeline, WebsocketPipeline, Pipe
+from ..wrappers.request import Request
 from .routes import HTTPRoute, WebsocketRoute
 
 
@@ -52,6 +53,7 @@ class HTTPRoutingRule(RoutingRule):
         'f',
         'head_builder',
         'hostname',
+        'limits',
         'methods',
         'name',
         'output_type',
@@ -70,7 +72,8 @@ class HTTPRoutingRule(RoutingRule):
     def __init__(
         self, router, paths=None, name=None, template=None, pipeline=None,
         injectors=None, schemes=None, hostname=None, methods=None, prefix=None,
-        template_folder=None, template_path=None, cache=None, output='auto'
+        template_folder=None, template_path=None, cache=None, output='auto',
+        limits=None
     ):
         super().__init__(router)
         self.name = name
@@ -95,6 +98,13 @@ class HTTPRoutingRule(RoutingRule):
                 'Invalid output specified. Allowed values are: {}'.format(
                     ', '.join(self.router._outputs.keys())))
         self.output_type = output
+        self.limits = dict(limits or {})
+        invalid_limits = set(self.limits) - Request._limits_keys
+        if invalid_limits:
+            raise SyntaxError(
+                'Invalid limits specified: {}. Allowed values are: {}'.format(
+                    ', '.join(sorted(invalid_limits)),
+                    ', '.join(sorted(Request._limits_keys))))
         self.template = template
         self.template_folder = template_folder
         self.template_path = template_path or self.app.template_path
@@ -9,19 +9,15 @@
     :license: BSD-3-Clause
 """
 
-import asyncio
-
 from datetime import datetime
 from typing import Any, Dict, List, Union, Optional
-from urllib.parse import parse_qs
 
 from granian.rsgi import Scope, HTTPProtocol, ProtocolClosed
 
 from .helpers import WSTransport
 from ..datastructures import sdict
-from ..http import HTTP
 from ..utils import cachedprop
-from ..wrappers.helpers import regex_client
+from ..wrappers.helpers import parse_params, regex_client
 from ..wrappers.request import Request as _Request
 from ..wrappers.websocket import Websocket as _Websocket
 
@@ -44,15 +40,7 @@ class RSGIIngressMixin:
 
     @cachedprop
     def query_params(self) -> sdict[str, Union[str, List[str]]]:
-        rv: sdict[str, Any] = sdict()
-        for key, values in parse_qs(
-            self._scope.query_string, keep_blank_values=True
-        ).items():
-            if len(values) == 1:
-                rv[key] = values[0]
-                continue
-            rv[key] = values
-        return rv
+        return parse_params(self._scope.query_string)
 
 
 class Request(RSGIIngressMixin, _Request):
@@ -64,30 +52,27 @@ class Request(RSGIIngressMixin, _Request):
         path: str,
         protocol: HTTPProtocol,
         max_content_length: Optional[int] = None,
-        body_timeout: Optional[int] = None
+        body_timeout: Optional[int] = None,
+        min_transfer_rate: Optional[int] = None,
+        max_headers: Optional[int] = None,
+        max_headers_size: Optional[int] = None
     ):
         super().__init__(scope, path, protocol)
         self.max_content_length = max_content_length
         self.body_timeout = body_timeout
+        self.min_transfer_rate = min_transfer_rate
+        self.max_headers = max_headers
+        self.max_headers_size = max_headers_size
         self._now = datetime.utcnow()
         self.method = scope.method
 
-    @property
-    def _multipart_headers(self):
-        return dict(self.headers.items())
-
-    @cachedprop
-    async def body(self) -> bytes:
-        if (
-            self.max_content_length and
-            self.content_length > self.max_content_length
-        ):
-            raise HTTP(413, 'Request entity too large')
-        try:
-            rv = await asyncio.wait_for(self._proto(), timeout=self.body_timeout)
-        except asyncio.TimeoutError:
-            raise HTTP(408, 'Request timeout')
-        return rv
+    async def _input_stream(self):
+        #: fallback on full body for protocol versions without streaming
+        if not hasattr(self._proto, '__aiter__'):
+            yield await self._proto()
+            return
+        async for chunk in self._proto:
+            yield chunk
 
     @cachedprop
     def client(self) -> str:
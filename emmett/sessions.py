@@ -11,24 +11,123 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
 import pickle
+import struct
 import tempfile
+import threading
 import time
 import zlib
 
-from typing import Any, Dict, Optional, Type, TypeVar
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
 
 from emmett_crypto import symmetric as crypto_symmetric
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 from .ctx import current
 from .datastructures import sdict, SessionData
+from .extensions import Signals
+from .parsers import Parsers
 from .pipeline import Pipe
 from .security import uuid
+from .serializers import Serializers, _json_default
 from .wrappers import IngressWrapper
 
 
+class SessionCodec:
+    #: session data is stored in frames made of a version byte, the codec
+    #  id, a flags byte and the encoded payload. Contents stored before
+    #  frames were introduced are plain pickle dumps.
+    id = 0
+    frame_version = 1
+    flag_compressed = 1
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class PickleSessionCodec(SessionCodec):
+    id = 1
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        return pickle.dumps(sdict(data), pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        return pickle.loads(data)
+
+
+def _sdict_tree(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return sdict((key, _sdict_tree(val)) for key, val in obj.items())
+    if isinstance(obj, list):
+        return [_sdict_tree(val) for val in obj]
+    return obj
+
+
+class JSONSessionCodec(SessionCodec):
+    id = 2
+
+    def __init__(self):
+        self._dumps = Serializers.get_for('json')
+        self._loads = Parsers.get_for('json')
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        rv = self._dumps(data)
+        return rv.encode('utf8') if isinstance(rv, str) else rv
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        return _sdict_tree(self._loads(data))
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return _json_default(obj)
+
+
+class MsgpackSessionCodec(SessionCodec):
+    id = 3
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError('no msgpack module found')
+        self._msgpack = msgpack
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        return self._msgpack.packb(data, default=_msgpack_default)
+
+    def loads(self, data: bytes) -> Dict[str, Any]:
+        return self._msgpack.unpackb(data, object_hook=sdict, raw=False)
+
+
+_session_codecs: Dict[str, Type[SessionCodec]] = {
+    'pickle': PickleSessionCodec,
+    'json': JSONSessionCodec,
+    'msgpack': MsgpackSessionCodec
+}
+_session_codecs_ids: Dict[int, Type[SessionCodec]] = {
+    codec.id: codec for codec in _session_codecs.values()
+}
+
+
 class SessionPipe(Pipe):
+    compression_level = 0
+
     def __init__(
         self,
         expire: int = 3600,
@@ -36,7 +135,9 @@ class SessionPipe(Pipe):
         samesite: str = "Lax",
         domain: Optional[str] = None,
         cookie_name: Optional[str] = None,
-        cookie_data: Optional[Dict[str, Any]] = None
+        cookie_data: Optional[Dict[str, Any]] = None,
+        track_mutations: bool = False,
+        codec: str = "pickle"
     ):
         self.expire = expire
         self.secure = secure
@@ -46,6 +147,41 @@ class SessionPipe(Pipe):
             cookie_name or f'emt_session_data_{current.app.name}'
         )
         self.cookie_data = cookie_data or {}
+        self.track_mutations = track_mutations
+        if codec not in _session_codecs:
+            raise ValueError(f"Unsupported session codec: {codec}")
+        self.codec = _session_codecs[codec]()
+        self._codecs = {self.codec.id: self.codec}
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        flags, payload = 0, self.codec.dumps(data)
+        if self.compression_level:
+            flags |= SessionCodec.flag_compressed
+            payload = zlib.compress(payload, self.compression_level)
+        return bytes(
+            (SessionCodec.frame_version, self.codec.id, flags)
+        ) + payload
+
+    def _decode(self, data: bytes) -> Dict[str, Any]:
+        if data[:1] != bytes((SessionCodec.frame_version,)):
+            #: legacy contents, eventually compressed
+            if self.compression_level and data[:1] != b'\x80':
+                data = zlib.decompress(data)
+            return pickle.loads(data)
+        codec_id, flags, payload = data[1], data[2], data[3:]
+        if codec_id not in self._codecs:
+            self._codecs[codec_id] = _session_codecs_ids[codec_id]()
+        if flags & SessionCodec.flag_compressed:
+            payload = zlib.decompress(payload)
+        return self._codecs[codec_id].loads(payload)
+
+    def _build_session(self, data=None, sid=None, expires=None) -> SessionData:
+        return SessionData(
+            data,
+            sid=sid,
+            expires=expires,
+            track_mutations=self.track_mutations
+        )
 
     def _load_session(self, wrapper: IngressWrapper):
         raise NotImplementedError
@@ -53,9 +189,9 @@ class SessionPipe(Pipe):
     def _new_session(self) -> SessionData:
         raise NotImplementedError
 
-    def _pack_session(self, expiration: int):
-        current.response.cookies[self.cookie_name] = self._session_cookie_data()
-        cookie_data = current.response.cookies[self.cookie_name]
+    def _set_cookie(self, name: str, value: str, expiration: int):
+        current.response.cookies[name] = value
+        cookie_data = current.response.cookies[name]
         cookie_data['path'] = "/"
         cookie_data['expires'] = expiration
         cookie_data['samesite'] = self.samesite
@@ -66,6 +202,11 @@ class SessionPipe(Pipe):
         for key, val in self.cookie_data.items():
             cookie_data[key] = val
 
+    def _pack_session(self, expiration: int):
+        self._set_cookie(
+            self.cookie_name, self._session_cookie_data(), expiration
+        )
+
     def _session_cookie_data(self) -> str:
         raise NotImplementedError
 
@@ -90,6 +231,11 @@ class SessionPipe(Pipe):
 
 
 class CookieSessionPipe(SessionPipe):
+    #: values exceeding the chunk size are split in multiple cookies,
+    #  staying under the 4KB limit browsers apply on each of them
+    cookie_chunk_size = 3800
+    decrypt_cache_size = 512
+
     def __init__(
         self,
         key,
@@ -99,6 +245,8 @@ class CookieSessionPipe(SessionPipe):
         domain=None,
         cookie_name=None,
         cookie_data=None,
+        track_mutations=False,
+        codec="pickle",
         encryption_mode="modern",
         compression_level=0
     ):
@@ -108,39 +256,96 @@ class CookieSessionPipe(SessionPipe):
             samesite=samesite,
             domain=domain,
             cookie_name=cookie_name,
-            cookie_data=cookie_data
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec
         )
         self.key = key
         if encryption_mode != "modern":
             raise ValueError("Unsupported encryption_mode")
         self.compression_level = compression_level
+        self._decrypt_cache: OrderedDict[str, bytes] = OrderedDict()
 
     def _encrypt_data(self) -> str:
-        data = pickle.dumps(sdict(current.session))
-        if self.compression_level:
-            data = zlib.compress(data, self.compression_level)
-        return crypto_symmetric.encrypt_b64(data, self.key)
+        return crypto_symmetric.encrypt_b64(
+            self._encode(current.session), self.key
+        )
 
-    def _decrypt_data(self, data: str) -> SessionData:
+    def _decrypt(self, data: str) -> bytes:
+        #: decrypted payloads are cached by cookie value, so subsequent
+        #  requests carrying the same cookie skip the decryption
         try:
-            ddata = crypto_symmetric.decrypt_b64(data, self.key)
-            if self.compression_level:
-                ddata = zlib.decompress(ddata)
-            rv = pickle.loads(ddata)
+            rv = self._decrypt_cache[data]
+        except KeyError:
+            pass
+        else:
+            self._decrypt_cache.move_to_end(data)
+            return rv
+        rv = crypto_symmetric.decrypt_b64(data, self.key)
+        self._decrypt_cache[data] = rv
+        while len(self._decrypt_cache) > self.decrypt_cache_size:
+            self._decrypt_cache.popitem(last=False)
+        return rv
+
+    def _decrypt_data(self, data: Optional[str]) -> SessionData:
+        try:
+            rv = self._decode(self._decrypt(data))
         except Exception:
             rv = None
-        return SessionData(rv, expires=self.expire)
+        return self._build_session(rv, expires=self.expire)
+
+    def _chunk_name(self, idx: int) -> str:
+        return self.cookie_name if not idx else f"{self.cookie_name}_{idx}"
+
+    def _read_cookie(self, wrapper: IngressWrapper) -> Optional[str]:
+        value = wrapper.cookies[self.cookie_name].value
+        count, sep, first = value.partition('~')
+        if not sep:
+            return value
+        try:
+            count = int(count)
+        except ValueError:
+            return None
+        rv = [first]
+        for idx in range(1, count):
+            name = self._chunk_name(idx)
+            if name not in wrapper.cookies:
+                return None
+            rv.append(wrapper.cookies[name].value)
+        return ''.join(rv)
 
     def _load_session(self, wrapper: IngressWrapper) -> SessionData:
-        cookie_data = wrapper.cookies[self.cookie_name].value
-        return self._decrypt_data(cookie_data)
+        return self._decrypt_data(self._read_cookie(wrapper))
 
     def _new_session(self) -> SessionData:
-        return SessionData(expires=self.expire)
+        return self._build_session(expires=self.expire)
 
     def _session_cookie_data(self) -> str:
+        #: re-send the received cookie when the session didn't change,
+        #  so the client expiration is refreshed without re-encrypting
+        if (
+            not current.session._modified and
+            self.cookie_name in current.request.cookies
+        ):
+            data = self._read_cookie(current.request)
+            if data in self._decrypt_cache:
+                return data
         return self._encrypt_data()
 
+    def _pack_session(self, expiration: int):
+        data = self._session_cookie_data()
+        size = self.cookie_chunk_size
+        chunks = [data[idx:idx + size] for idx in range(0, len(data), size)]
+        if len(chunks) > 1:
+            chunks[0] = f"{len(chunks)}~{chunks[0]}"
+        for idx, chunk in enumerate(chunks):
+            self._set_cookie(self._chunk_name(idx), chunk, expiration)
+        #: expire chunks left over by bigger sessions
+        idx = max(len(chunks), 1)
+        while self._chunk_name(idx) in current.request.cookies:
+            self._set_cookie(self._chunk_name(idx), '', 0)
+            idx += 1
+
     def clear(self):
         raise NotImplementedError(
             f"{self.__class__.__name__} doesn't support sessions clearing. "
@@ -150,7 +355,7 @@ class CookieSessionPipe(SessionPipe):
 
 class BackendStoredSessionPipe(SessionPipe):
     def _new_session(self):
-        return SessionData(sid=uuid())
+        return self._build_session(sid=uuid())
 
     def _session_cookie_data(self) -> str:
         return current.session._sid
@@ -159,7 +364,7 @@ class BackendStoredSessionPipe(SessionPipe):
         sid = wrapper.cookies[self.cookie_name].value
         data = self._load(sid)
         if data is not None:
-            return SessionData(data, sid=sid)
+            return self._build_session(data, sid=sid)
         return None
 
     def _delete_session(self):
@@ -196,7 +401,12 @@ class FileSessionPipe(BackendStoredSessionPipe):
         domain=None,
         cookie_name=None,
         cookie_data=None,
-        filename_template='emt_%s.sess'
+        track_mutations=False,
+        codec="pickle",
+        filename_template='emt_%s.sess',
+        shards=1,
+        sweep_interval=0,
+        fsync=False
     ):
         super().__init__(
             expire=expire,
@@ -204,64 +414,162 @@ class FileSessionPipe(BackendStoredSessionPipe):
             samesite=samesite,
             domain=domain,
             cookie_name=cookie_name,
-            cookie_data=cookie_data
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec
         )
         assert not filename_template.endswith(self._fs_transaction_suffix), \
             'filename templates cannot end with %s' % \
             self._fs_transaction_suffix
         self._filename_template = filename_template
         self._path = os.path.join(current.app.root_path, 'sessions')
+        self.shards = shards
+        self.sweep_interval = sweep_interval
+        self.fsync = fsync
+        self._sweeper = None
         #: create required paths if needed
         if not os.path.exists(self._path):
             os.mkdir(self._path)
+        if self.sweep_interval:
+            current.app._extensions_listeners[Signals.after_loop].append(
+                self._start_sweeper
+            )
+            current.app._extensions_listeners[Signals.before_shutdown].append(
+                self._stop_sweeper
+            )
 
     def _delete_session(self):
+        sid = current.session._sid
+        for fn in (self._get_filename(sid), self._get_legacy_filename(sid)):
+            try:
+                os.unlink(fn)
+            except OSError:
+                pass
+
+    def _save_session(self, expiration):
+        if current.session._modified:
+            self._store(current.session, expiration)
+            return
+        #: expiration is tracked by files mtime, refresh it without writing
         fn = self._get_filename(current.session._sid)
         try:
-            os.unlink(fn)
+            os.utime(fn, (time.time(), time.time() + expiration))
         except OSError:
             pass
 
-    def _save_session(self, expiration):
-        if current.session._modified:
-            self._store(current.session, expiration)
+    def _get_shard(self, sid):
+        digest = hashlib.md5(str(sid).encode('utf8')).hexdigest()
+        return os.path.join(
+            self._path,
+            *[digest[idx * 2:idx * 2 + 2] for idx in range(self.shards)]
+        )
 
     def _get_filename(self, sid):
+        return os.path.join(
+            self._get_shard(sid), self._filename_template % str(sid)
+        )
+
+    def _get_legacy_filename(self, sid):
+        #: sessions stored before sharding was introduced
         return os.path.join(self._path, self._filename_template % str(sid))
 
+    def _migrate_legacy(self, sid, fn):
+        legacy = self._get_legacy_filename(sid)
+        if fn == legacy or not os.path.exists(legacy):
+            return
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        try:
+            os.replace(legacy, fn)
+        except OSError:
+            pass
+
     def _load(self, sid):
+        fn = self._get_filename(sid)
+        if not os.path.exists(fn):
+            self._migrate_legacy(sid, fn)
         try:
-            with open(self._get_filename(sid), 'rb') as f:
-                exp = pickle.load(f)
-                val = pickle.load(f)
+            with open(fn, 'rb') as f:
+                exp = max(pickle.load(f), os.fstat(f.fileno()).st_mtime)
+                data = f.read()
         except IOError:
             return None
         if exp < time.time():
             return None
-        return val
+        try:
+            return self._decode(data)
+        except Exception:
+            return None
 
     def _store(self, session, expiration):
         fn = self._get_filename(session._sid)
         now = time.time()
         exp = now + expiration
+        path = os.path.dirname(fn)
+        os.makedirs(path, exist_ok=True)
         fd, tmp = tempfile.mkstemp(
-            suffix=self._fs_transaction_suffix, dir=self._path)
+            suffix=self._fs_transaction_suffix, dir=path)
         f = os.fdopen(fd, 'wb')
         try:
             pickle.dump(exp, f, 1)
-            pickle.dump(sdict(session), f, pickle.HIGHEST_PROTOCOL)
+            f.write(self._encode(session))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
         finally:
             f.close()
         try:
-            os.rename(tmp, fn)
-            os.chmod(fn, self._fs_mode)
+            os.utime(tmp, (now, exp))
+            os.chmod(tmp, self._fs_mode)
+            os.replace(tmp, fn)
         except Exception:
             pass
 
+    def _iter_files(self):
+        for root, _, files in os.walk(self._path):
+            for name in files:
+                yield os.path.join(root, name)
+
+    def _expired(self, fn, now):
+        if fn.endswith(self._fs_transaction_suffix):
+            return os.stat(fn).st_mtime + self.expire < now
+        if os.stat(fn).st_mtime >= now:
+            return False
+        #: files written before mtime tracking carry only the stored value
+        with open(fn, 'rb') as f:
+            return pickle.load(f) < now
+
+    def sweep(self):
+        #: removes expired sessions and orphaned temporary files
+        now = time.time()
+        for fn in self._iter_files():
+            try:
+                if self._expired(fn, now):
+                    os.unlink(fn)
+            except Exception:
+                pass
+
+    async def _sweep_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception:
+                pass
+
+    def _start_sweeper(self, loop):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = loop.create_task(self._sweep_loop())
+
+    def _stop_sweeper(self, loop=None):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
     def clear(self):
-        for element in os.listdir(self._path):
+        for fn in self._iter_files():
             try:
-                os.unlink(os.path.join(self._path, element))
+                os.unlink(fn)
             except Exception:
                 pass
 
@@ -276,7 +584,9 @@ class RedisSessionPipe(BackendStoredSessionPipe):
         samesite="Lax",
         domain=None,
         cookie_name=None,
-        cookie_data=None
+        cookie_data=None,
+        track_mutations=False,
+        codec="pickle"
     ):
         super().__init__(
             expire=expire,
@@ -284,7 +594,9 @@ class RedisSessionPipe(BackendStoredSessionPipe):
             samesite=samesite,
             domain=domain,
             cookie_name=cookie_name,
-            cookie_data=cookie_data
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec
         )
         self.redis = redis
         self.prefix = prefix
@@ -297,19 +609,290 @@ class RedisSessionPipe(BackendStoredSessionPipe):
             self.redis.setex(
                 self.prefix + current.session._sid,
                 expiration,
-                current.session._dump
+                self._encode(current.session)
             )
         else:
             self.redis.expire(self.prefix + current.session._sid, expiration)
 
     def _load(self, sid):
         data = self.redis.get(self.prefix + sid)
-        return pickle.loads(data) if data else data
+        if not data:
+            return data
+        try:
+            return self._decode(data)
+        except Exception:
+            return None
 
     def clear(self):
         self.redis.delete(self.prefix + "*")
 
 
+class MemorySessionStore:
+    #: LRU bound, TTL expiring store living in the process memory
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, sid: str) -> Any:
+        try:
+            exp, data = self._data[sid]
+        except KeyError:
+            return None
+        if exp < time.time():
+            self._data.pop(sid, None)
+            return None
+        self._data.move_to_end(sid)
+        return data
+
+    def set(self, sid: str, data: Any, expiration: int) -> bool:
+        #: returns whether a live session was evicted to make room
+        self._data[sid] = (time.time() + expiration, data)
+        self._data.move_to_end(sid)
+        evicted, now = False, time.time()
+        while len(self._data) > self.max_sessions:
+            _, (exp, _) = self._data.popitem(last=False)
+            evicted = evicted or exp >= now
+        return evicted
+
+    def touch(self, sid: str, expiration: int):
+        try:
+            data = self._data[sid][1]
+        except KeyError:
+            return
+        self._data[sid] = (time.time() + expiration, data)
+
+    def delete(self, sid: str):
+        self._data.pop(sid, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class SharedMemorySessionStore:
+    #: fixed size slots in a shared memory segment, addressed by the hash
+    #  of the session id with linear probing. Every slot stores the session
+    #  id, its expiration, the payload size and the payload itself.
+    _header = struct.Struct('<36sdI')
+    probes = 8
+
+    def __init__(self, name: str, slots: int, slot_size: int):
+        self.slots = slots
+        self.slot_size = slot_size
+        try:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=slots * slot_size
+            )
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        #: the segment outlives the worker creating it, otherwise its
+        #  resource tracker would unlink it when the worker exits: `close`
+        #  unlinks it on application shutdown
+        if os.name == 'posix':
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self._buf = self._shm.buf
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        if fcntl is not None:
+            self._lock_fd = os.open(
+                os.path.join(tempfile.gettempdir(), f'{name}.lock'),
+                os.O_RDWR | os.O_CREAT,
+                0o600
+            )
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._lock_fd is None:
+                yield
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _key(self, sid: str) -> bytes:
+        return sid.encode('latin-1')[:36].ljust(36, b'\x00')
+
+    def _slots_for(self, key: bytes):
+        idx = zlib.crc32(key) % self.slots
+        for offset in range(min(self.probes, self.slots)):
+            yield ((idx + offset) % self.slots) * self.slot_size
+
+    def _read_header(self, pos: int) -> Tuple[bytes, float, int]:
+        return self._header.unpack_from(self._buf, pos)
+
+    def _find(self, key: bytes) -> Optional[int]:
+        for pos in self._slots_for(key):
+            if self._read_header(pos)[0] == key:
+                return pos
+        return None
+
+    def get(self, sid: str) -> Optional[bytes]:
+        key = self._key(sid)
+        with self._locked():
+            pos = self._find(key)
+            if pos is None:
+                return None
+            _, exp, size = self._read_header(pos)
+            if exp < time.time():
+                return None
+            start = pos + self._header.size
+            return bytes(self._buf[start:start + size])
+
+    def set(self, sid: str, data: bytes, expiration: int) -> bool:
+        #: returns whether a live session was evicted to make room
+        if len(data) > self.slot_size - self._header.size:
+            raise ValueError("Session data exceeds the slot size")
+        key, now = self._key(sid), time.time()
+        with self._locked():
+            target, target_exp = None, None
+            for pos in self._slots_for(key):
+                hkey, exp, _ = self._read_header(pos)
+                if hkey == key:
+                    target, target_exp = pos, 0
+                    break
+                #: pick free or expired slots, evicting the oldest otherwise
+                if exp < now:
+                    exp = 0
+                if target is None or exp < target_exp:
+                    target, target_exp = pos, exp
+            self._header.pack_into(
+                self._buf, target, key, now + expiration, len(data)
+            )
+            start = target + self._header.size
+            self._buf[start:start + len(data)] = data
+        return target_exp > 0
+
+    def touch(self, sid: str, expiration: int):
+        key = self._key(sid)
+        with self._locked():
+            pos = self._find(key)
+            if pos is None:
+                return
+            _, _, size = self._read_header(pos)
+            self._header.pack_into(
+                self._buf, pos, key, time.time() + expiration, size
+            )
+
+    def delete(self, sid: str):
+        key = self._key(sid)
+        with self._locked():
+            pos = self._find(key)
+            if pos is not None:
+                self._header.pack_into(self._buf, pos, b'', 0, 0)
+
+    def clear(self):
+        with self._locked():
+            for idx in range(self.slots):
+                self._header.pack_into(
+                    self._buf, idx * self.slot_size, b'', 0, 0
+                )
+
+    def close(self, unlink: bool = False):
+        if self._buf is None:
+            return
+        self._buf = None
+        self._shm.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        if not unlink:
+            return
+        #: `unlink` also unregisters the segment from the resource tracker
+        if os.name == 'posix':
+            resource_tracker.register(self._shm._name, 'shared_memory')
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            #: another worker already removed it
+            if os.name == 'posix':
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+
+class MemorySessionPipe(BackendStoredSessionPipe):
+    def __init__(
+        self,
+        expire=3600,
+        secure=False,
+        samesite="Lax",
+        domain=None,
+        cookie_name=None,
+        cookie_data=None,
+        track_mutations=False,
+        codec="pickle",
+        max_sessions=10000,
+        shared=False,
+        shared_name=None,
+        shared_slot_size=4096
+    ):
+        super().__init__(
+            expire=expire,
+            secure=secure,
+            samesite=samesite,
+            domain=domain,
+            cookie_name=cookie_name,
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec
+        )
+        self.shared = shared
+        if shared:
+            shared_name = shared_name or 'emt_sess_' + hashlib.md5(
+                f'{current.app.root_path}:{current.app.name}'.encode('utf8')
+            ).hexdigest()[:16]
+            self.store = SharedMemorySessionStore(
+                shared_name, max_sessions, shared_slot_size
+            )
+            current.app._extensions_listeners[Signals.before_shutdown].append(
+                self._close_store
+            )
+        else:
+            self.store = MemorySessionStore(max_sessions)
+
+    def _close_store(self, loop=None):
+        self.store.close(unlink=True)
+
+    def _delete_session(self):
+        self.store.delete(current.session._sid)
+
+    def _save_session(self, expiration):
+        if not current.session._modified:
+            self.store.touch(current.session._sid, expiration)
+            return
+        #: sessions are stored serialized also locally, so that changes to
+        #  nested objects don't leak across requests
+        try:
+            evicted = self.store.set(
+                current.session._sid,
+                self._encode(current.session),
+                expiration
+            )
+        except ValueError:
+            current.app.log.warning(
+                "Session data exceeds the memory sessions slot size, "
+                "increase the `shared_slot_size` parameter"
+            )
+            return
+        if evicted:
+            current.app.log.warning(
+                "Memory sessions store is full, a live session was evicted: "
+                "consider increasing the `max_sessions` parameter"
+            )
+
+    def _load(self, sid):
+        data = self.store.get(sid)
+        if data is None:
+            return data
+        try:
+            return self._decode(data)
+        except Exception:
+            return None
+
+    def clear(self):
+        self.store.clear()
+
+
 TSessionPipe = TypeVar("TSessionPipe", bound=SessionPipe)
 
 
@@ -336,6 +919,8 @@ class SessionManager:
         domain: Optional[str] = None,
         cookie_name: Optional[str] = None,
         cookie_data: Optional[Dict[str, Any]] = None,
+        track_mutations: bool = False,
+        codec: str = "pickle",
         encryption_mode: str = "modern",
         compression_level: int = 0
     ) -> CookieSessionPipe:
@@ -348,6 +933,8 @@ class SessionManager:
             domain=domain,
             cookie_name=cookie_name,
             cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec,
             encryption_mode=encryption_mode,
             compression_level=compression_level
         )
@@ -361,7 +948,12 @@ class SessionManager:
         domain: Optional[str] = None,
         cookie_name: Optional[str] = None,
         cookie_data: Optional[Dict[str, Any]] = None,
-        filename_template: str = 'emt_%s.sess'
+        track_mutations: bool = False,
+        codec: str = "pickle",
+        filename_template: str = 'emt_%s.sess',
+        shards: int = 1,
+        sweep_interval: int = 0,
+        fsync: bool = False
     ) -> FileSessionPipe:
         return cls._build_pipe(
             FileSessionPipe,
@@ -371,7 +963,44 @@ class SessionManager:
             domain=domain,
             cookie_name=cookie_name,
             cookie_data=cookie_data,
-            filename_template=filename_template
+            track_mutations=track_mutations,
+            codec=codec,
+            filename_template=filename_template,
+            shards=shards,
+            sweep_interval=sweep_interval,
+            fsync=fsync
+        )
+
+    @classmethod
+    def memory(
+        cls,
+        expire: int = 3600,
+        secure: bool = False,
+        samesite: str = "Lax",
+        domain: Optional[str] = None,
+        cookie_name: Optional[str] = None,
+        cookie_data: Optional[Dict[str, Any]] = None,
+        track_mutations: bool = False,
+        codec: str = "pickle",
+        max_sessions: int = 10000,
+        shared: bool = False,
+        shared_name: Optional[str] = None,
+        shared_slot_size: int = 4096
+    ) -> MemorySessionPipe:
+        return cls._build_pipe(
+            MemorySessionPipe,
+            expire=expire,
+            secure=secure,
+            samesite=samesite,
+            domain=domain,
+            cookie_name=cookie_name,
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec,
+            max_sessions=max_sessions,
+            shared=shared,
+            shared_name=shared_name,
+            shared_slot_size=shared_slot_size
         )
 
     @classmethod
@@ -384,7 +1013,9 @@ class SessionManager:
         samesite: str = "Lax",
         domain: Optional[str] = None,
         cookie_name: Optional[str] = None,
-        cookie_data: Optional[Dict[str, Any]] = None
+        cookie_data: Optional[Dict[str, Any]] = None,
+        track_mutations: bool = False,
+        codec: str = "pickle"
     ) -> RedisSessionPipe:
         return cls._build_pipe(
             RedisSessionPipe,
@@ -395,7 +1026,9 @@ class SessionManager:
             samesite=samesite,
             domain=domain,
             cookie_name=cookie_name,
-            cookie_data=cookie_data
+            cookie_data=cookie_data,
+            track_mutations=track_mutations,
+            codec=codec
         )
 
     @classmethod
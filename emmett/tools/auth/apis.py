@@ -11,7 +11,7 @@
 
 from __future__ import annotations
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 from pydal.helpers.classes import Reference as _RecordReference
@@ -243,6 +243,12 @@ class AuthPipe(Pipe):
         if not authsess.last_visit or not authsess.last_dbcheck:
             del session.auth
             return
+        #: text based session codecs store dates as ISO strings
+        for key in ('last_visit', 'last_dbcheck'):
+            if isinstance(authsess[key], str):
+                authsess[key] = datetime.fromisoformat(
+                    authsess[key]
+                ).replace(tzinfo=None)
         #: is session expired?
         visit_dt = now().as_naive_datetime()
         if (
@@ -266,6 +272,7 @@ class AuthPipe(Pipe):
                 min(authsess.expiration / 10, 600)
             ):
                 authsess.last_visit = visit_dt
+                session.auth = authsess
 
     def session_close(self):
         # set correct session expiration if requested by user
@@ -21,6 +21,7 @@ from ..datastructures import Accept, sdict
 from ..language.helpers import LanguageAccept
 from ..typing import T
 from ..utils import cachedprop
+from .helpers import RequestCookies
 
 AcceptType = TypeVar("AcceptType", bound=Accept)
 
@@ -76,10 +77,7 @@ class IngressWrapper(Wrapper, metaclass=ABCMeta):
 
     @cachedprop
     def cookies(self) -> SimpleCookie:
-        cookies: SimpleCookie = SimpleCookie()
-        for cookie in self.headers.get('cookie', '').split(';'):
-            cookies.load(cookie)
-        return cookies
+        return RequestCookies(self.headers.get('cookie', ''))
 
     @property
     @abstractmethod
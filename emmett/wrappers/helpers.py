@@ -11,11 +11,16 @@
 
 import re
 
+from http.cookies import CookieError, Morsel, SimpleCookie
+from tempfile import SpooledTemporaryFile
+from urllib.parse import unquote_plus
 from typing import (
+    Any,
     BinaryIO,
     Dict,
     Iterable,
     Iterator,
+    List,
     MutableMapping,
     Optional,
     Tuple,
@@ -23,10 +28,72 @@ from typing import (
 )
 
 from .._internal import loop_copyfileobj
+from ..datastructures import sdict
+from ..http import HTTP
 
 regex_client = re.compile(r'[\w\-:]+(\.[\w\-]+)*\.?')
 
 
+def _split_header_params(data: str) -> Iterator[str]:
+    while data[:1] == ';':
+        data = data[1:]
+        end = data.find(';')
+        #: skip separators within quoted strings
+        while end > 0 and (
+            data.count('"', 0, end) - data.count('\\"', 0, end)
+        ) % 2:
+            end = data.find(';', end + 1)
+        if end < 0:
+            end = len(data)
+        yield data[:end].strip()
+        data = data[end:]
+
+
+def parse_header(line: str) -> Tuple[str, Dict[str, str]]:
+    #: parses a `Content-Type` like header into its main value and
+    #  parameters, as the deprecated `cgi.parse_header` did
+    parts = _split_header_params(';' + line)
+    key = next(parts)
+    params = {}
+    for part in parts:
+        idx = part.find('=')
+        if idx < 0:
+            continue
+        name = part[:idx].strip().lower()
+        value = part[idx + 1:].strip()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1].replace('\\\\', '\\').replace('\\"', '"')
+        params[name] = value
+    return key, params
+
+
+def parse_params(data: str) -> sdict[str, Union[str, List[str]]]:
+    #: single pass equivalent of `parse_qs` with blank values, producing
+    #  plain values for single keys and lists for repeated ones
+    rv: sdict[str, Any] = sdict()
+    if not data:
+        return rv
+    quoted = '%' in data or '+' in data
+    for item in data.split('&'):
+        if not item:
+            continue
+        key, _, value = item.partition('=')
+        if quoted:
+            if '%' in key or '+' in key:
+                key = unquote_plus(key)
+            if '%' in value or '+' in value:
+                value = unquote_plus(value)
+        if key not in rv:
+            rv[key] = value
+            continue
+        stored = rv[key]
+        if isinstance(stored, list):
+            stored.append(value)
+        else:
+            rv[key] = [stored, value]
+    return rv
+
+
 class ResponseHeaders(MutableMapping[str, str]):
     __slots__ = ['_data']
 
@@ -70,6 +137,91 @@ class ResponseHeaders(MutableMapping[str, str]):
         self._data.update(data)
 
 
+class RequestCookies(SimpleCookie):
+    #: parses the cookie header on demand: single lookups only decode
+    #  the requested name, while any other access loads the whole header
+    def __init__(self, raw: str):
+        super().__init__()
+        self._raw = raw
+        self._loaded = not raw
+
+    def _load_all(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        for cookie in self._raw.split(';'):
+            self.load(cookie)
+
+    def _lookup(self, key: str) -> Optional[Morsel]:
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        if self._loaded or key.startswith('$') or key.lower() in Morsel._reserved:
+            return None
+        found = None
+        for cookie in self._raw.split(';'):
+            name, sep, value = cookie.partition('=')
+            if sep and name.strip() == key:
+                found = value.strip()
+        if found is None:
+            return None
+        morsel = Morsel()
+        try:
+            morsel.set(key, *self.value_decode(found))
+        except CookieError:
+            return None
+        dict.__setitem__(self, key, morsel)
+        return morsel
+
+    def __getitem__(self, key: str) -> Morsel:
+        rv = self._lookup(key)
+        if rv is None:
+            raise KeyError(key)
+        return rv
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._lookup(key) is not None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        rv = self._lookup(key)
+        return default if rv is None else rv
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self._load_all()
+        return super().__len__()
+
+    def __eq__(self, other: object) -> bool:
+        self._load_all()
+        return super().__eq__(other)
+
+    def keys(self):
+        self._load_all()
+        return super().keys()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+    def output(self, *args, **kwargs) -> str:
+        self._load_all()
+        return super().output(*args, **kwargs)
+
+    def js_output(self, *args, **kwargs) -> str:
+        self._load_all()
+        return super().js_output(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        self._load_all()
+        return super().__repr__()
+
+
 class FileStorage:
     __slots__ = ('stream', 'filename', 'name', 'headers', 'content_type')
 
@@ -113,3 +265,145 @@ class FileStorage:
         return (
             f'<{self.__class__.__name__}: '
             f'{self.filename} ({self.content_type})')
+
+
+class MultipartReader:
+    __slots__ = (
+        'delimiter', 'separator', 'max_field_size',
+        'max_file_size', 'max_headers_size', 'spool_size',
+        'size', 'params', 'files', '_buffer', '_state', '_part'
+    )
+
+    _st_preamble, _st_boundary, _st_headers, _st_body, _st_end = range(5)
+
+    def __init__(
+        self,
+        boundary: bytes,
+        max_field_size: Optional[int] = None,
+        max_file_size: Optional[int] = None,
+        max_headers_size: int = 16384,
+        spool_size: int = 1024 * 1024
+    ):
+        self.delimiter = b'--' + boundary
+        self.separator = b'\r\n' + self.delimiter
+        self.max_field_size = max_field_size
+        self.max_file_size = max_file_size
+        self.max_headers_size = max_headers_size
+        self.spool_size = spool_size
+        self.size = 0
+        self.params: List[Tuple[str, str]] = []
+        self.files: List[Tuple[str, FileStorage]] = []
+        self._buffer = bytearray()
+        self._state = self._st_preamble
+        self._part: Optional[List[Any]] = None
+
+    def feed(self, data: bytes):
+        self.size += len(data)
+        self._buffer.extend(data)
+        self._parse()
+
+    def _parse(self):
+        buf = self._buffer
+        while True:
+            if self._state == self._st_preamble:
+                idx = buf.find(self.delimiter)
+                if idx < 0:
+                    del buf[:max(len(buf) - len(self.delimiter), 0)]
+                    return
+                del buf[:idx + len(self.delimiter)]
+                self._state = self._st_boundary
+            elif self._state == self._st_boundary:
+                if len(buf) < 2:
+                    return
+                if buf[:2] == b'--':
+                    self._state = self._st_end
+                elif buf[:2] == b'\r\n':
+                    self._state = self._st_headers
+                else:
+                    raise HTTP(400, 'Invalid multipart data')
+                del buf[:2]
+            elif self._state == self._st_headers:
+                idx = buf.find(b'\r\n\r\n')
+                if idx < 0:
+                    if len(buf) > self.max_headers_size:
+                        raise HTTP(400, 'Invalid multipart data')
+                    return
+                self._start_part(bytes(buf[:idx]))
+                del buf[:idx + 4]
+                self._state = self._st_body
+            elif self._state == self._st_body:
+                idx = buf.find(self.separator)
+                if idx < 0:
+                    #: keep enough data to match a separator split over chunks
+                    flush = len(buf) - len(self.separator) + 1
+                    if flush > 0:
+                        self._write(buf[:flush])
+                        del buf[:flush]
+                    return
+                self._write(buf[:idx])
+                del buf[:idx + len(self.separator)]
+                self._end_part()
+                self._state = self._st_boundary
+            else:
+                buf.clear()
+                return
+
+    def _start_part(self, data: bytes):
+        headers = {}
+        for line in data.decode('latin-1').split('\r\n'):
+            key, sep, value = line.partition(':')
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        _, options = parse_header(headers.get('content-disposition', ''))
+        filename = options.get('filename')
+        target = (
+            SpooledTemporaryFile(max_size=self.spool_size)
+            if filename is not None else bytearray()
+        )
+        self._part = [options.get('name'), filename, headers, target, 0]
+
+    def _write(self, data: bytearray):
+        if not data:
+            return
+        part = self._part
+        part[4] += len(data)
+        limit = self.max_field_size if part[1] is None else self.max_file_size
+        if limit is not None and part[4] > limit:
+            raise HTTP(413, 'Request entity too large')
+        if part[1] is None:
+            part[3].extend(data)
+        else:
+            part[3].write(data)
+
+    def _end_part(self):
+        name, filename, headers, target, _ = self._part
+        self._part = None
+        if name is None:
+            return
+        if filename is None:
+            self.params.append((name, target.decode('utf8', 'replace')))
+            return
+        target.seek(0)
+        self.files.append((
+            name,
+            FileStorage(
+                target, filename, name, headers.get('content-type'), headers
+            )
+        ))
+
+    @staticmethod
+    def _group(items: List[Tuple[str, Any]]) -> sdict:
+        rv = sdict()
+        for key, value in items:
+            if key not in rv:
+                rv[key] = value
+            elif isinstance(rv[key], list):
+                rv[key].append(value)
+            else:
+                rv[key] = [rv[key], value]
+        return rv
+
+    def finish(self) -> Tuple[sdict, sdict]:
+        if self._state != self._st_end:
+            raise HTTP(400, 'Invalid multipart data')
+        return self._group(self.params), self._group(self.files)
@@ -9,29 +9,104 @@
     :license: BSD-3-Clause
 """
 
+import asyncio
+import time
+
 from abc import abstractmethod
-from cgi import FieldStorage, parse_header
-from io import BytesIO
-from urllib.parse import parse_qs
-from typing import Any
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
 import pendulum
 
 from ..datastructures import sdict
+from ..http import HTTP
 from ..parsers import Parsers
 from ..utils import cachedprop
 from . import IngressWrapper
-from .helpers import FileStorage
+from .helpers import (
+    FileStorage, MultipartReader, parse_header, parse_params
+)
 
 
 class Request(IngressWrapper):
     __slots__ = ['_now', 'method']
 
     method: str
+    max_content_length: Optional[int] = None
+    body_timeout: Optional[int] = None
+    min_transfer_rate: Optional[int] = None
+    min_transfer_rate_grace: float = 5
+    max_headers: Optional[int] = None
+    max_headers_size: Optional[int] = None
+    multipart_spool_size: int = 1024 * 1024
+    multipart_max_field_size: Optional[int] = None
+    multipart_max_file_size: Optional[int] = None
+    _input_consumed: bool = False
+    _input_body: Optional[bytes] = None
+    _limits_keys = {
+        'max_content_length',
+        'body_timeout',
+        'min_transfer_rate',
+        'max_headers',
+        'max_headers_size',
+        'multipart_max_field_size',
+        'multipart_max_file_size'
+    }
 
-    @property
     @abstractmethod
-    async def body(self) -> bytes: ...
+    def _input_stream(self) -> AsyncIterator[bytes]: ...
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        if self._input_body is not None:
+            if self._input_body:
+                yield self._input_body
+            return
+        if self._input_consumed:
+            raise RuntimeError('Request body stream already consumed')
+        self._input_consumed = True
+        self._check_limits()
+        #: every chunk has a deadline given by the overall body timeout and,
+        #  with a minimum transfer rate, by the data received so far
+        rate, grace = self.min_transfer_rate, self.min_transfer_rate_grace
+        started, size = time.monotonic(), 0
+        deadline = (
+            started + self.body_timeout
+            if self.body_timeout is not None else None
+        )
+        iterator = self._input_stream().__aiter__()
+        while True:
+            limits = []
+            if deadline is not None:
+                limits.append(deadline)
+            if rate:
+                limits.append(started + grace + size / rate)
+            timeout = (
+                max(min(limits) - time.monotonic(), 0) if limits else None
+            )
+            try:
+                chunk = await asyncio.wait_for(
+                    iterator.__anext__(), timeout=timeout
+                )
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise HTTP(408, 'Request timeout')
+            size += len(chunk)
+            if (
+                self.max_content_length is not None and
+                size > self.max_content_length
+            ):
+                raise HTTP(413, 'Request entity too large')
+            yield chunk
+
+    async def _read_body(self) -> bytes:
+        self._input_body = rv = b''.join(
+            [chunk async for chunk in self.stream()]
+        )
+        return rv
+
+    @cachedprop
+    async def body(self) -> bytes:
+        return await self._read_body()
 
     @cachedprop
     def now(self) -> pendulum.DateTime:
@@ -47,7 +122,39 @@ class Request(IngressWrapper):
 
     @cachedprop
     def content_length(self) -> int:
-        return self.headers.get('content_length', 0, cast=int)
+        try:
+            return int(self.headers.get('content-length') or 0)
+        except ValueError:
+            return 0
+
+    @property
+    def _headers_stats(self) -> Tuple[int, int]:
+        count = size = 0
+        for key, value in self.headers.items():
+            count += 1
+            size += len(key) + len(value)
+        return count, size
+
+    def _apply_limits(self, limits: Dict[str, Any]):
+        for key, value in limits.items():
+            setattr(self, key, value)
+
+    def _check_limits(self):
+        if self.max_headers is not None or self.max_headers_size is not None:
+            count, size = self._headers_stats
+            if (
+                (self.max_headers is not None and count > self.max_headers) or
+                (
+                    self.max_headers_size is not None and
+                    size > self.max_headers_size
+                )
+            ):
+                raise HTTP(431, 'Request header fields too large')
+        if (
+            self.max_content_length is not None and
+            self.content_length > self.max_content_length
+        ):
+            raise HTTP(413, 'Request entity too large')
 
     _empty_body_methods = {v: v for v in ['GET', 'HEAD', 'OPTIONS']}
 
@@ -78,68 +185,45 @@ class Request(IngressWrapper):
         return sdict(params), sdict()
 
     def _load_params_form_urlencoded(self, data):
-        rv = sdict()
-        for key, values in parse_qs(
-            data.decode('latin-1'), keep_blank_values=True
-        ).items():
-            if len(values) == 1:
-                rv[key] = values[0]
-                continue
-            rv[key] = values
-        return rv, sdict()
-
-    @property
-    def _multipart_headers(self):
-        return self.headers
-
-    @staticmethod
-    def _file_param_from_field(field):
-        return FileStorage(
-            BytesIO(field.file.read()),
-            field.filename,
-            field.name,
-            field.type,
-            field.headers
-        )
+        return parse_params(data.decode('latin-1')), sdict()
+
+    async def _read_multipart(self, reader):
+        loop = asyncio.get_running_loop()
+        async for chunk in self.stream():
+            #: past the spool size uploaded files might get written to disk,
+            #  so bigger bodies are parsed in the default executor
+            if reader.size + len(chunk) > reader.spool_size:
+                await loop.run_in_executor(None, reader.feed, chunk)
+            else:
+                reader.feed(chunk)
 
-    def _load_params_form_multipart(self, data):
-        params, files = sdict(), sdict()
-        field_storage = FieldStorage(
-            BytesIO(data),
-            headers=self._multipart_headers,
-            environ={'REQUEST_METHOD': self.method},
-            keep_blank_values=True
+    async def _load_params_form_multipart(self):
+        boundary = parse_header(
+            self.headers.get('content-type', '')
+        )[1].get('boundary')
+        if not boundary:
+            return sdict(), sdict()
+        reader = MultipartReader(
+            boundary.encode('latin-1'),
+            max_field_size=self.multipart_max_field_size,
+            max_file_size=self.multipart_max_file_size,
+            spool_size=self.multipart_spool_size
         )
-        for key in field_storage:
-            field = field_storage[key]
-            if isinstance(field, list):
-                if len(field) > 1:
-                    pvalues, fvalues = [], []
-                    for item in field:
-                        if item.filename is not None:
-                            fvalues.append(self._file_param_from_field(item))
-                        else:
-                            pvalues.append(item.value)
-                    if pvalues:
-                        params[key] = pvalues
-                    if fvalues:
-                        files[key] = fvalues
-                    continue
-                else:
-                   field = field[0]
-            if field.filename is not None:
-                files[key] = self._file_param_from_field(field)
-            else:
-                params[key] = field.value
-        return params, files
+        await self._read_multipart(reader)
+        return reader.finish()
 
     _params_loaders = {
         'application/json': _load_params_json,
-        'application/x-www-form-urlencoded': _load_params_form_urlencoded,
+        'application/x-www-form-urlencoded': _load_params_form_urlencoded
+    }
+    _params_stream_loaders = {
         'multipart/form-data': _load_params_form_multipart
     }
 
     async def _load_params(self):
+        loader = self._params_stream_loaders.get(self.content_type)
+        if loader:
+            return await loader(self)
         loader = self._params_loaders.get(
             self.content_type, self._load_params_missing)
         return loader(self, await self.body)
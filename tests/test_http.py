@@ -6,8 +6,12 @@
     Test Emmett http module
 """
 
+import asyncio
+
+import pytest
+
 from helpers import current_ctx
-from emmett.http import HTTP, HTTPBytes, HTTPResponse, redirect
+from emmett.http import HTTP, HTTPBytes, HTTPEventStream, HTTPResponse, redirect
 
 
 def test_http_default():
@@ -56,3 +60,74 @@ def test_redirect():
             assert ctx.response.status == 302
             assert http_redirect.status_code == 302
             assert list(http_redirect.headers) == [(b'location', b'/redirect')]
+
+
+def test_event_stream_encoding():
+    assert HTTPEventStream.encode_event('hello') == b'data: hello\n\n'
+    assert HTTPEventStream.encode_event(
+        {'event': 'update', 'id': 1, 'data': 'foo\nbar'}
+    ) == b'event: update\nid: 1\ndata: foo\ndata: bar\n\n'
+    assert HTTPEventStream.encode_event(
+        {'data': {'foo': 'bar'}}
+    ) == b'data: {"foo":"bar"}\n\n'
+    assert HTTPEventStream.encode_event({'retry': 1000}) == b'retry: 1000\n\n'
+
+
+@pytest.mark.asyncio
+async def test_event_stream_asgi():
+    messages = []
+
+    async def events():
+        yield 'a'
+        yield {'event': 'b', 'data': 'b'}
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    async def send(message):
+        messages.append(message)
+
+    with current_ctx('/') as ctx:
+        ctx.request._receive = receive
+        http = HTTPEventStream(events(), retry=500)
+    await http.asgi(None, send)
+
+    assert messages[0]['headers'][0] == (b'content-type', b'text/event-stream')
+    assert [message['body'] for message in messages[1:]] == [
+        b'retry: 500\n\n',
+        b'data: a\n\n',
+        b'event: b\ndata: b\n\n',
+        b''
+    ]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_disconnect():
+    messages = []
+    disconnect = asyncio.Event()
+    produced = []
+
+    async def events():
+        while True:
+            produced.append(None)
+            yield 'tick'
+            await asyncio.sleep(0.01)
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if len(messages) == 3:
+            disconnect.set()
+
+    with current_ctx('/') as ctx:
+        ctx.request._receive = receive
+        http = HTTPEventStream(events(), keepalive=0.01, queue_size=1)
+    await asyncio.wait_for(http.asgi(None, send), 1)
+
+    count = len(produced)
+    await asyncio.sleep(0.05)
+    assert len(produced) == count
+    assert messages[-1]['more_body'] is True
@@ -6,6 +6,8 @@
     Test pyDAL implementation over Emmett.
 """
 
+import asyncio
+
 import pytest
 
 from datetime import datetime, timedelta
@@ -14,6 +16,8 @@ from uuid import uuid4
 from pydal.objects import Table
 from pydal import Field as _Field
 from emmett import App, sdict, now
+from emmett.cache import RamCache
+from emmett.http import HTTPAiter
 from emmett.orm import (
     Database, Field, Model,
     compute,
@@ -29,7 +33,9 @@ from emmett.orm import (
 )
 from emmett.orm.migrations.utils import generate_runtime_migration
 from emmett.orm.objects import TransactionOps
+from emmett.orm.caching import QueryCache
 from emmett.orm.errors import MissingFieldsForCompute
+from emmett.orm.statements import StatementCache
 from emmett.validators import isntEmpty, hasLength
 
 
@@ -1182,3 +1188,382 @@ def test_model_last(db):
         orderby=~CustomPKMulti.first_name|~CustomPKMulti.last_name,
         limitby=(0, 1)
     ).first()
+
+
+@pytest.mark.asyncio
+async def test_stream(db):
+    for idx in range(5):
+        Person.create(name=f"p{idx}", age=idx)
+
+    chunks = [
+        chunk async for chunk in Person.all().stream(
+            Person.name, Person.age, orderby=Person.id, chunk_rows=2
+        )
+    ]
+    assert len(chunks) == 3
+    lines = b''.join(chunks).splitlines()
+    assert len(lines) == 5
+    assert lines[0] == b'{"name":"p0","age":0}'
+
+    response = HTTPAiter(
+        Person.where(lambda p: p.age > 2).stream(
+            Person.name, Person.age, format='csv', orderby=Person.id
+        ),
+        headers={'content-type': 'text/csv'}
+    )
+    data = b''.join([chunk async for chunk in response.iter])
+    assert data == b'name,age\r\np3,3\r\np4,4\r\n'
+
+    with pytest.raises(ValueError):
+        Person.all().stream(format='xml')
+
+
+def test_bulk_insert(db):
+    ids = db.Person.bulk_insert(
+        [{'name': f'p{idx}', 'age': idx} for idx in range(5)],
+        batch_size=2,
+        returning=True
+    )
+    assert len(ids) == 5
+    assert [p.name for p in Person.all().select(orderby=Person.id)] == [
+        f'p{idx}' for idx in range(5)
+    ]
+    assert Person.get(ids[3]).age == 3
+    assert db.Person.bulk_insert([{'name': 'foo'}, {'name': 'bar', 'age': 1}]) == 2
+    assert Person.all().count() == 7
+
+    response = Person.bulk_create(
+        [{'name': 'baz', 'age': 1}, {'name': 'bad', 'age': 'foo'}],
+        returning=True
+    )
+    assert list(response.errors.keys()) == [1]
+    assert len(response.ret) == 1
+    assert Person.get(response.ret[0]).name == 'baz'
+
+    #: ids get fetched for after insert callbacks without changing the result
+    inserted = []
+    db.Person._after_insert.append(lambda row, row_id: inserted.append(row_id))
+    try:
+        ret = db.Person.bulk_insert([{'name': f's{idx}'} for idx in range(3)])
+        assert ret == 3
+        assert len(inserted) == 3 and all(inserted)
+        assert Person.bulk_create([{'name': 'sc', 'age': 1}]).ret == 1
+        assert len(inserted) == 4
+    finally:
+        db.Person._after_insert.pop()
+
+
+def test_upsert_bulk_update(db):
+    ids = db.Person.bulk_insert(
+        [{'name': 'foo', 'age': 1}, {'name': 'bar', 'age': 2}],
+        returning=True
+    )
+    ret = db.Person.upsert(
+        [
+            {'id': ids[0], 'name': 'foo', 'age': 10},
+            {'id': ids[1] + 1, 'name': 'baz', 'age': 3}
+        ],
+        conflict=[db.Person.id],
+        update=['age']
+    )
+    assert ret == 2
+    assert Person.all().count() == 3
+    assert Person.get(ids[0]).age == 10
+    assert Person.get(ids[1] + 1).name == 'baz'
+    db.Person.upsert(
+        [{'id': ids[0], 'name': 'nope', 'age': 0}], conflict=['id'], update=[]
+    )
+    assert Person.get(ids[0]).name == 'foo'
+
+    ret = Person.where(lambda p: p.age < 5).bulk_update({
+        ids[0]: {'name': 'skipped'},
+        ids[1]: {'name': 'bar2', 'age': 20},
+        ids[1] + 1: {'age': 30}
+    })
+    assert ret == 2
+    rows = Person.all().select(orderby=Person.id)
+    assert [(p.name, p.age) for p in rows] == [
+        ('foo', 10), ('bar2', 20), ('baz', 30)
+    ]
+
+    COMMIT_CALLBACKS["all"].clear()
+    db.CommitWatcher.upsert([{'foo': 'test'}], conflict=['id'])
+    db.commit()
+    assert [
+        (kind, op_type) for kind, op_type, _ in COMMIT_CALLBACKS["all"]
+    ] == [('before', TransactionOps.upsert), ('after', TransactionOps.upsert)]
+
+
+def test_iterselect_fetch_size(db):
+    db.Person.bulk_insert([{'name': f'p{idx}', 'age': idx} for idx in range(5)])
+    rows = Person.all().iterselect(orderby=Person.id, fetch_size=2)
+    assert rows.fetch_size == 2
+    assert [(p.name, p.age) for p in rows] == [
+        (f'p{idx}', idx) for idx in range(5)
+    ]
+    rows = Person.all().iterselect(Person.age.sum(), fetch_size=2)
+    assert [row._extra[Person.age.sum()] for row in rows] == [10]
+
+
+def test_iterselect_server_side(db):
+    db.Person.bulk_insert([{'name': f'p{idx}', 'age': idx} for idx in range(5)])
+    cursors = len(db._adapter.cursors)
+    rows = Person.all().iterselect(
+        orderby=Person.id, server_side=True, itersize=2
+    )
+    assert rows.fetch_size == 2
+    assert len(db._adapter.cursors) == cursors + 1
+    assert [p.name for p in rows] == [f'p{idx}' for idx in range(5)]
+    assert len(db._adapter.cursors) == cursors
+
+    with Person.all().iterselect(server_side=True) as rows:
+        assert next(iter(rows)).name == 'p0'
+    assert len(db._adapter.cursors) == cursors
+
+    rows = Person.all().iterselect(server_side=True)
+    for row in rows:
+        break
+    assert len(db._adapter.cursors) == cursors
+
+    rows = Person.all().iterselect(server_side=True)
+    db.commit()
+    assert len(db._adapter.cursors) == cursors
+
+
+@pytest.mark.asyncio
+async def test_async_api(db):
+    rid = await db.Person.insert_async(name='foo', age=1)
+    assert await Person.where(lambda p: p.id == rid).count_async() == 1
+    rows = await Person.all().select_async()
+    assert rows.first().name == 'foo'
+    assert await Person.where(lambda p: p.id == rid).update_async(age=2) == 1
+    await db.commit_async()
+    assert await Person.all().delete_async() == 1
+    await db.rollback_async()
+    assert Person.get(rid).age == 2
+
+
+@pytest.mark.asyncio
+async def test_pipe_commit_on_loop(db):
+    loops = []
+    db.CommitWatcher._after_commit.append(
+        lambda op_type, ctx: loops.append(asyncio.get_running_loop())
+    )
+    try:
+        db.CommitWatcher.insert(foo='loop')
+        await db.pipe.on_pipe_success()
+        assert loops == [asyncio.get_running_loop()]
+    finally:
+        db.CommitWatcher._after_commit.pop()
+
+
+def test_statement_cache(db):
+    db._statements_cache = StatementCache(2)
+    try:
+        db.Person.bulk_insert(
+            [{'name': f'p{idx}', 'age': idx} for idx in range(5)]
+        )
+        for idx in range(5):
+            row = Person.where(lambda p: p.age == idx).select().first()
+            assert row.name == f'p{idx}'
+        assert db.statement_cache_stats().hits == 4
+        rows = Person.where(
+            lambda p: p.age.belongs([1, 3]) & (p.name != "p'1")
+        ).select(orderby=Person.age)
+        assert [row.age for row in rows] == [1, 3]
+        rows = Person.where(lambda p: p.name.like('p%')).select()
+        assert len(rows) == 5
+        stats = db.statement_cache_stats()
+        assert stats.size == stats.max_size == 2
+        assert stats.misses == 3
+    finally:
+        db._statements_cache = None
+
+
+def test_prefetch(db):
+    for pidx in range(2):
+        person = Person.create(name=f'p{pidx}', age=pidx)
+        for tidx in range(2):
+            thing = person.id.things.create(name=f't{pidx}{tidx}', color='red')
+            feature = thing.id.features.create(name=f'f{pidx}{tidx}')
+            feature.id.price.create(value=pidx * 10 + tidx)
+    Person.create(name='lonely', age=3)
+
+    executed = []
+    execute = db._adapter.execute
+
+    def counting_execute(*args, **kwargs):
+        executed.append(args[0])
+        return execute(*args, **kwargs)
+
+    db._adapter.execute = counting_execute
+    try:
+        people = Person.all().select(
+            orderby=Person.id, prefetch=['things.features.price', 'features']
+        )
+        assert len(executed) == 5
+        things = Thing.all().select(prefetch='person')
+        assert len(executed) == 7
+        assert [
+            [thing.name for thing in person.things()] for person in people
+        ] == [['t00', 't01'], ['t10', 't11'], []]
+        assert [
+            [feature.price().value for feature in thing.features()]
+            for thing in people[1].things()
+        ] == [[10], [11]]
+        assert [
+            feature.name for feature in people[0].features()
+        ] == ['f00', 'f01']
+        assert [thing.person.name for thing in things] == [
+            'p0', 'p0', 'p1', 'p1'
+        ]
+        assert len(executed) == 7
+    finally:
+        del db._adapter.execute
+
+    with pytest.raises(RuntimeError):
+        Person.all().select(prefetch='nothing')
+
+
+def test_identity_map(db):
+    person = Person.create(name='Walter', age=50)
+    thing = person.id.things.create(name='apple', color='red')
+
+    executed = []
+    execute = db._adapter.execute
+
+    def counting_execute(*args, **kwargs):
+        executed.append(args[0])
+        return execute(*args, **kwargs)
+
+    db._use_identity_map = True
+    db._adapter.execute = counting_execute
+    try:
+        record = Person.get(person.id)
+        assert Person.get(person.id) is record
+        assert Thing.get(thing.id).person.name == 'Walter'
+        assert len(executed) == 2
+        things = Thing.all().select(prefetch='person')
+        assert things[0].person.name == 'Walter'
+        assert len(executed) == 3
+
+        record.name = 'Walt'
+        record.save()
+        assert Person.get(person.id) is not record
+        assert Person.get(person.id).name == 'Walt'
+        Person.where(lambda p: p.id == person.id).update(age=51)
+        assert Person.get(person.id).age == 51
+
+        with db.atomic() as txn:
+            Person.where(lambda p: p.id == person.id).update(age=52)
+            assert Person.get(person.id).age == 52
+            txn.rollback()
+        assert Person.get(person.id).age == 51
+
+        Person.get(person.id).destroy()
+        assert Person.get(person.id) is None
+    finally:
+        del db._adapter.execute
+        db._use_identity_map = False
+        db._adapter._connection_manager.state.identity = None
+
+
+def test_select_cache(db):
+    cache = RamCache()
+    Person.create(name='Walter', age=50)
+    db.commit()
+
+    executed = []
+    execute = db._adapter.execute
+
+    def counting_execute(*args, **kwargs):
+        executed.append(args[0])
+        return execute(*args, **kwargs)
+
+    db._adapter.execute = counting_execute
+    try:
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert [row.name for row in rows] == ['Walter']
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert [row.name for row in rows] == ['Walter']
+        assert len(executed) == 1
+        Person.where(lambda p: p.age > 30).select(cache=(cache, 60))
+        assert len(executed) == 2
+
+        #: pending changes skip the cache, commits invalidate it
+        Person.create(name='Jesse', age=25)
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert len(rows) == 2
+        assert len(executed) == 4
+        db.commit()
+        executed.clear()
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert len(rows) == 2
+        assert len(executed) == 1
+
+        with db.atomic() as txn:
+            Person.where(lambda p: p.name == 'Jesse').delete()
+            rows = Person.where(lambda p: p.age > 18).select(
+                cache=(cache, 60))
+            assert len(rows) == 1
+            txn.rollback()
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert len(rows) == 2
+
+        #: writers never using cached selections still invalidate the
+        #  handlers given upfront, as another process would do
+        reader = db._query_cache
+        db._query_cache = QueryCache([cache])
+        try:
+            Person.create(name='Skyler', age=40)
+            db.commit()
+        finally:
+            db._query_cache = reader
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+        assert len(rows) == 3
+        Person.where(lambda p: p.name == 'Skyler').delete()
+        db.commit()
+        rows = Person.where(lambda p: p.age > 18).select(cache=(cache, 60))
+
+        #: writes on joined tables invalidate the cached results too
+        thing = Thing.create(name='Car', color='red', person=rows[0].id)
+        db.commit()
+
+        def joined():
+            return db(db.Person.age > 18).select(
+                db.Person.ALL, db.Thing.ALL,
+                join=[db.Thing.on(db.Thing.person == db.Person.id)],
+                cache=(cache, 60)
+            )
+
+        assert joined().first().things.color == 'red'
+        Thing.where(lambda t: t.id == thing.id).update(color='blue')
+        db.commit()
+        assert joined().first().things.color == 'blue'
+
+        with pytest.raises(RuntimeError):
+            Person.all().select(including='things', cache=(cache, 60))
+        with pytest.raises(RuntimeError):
+            Person.all().join('things').select(cache=(cache, 60))
+
+        #: pyDAL cache models and cacheable selections use pyDAL's cache
+        stored = {}
+
+        def cache_model(key, f, time_expire):
+            if key not in stored:
+                stored[key] = f()
+            return stored[key]
+
+        executed.clear()
+        for _ in range(2):
+            rows = Person.where(lambda p: p.age > 40).select(
+                cache=(cache_model, 60))
+            assert [row.name for row in rows] == ['Walter']
+            rows = Person.where(lambda p: p.age > 40).select(
+                cache=(cache, 60), cacheable=True)
+            assert [row.name for row in rows] == ['Walter']
+        assert len(stored) == 1
+        assert len(executed) == 2
+    finally:
+        del db._adapter.execute
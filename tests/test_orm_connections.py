@@ -6,10 +6,21 @@
     Test pyDAL connection implementation over Emmett.
 """
 
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+
 import pytest
 
 from emmett import App, sdict
-from emmett.orm import Database
+from emmett.orm import Database, Field, Model
+from emmett.orm.connection import PooledConnectionManager
+from emmett.orm.engines.postgres import PostgresAdapterMixin
+from emmett.orm.errors import MaxConnectionsExceeded
+from emmett.orm.statements import Statement
 
 
 @pytest.fixture(scope='module')
@@ -43,3 +54,347 @@ async def test_connection_ctx_loop(db):
         assert db._adapter.connection
 
     assert not db._adapter.connection
+
+
+class FakeCursor:
+    def execute(self, sql):
+        pass
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    broken = False
+
+    def cursor(self):
+        if self.broken:
+            raise RuntimeError('connection lost')
+        return FakeCursor()
+
+    def close(self):
+        pass
+
+
+def _pool(**kwargs):
+    return PooledConnectionManager(sdict(connector=FakeConnection), **kwargs)
+
+
+def test_pool_sync():
+    pool = _pool(max_connections=2, min_connections=1)
+    pool.prewarm_sync()
+    assert len(pool.connections) == 1
+
+    conn_a, opened = pool.connect_sync()
+    assert not opened
+    conn_b, opened = pool.connect_sync()
+    assert opened
+    with pytest.raises(MaxConnectionsExceeded):
+        pool.connect_sync()
+
+    pool.disconnect_sync(conn_a)
+    pool.disconnect_sync(conn_b)
+    assert pool.connect_sync() == (conn_b, False)
+
+    pool.configure(connect_timeout=1)
+    timer = threading.Timer(0.1, pool.disconnect_sync, (conn_b,))
+    timer.start()
+    assert pool.connect_sync()[0] in (conn_a, conn_b)
+    timer.join()
+
+
+@pytest.mark.asyncio
+async def test_pool_loop():
+    pool = _pool(max_connections=1)
+    conn, opened = await pool.connect_loop()
+    assert opened
+    waiter = asyncio.ensure_future(pool.connect_loop())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    await pool.disconnect_loop(conn)
+    assert await waiter == (conn, False)
+    assert len(pool.connections_map) == 1
+
+
+class SlowConnection(FakeConnection):
+    closed = False
+
+    def __init__(self):
+        time.sleep(0.2)
+
+    def cursor(self):
+        time.sleep(0.1)
+        return super().cursor()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_pool_loop_timeout():
+    pool = PooledConnectionManager(
+        sdict(connector=SlowConnection), max_connections=1,
+        connect_timeout=0.05
+    )
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.connect_loop()
+    #: the slot is kept until the pending connect completes
+    assert pool.stats().opening == 1
+    while pool.stats().opening:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.05)
+    assert not pool.connections_map
+    assert not pool.executors
+
+    pool.configure(connect_timeout=1)
+    conn, opened = await pool.connect_loop()
+    assert opened and not conn.closed
+
+    #: connections checked out for a ping get back to the pool
+    pool.configure(pre_ping=True, connect_timeout=0.05)
+    await pool.disconnect_loop(conn)
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.connect_loop()
+    assert pool.stats().in_use == 1
+    await asyncio.sleep(0.2)
+    assert pool.stats().in_use == 0
+    assert not conn.closed
+    assert pool.connections_map == {id(conn): conn}
+
+
+def test_pool_health(db):
+    assert db.pool_stats() is None
+
+    pool = _pool(max_connections=2, pre_ping=True)
+    conn, _ = pool.connect_sync()
+    pool.disconnect_sync(conn)
+    conn.broken = True
+    new_conn, opened = pool.connect_sync()
+    assert opened and new_conn is not conn
+    pool.disconnect_sync(new_conn)
+
+    pool.configure(max_lifetime=60, idle_timeout=60)
+    pool.disconnect_all()
+    conn, _ = pool.connect_sync()
+    created, deadline = pool.lifetimes[id(conn)]
+    assert 54 <= deadline - created <= 60
+    pool.lifetimes[id(conn)] = (created, created)
+    pool.disconnect_sync(conn)
+    assert not pool.connections_map
+
+    conn, _ = pool.connect_sync()
+    pool.disconnect_sync(conn)
+    pool.connections[:] = [(0, key) for _, key in pool.connections]
+    assert pool.reap() == 1
+    assert not pool.connections_map
+
+    stats = pool.stats()
+    assert stats.size == stats.in_use == stats.waiters == 0
+    assert stats.connects == 4
+    assert stats.recycles == 3
+    assert stats.ping_failures == 1
+    assert sum(count for _, count in stats.wait_times) == 4
+
+
+def test_execution_monitoring(caplog):
+    app = App(__name__)
+    db = Database(
+        app,
+        config=sdict(
+            uri='sqlite:memory',
+            auto_migrate=True,
+            auto_connect=False,
+            store_execution_timings=True,
+            slow_query_threshold=1e-9,
+            slow_query_explain=True,
+            query_budget=2
+        )
+    )
+    assert Database.execution_handlers == []
+    assert db.execution_timings == []
+
+    with caplog.at_level('WARNING', logger=app.log.name):
+        with db.connection():
+            for _ in range(3):
+                db.executesql('SELECT 1;')
+        timings = db.execution_timings
+        assert [sql for sql, _ in timings[-3:]] == ['SELECT 1;'] * 3
+        assert all(duration >= 0 for _, duration in timings)
+
+        with db.connection():
+            assert all(sql != 'SELECT 1;' for sql, _ in db.execution_timings)
+
+    messages = [record.getMessage() for record in caplog.records]
+    slow = [msg for msg in messages if 'SELECT 1;' in msg]
+    assert len(slow) == 3
+    assert slow[0].startswith('Slow query') and 'Query plan:' in slow[0]
+    budget = [msg for msg in messages if 'query budget of 2' in msg]
+    assert len(budget) == 1
+
+
+class FakePostgresBase:
+    def __init__(self, manager):
+        self._connection_manager = manager
+        self.connection = manager.connect_sync()[0]
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def _execute_with_params(self, sql, params):
+        self.executed.append((sql, params))
+
+    def _execute_statement(self, statement, params):
+        self.executed.append((statement.sql, params))
+
+
+class FakePostgresAdapter(PostgresAdapterMixin, FakePostgresBase):
+    pass
+
+
+def test_prepared_statements():
+    pool = _pool(prepared_size=1)
+    adapter = FakePostgresAdapter(pool)
+    statements = [
+        Statement(f'SELECT {idx} = ?;', f'SELECT {idx} = $1;', [], [0])
+        for idx in range(2)
+    ]
+    statements[0].hits = pool.prepare_threshold - 1
+    adapter._execute_statement(statements[0], (1,))
+    assert adapter.executed.pop() == ('SELECT 0 = ?;', (1,))
+
+    statements[0].hits += 1
+    adapter._execute_statement(statements[0], (1,))
+    name = statements[0].name
+    assert adapter.executed == [
+        f'PREPARE {name} AS SELECT 0 = $1;',
+        (f'EXECUTE {name} (%s);', (1,))
+    ]
+    adapter.executed.clear()
+    adapter._execute_statement(statements[0], (2,))
+    assert adapter.executed == [(f'EXECUTE {name} (%s);', (2,))]
+
+    adapter.executed.clear()
+    statements[1].hits = pool.prepare_threshold
+    adapter._execute_statement(statements[1], (1,))
+    assert adapter.executed[1] == f'DEALLOCATE {name};'
+
+    adapter.executed.clear()
+    pool.invalidate_prepared()
+    adapter._execute_statement(statements[0], (1,))
+    assert adapter.executed[:2] == [
+        'DEALLOCATE ALL;', f'PREPARE {name} AS SELECT 0 = $1;'
+    ]
+
+    pool.disconnect_sync(adapter.connection, close_connection=True)
+    assert not pool.prepared
+
+
+class Replicated(Model):
+    name = Field()
+
+
+@pytest.fixture(scope='module')
+def replicas_db(tmp_path_factory):
+    app = App(__name__, root_path=str(tmp_path_factory.mktemp('replicas')))
+    db = Database(
+        app,
+        config=sdict(
+            uri='sqlite://primary.db',
+            auto_migrate=True,
+            auto_connect=False,
+            replicas=['sqlite://replica.db']
+        )
+    )
+    db.define_models(Replicated)
+    path = os.path.join(app.root_path, 'databases', 'replica.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            'CREATE TABLE "replicateds" '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, name CHAR(512));'
+        )
+        conn.execute('INSERT INTO "replicateds" (name) VALUES (\'replica\');')
+    with db.connection():
+        Replicated.create(name='primary')
+    return db
+
+
+def _replicated_names():
+    return [row.name for row in Replicated.all().select()]
+
+
+def test_replicas(replicas_db):
+    db, names = replicas_db, _replicated_names
+    replica_adapter = db._replicas.adapters[0]
+
+    with db.connection():
+        Replicated.all().update(name='primary')
+        #: uncommitted changes keep reads on the primary
+        assert names() == ['primary']
+        db.rollback()
+
+    with db.connection():
+        assert names() == ['replica']
+        assert Replicated.all().count() == 1
+        assert not replica_adapter._connection_manager.state.closed
+        with db.use('primary'):
+            assert names() == ['primary']
+        with db.atomic():
+            assert names() == ['primary']
+        assert names() == ['replica']
+    assert replica_adapter._connection_manager.state.closed
+
+    with pytest.raises(ValueError):
+        db.use('replica')
+
+    #: an exhausted replica pool falls back to the primary without waiting
+    manager = replica_adapter._connection_manager
+    replica_adapter._connection_manager = PooledConnectionManager(
+        replica_adapter, max_connections=1, connect_timeout=5
+    )
+    busy, _ = replica_adapter._connection_manager.connect_sync()
+    try:
+        with db.connection():
+            started = time.monotonic()
+            assert names() == ['primary']
+            assert time.monotonic() - started < 1
+        assert replica_adapter._connection_manager.state.closed
+    finally:
+        replica_adapter._connection_manager.disconnect_sync(busy, True)
+    with db.connection():
+        assert names() == ['replica']
+    replica_adapter._connection_manager = manager
+
+
+@pytest.mark.asyncio
+async def test_replicas_loop(replicas_db):
+    db, names = replicas_db, _replicated_names
+    replica_adapter = db._replicas.adapters[0]
+
+    #: replicas get opened through the loop with the connection
+    async with db.connection():
+        assert not replica_adapter._connection_manager.state.closed
+        assert names() == ['replica']
+    assert replica_adapter._connection_manager.state.closed
+
+    #: reads on the loop never open replicas synchronously
+    with db.connection():
+        assert names() == ['primary']
+        assert replica_adapter._connection_manager.state.closed
+
+    manager = replica_adapter._connection_manager
+    replica_adapter._connection_manager = PooledConnectionManager(
+        replica_adapter, max_connections=1, connect_timeout=5
+    )
+    busy, _ = replica_adapter._connection_manager.connect_sync()
+    try:
+        started = time.monotonic()
+        async with db.connection():
+            assert names() == ['primary']
+        assert time.monotonic() - started < 1
+    finally:
+        replica_adapter._connection_manager.disconnect_sync(busy, True)
+        replica_adapter._connection_manager = manager
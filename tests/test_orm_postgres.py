@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    tests.orm_postgres
+    ------------------
+
+    Test ORM PostgreSQL engine specific features
+"""
+
+import os
+import pytest
+
+from emmett import App, sdict
+from emmett.orm import Database, Model, Field
+from emmett.orm.migrations.utils import generate_runtime_migration
+
+require_postgres = pytest.mark.skipif(
+    not os.environ.get("POSTGRES_URI"), reason="No postgres database"
+)
+
+
+class Item(Model):
+    name = Field.string()
+    position = Field.int()
+
+
+@pytest.fixture(scope='module')
+def _db():
+    app = App(__name__)
+    db = Database(
+        app,
+        config=sdict(
+            uri=f"postgres://{os.environ.get('POSTGRES_URI')}",
+            auto_connect=False,
+            prepared_statements=1
+        )
+    )
+    db.define_models(Item)
+    return db
+
+
+@pytest.fixture(scope='function')
+def db(_db):
+    migration = generate_runtime_migration(_db)
+    with _db.connection():
+        migration.up()
+        yield _db
+        migration.down()
+
+
+def _prepared_names(db):
+    return {
+        row[0] for row in
+        db.executesql('SELECT name FROM pg_prepared_statements;')
+    }
+
+
+def _by_position(position):
+    return Item.where(lambda i: i.position == position).select().first().name
+
+
+def _by_name(name):
+    return Item.where(lambda i: i.name == name).select(Item.position).first()
+
+
+@require_postgres
+def test_prepared_statements(db):
+    db.Item.bulk_insert(
+        [{'name': f'i{idx}', 'position': idx} for idx in range(3)]
+    )
+    manager = db._adapter._connection_manager
+    assert not _prepared_names(db)
+
+    #: hot statements get prepared and reused with different parameters
+    for idx in range(manager.prepare_threshold + 1):
+        assert _by_position(idx % 3) == f'i{idx % 3}'
+    names = _prepared_names(db)
+    assert len(names) == 1
+    assert _by_position(2) == 'i2'
+    assert _prepared_names(db) == names
+
+    #: the least recently used statement gets deallocated on eviction
+    for idx in range(manager.prepare_threshold + 1):
+        assert _by_name(f'i{idx % 3}').position == idx % 3
+    evicted = _prepared_names(db)
+    assert len(evicted) == 1
+    assert not evicted & names
+
+    #: new connections don't have the statements prepared on previous ones
+    db.connection_close()
+    manager.disconnect_all()
+    db.connection_open()
+    assert not _prepared_names(db)
+    assert not manager.prepared
+    for idx in range(manager.prepare_threshold + 1):
+        assert _by_name(f'i{idx % 3}').position == idx % 3
+    assert _prepared_names(db) == evicted
+
+
+def _open_cursors(db):
+    return {row[0] for row in db.executesql('SELECT name FROM pg_cursors;')}
+
+
+def _server_side_names(**kwargs):
+    return Item.all().iterselect(
+        orderby=Item.position, server_side=True, itersize=2, **kwargs
+    )
+
+
+@require_postgres
+def test_server_side_cursors(db):
+    db.Item.bulk_insert(
+        [{'name': f'i{idx}', 'position': idx} for idx in range(5)]
+    )
+    names = [f'i{idx}' for idx in range(5)]
+
+    #: rows are fetched from a named cursor, closed once exhausted
+    rows = _server_side_names()
+    assert rows.cursor.name.startswith('emt_')
+    assert rows.cursor.name in _open_cursors(db)
+    assert [row.name for row in rows] == names
+    assert rows.cursor.name not in _open_cursors(db)
+
+    #: breaking the iteration closes the cursor as well
+    rows = _server_side_names()
+    for row in rows:
+        break
+    assert row.name == 'i0'
+    assert rows.cursor.name not in _open_cursors(db)
+
+    #: cursors left open within transaction blocks get closed on commit
+    with db.atomic():
+        assert [row.name for row in _server_side_names()] == names
+        rows = _server_side_names()
+        assert rows.cursor.name in _open_cursors(db)
+    db.commit()
+    assert rows.cursor.name not in _open_cursors(db)
+
+    #: connections opened without a transaction block work the same
+    db.commit()
+    db.connection_close()
+    db.connection_open(with_transaction=False)
+    try:
+        assert [row.name for row in _server_side_names()] == names
+    finally:
+        db.connection_close()
+        db.connection_open()
+
+
+@require_postgres
+def test_bulk_insert_returning(db):
+    rows = [
+        {'name': 'a', 'position': 1},
+        {'name': 'b', 'position': 2},
+        {'name': 'c'},
+        {'name': 'd', 'position': 4},
+        {}
+    ]
+    ids = db.Item.bulk_insert(rows, batch_size=3, returning=True)
+    assert len(ids) == len(set(ids)) == 5
+    for row_id, fields in zip(ids, rows):
+        record = Item.get(row_id)
+        assert record.name == fields.get('name')
+        assert record.position == fields.get('position')
+    assert db.Item.bulk_insert([{'name': 'e'}, {'name': 'f'}]) == 2
+    assert Item.all().count() == 7
@@ -85,6 +85,13 @@ def app():
     def test_route_complex(a, b, c, d, e, f):
         return 'Test Router'
 
+    @app.route(
+        methods='post',
+        limits={'max_content_length': 10, 'max_headers': 4}
+    )
+    def test_limits():
+        return 'Test Router'
+
     return app
 
 
@@ -211,6 +218,34 @@ async def test_routing_exception_route(app):
         assert excinfo.value.body == 'Not found, dude'
 
 
+@pytest.mark.asyncio
+async def test_routing_limits(app):
+    def build_ctx(length, **headers):
+        builder = ScopeBuilder(
+            '/it/test_limits', method='POST',
+            headers=[('content-length', str(length))] + list(headers.items())
+        )
+        return FakeRequestContext(app, builder.get_data()[0])
+
+    ctx = build_ctx(5)
+    response = await app._router_http.dispatch(ctx.request, ctx.response)
+    assert response.status_code == 200
+    assert ctx.request.max_content_length == 10
+
+    ctx = build_ctx(20)
+    with pytest.raises(HTTP) as excinfo:
+        await app._router_http.dispatch(ctx.request, ctx.response)
+    assert excinfo.value.status_code == 413
+
+    ctx = build_ctx(1, **{'x-a': '1', 'x-b': '2', 'x-c': '3', 'x-d': '4'})
+    with pytest.raises(HTTP) as excinfo:
+        await app._router_http.dispatch(ctx.request, ctx.response)
+    assert excinfo.value.status_code == 431
+
+    with pytest.raises(SyntaxError):
+        app.route(limits={'max_foo': 1})
+
+
 def test_static_url(app):
     link = url('static', 'file')
     assert link == '/static/file'
@@ -6,10 +6,20 @@
     Test Emmett session module
 """
 
+import asyncio
+import os
+import pickle
+import time
+
+from multiprocessing import shared_memory
+
 import pytest
 
+from emmett import App
 from emmett.asgi.wrappers import Request
 from emmett.ctx import RequestContext, current
+from emmett.datastructures import SessionData
+from emmett.extensions import Signals
 from emmett.sessions import SessionManager
 from emmett.testing.env import ScopeBuilder
 from emmett.wrappers.response import Response
@@ -54,3 +64,173 @@ async def test_session_cookie(ctx):
     ctx.request.cookies = ctx.response.cookies
     await session_cookie.open_request()
     assert ctx.session._expiration == 3600
+
+
+@pytest.mark.asyncio
+async def test_session_cookie_unchanged(ctx):
+    session_cookie = SessionManager.cookies(
+        key='sid',
+        cookie_name='foo_session'
+    )
+    await session_cookie.open_request()
+    ctx.session.foo = 'bar'
+    assert ctx.session._modified
+    await session_cookie.close_request()
+    packed = ctx.response.cookies['foo_session'].value
+
+    ctx.request.cookies = ctx.response.cookies
+    await session_cookie.open_request()
+    assert ctx.session.foo == 'bar'
+    assert not ctx.session._modified
+    await session_cookie.close_request()
+    assert ctx.response.cookies['foo_session'].value == packed
+
+
+def test_session_data_tracking():
+    data = SessionData({'cart': [1]})
+    data.cart.append(2)
+    assert not data._modified
+    data.pop('cart')
+    assert data._modified
+
+    data = SessionData({'cart': [1]}, track_mutations=True)
+    assert not data._modified
+    data.cart.append(2)
+    assert data._modified
+
+
+@pytest.mark.asyncio
+async def test_session_cookie_codec_chunks(ctx):
+    session_cookie = SessionManager.cookies(
+        key='sid',
+        cookie_name='chunked_session',
+        codec='json'
+    )
+    await session_cookie.open_request()
+    ctx.session.data = 'x' * 10000
+    ctx.session.nested = {'foo': 'bar'}
+    await session_cookie.close_request()
+    assert 'chunked_session_1' in ctx.response.cookies
+    chunks = int(ctx.response.cookies['chunked_session'].value.split('~')[0])
+    assert f'chunked_session_{chunks - 1}' in ctx.response.cookies
+
+    ctx.request.cookies = ctx.response.cookies
+    await session_cookie.open_request()
+    assert len(ctx.session.data) == 10000
+    assert ctx.session.nested.foo == 'bar'
+
+
+def test_session_codec_frames(ctx):
+    pipe = SessionManager.cookies(key='sid', cookie_name='foo', codec='json')
+    data = pipe._encode({'foo': 'bar'})
+    assert data[:2] == bytes((1, 2))
+    assert pipe._decode(data) == {'foo': 'bar'}
+    #: contents stored with a different codec or before frames
+    assert pipe._decode(pickle.dumps({'foo': 'baz'})) == {'foo': 'baz'}
+    pipe = SessionManager.cookies(
+        key='sid', cookie_name='foo', compression_level=5
+    )
+    assert pipe._decode(data) == {'foo': 'bar'}
+
+
+@pytest.mark.asyncio
+async def test_session_files(tmp_path):
+    app = App(__name__, root_path=str(tmp_path))
+    ctx = FakeRequestContext(app, ScopeBuilder().get_data()[0])
+    ctx.app = app
+    token = current._init_(ctx)
+    try:
+        pipe = SessionManager.files(cookie_name='foo_session', fsync=True)
+        await pipe.open_request()
+        current.session.foo = 'bar'
+        await pipe.close_request()
+        sid = current.session._sid
+        fn = pipe._get_filename(sid)
+        assert os.path.dirname(fn) != pipe._path
+        assert os.stat(fn).st_mtime > time.time()
+
+        os.utime(fn, (0, 0))
+        pipe.sweep()
+        assert os.path.exists(fn)
+        pipe._store(current.session, -10)
+        pipe.sweep()
+        assert not os.path.exists(fn)
+
+        #: sessions stored before sharding get moved into their shard
+        legacy = pipe._get_legacy_filename(sid)
+        pipe._store(current.session, 3600)
+        os.replace(fn, legacy)
+        assert pipe._load(sid).foo == 'bar'
+        assert os.path.exists(fn)
+        assert not os.path.exists(legacy)
+
+        #: destroying a session removes the legacy file as well
+        os.replace(fn, legacy)
+        current.session.clear()
+        await pipe.close_request()
+        assert not os.path.exists(legacy)
+        assert pipe._load(sid) is None
+
+        #: the sweeper is opt-in and gets stopped on shutdown
+        loop = asyncio.get_running_loop()
+        assert not app._extensions_listeners[Signals.after_loop]
+        pipe = SessionManager.files(
+            cookie_name='foo_session', sweep_interval=1
+        )
+        app.send_signal(Signals.after_loop, loop=loop)
+        sweeper = pipe._sweeper
+        assert not sweeper.done()
+        app.send_signal(Signals.before_shutdown, loop=loop)
+        await asyncio.sleep(0)
+        assert sweeper.cancelled()
+        assert pipe._sweeper is None
+    finally:
+        current._close_(token)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('shared', [False, True])
+async def test_session_memory(shared, caplog):
+    app = App(__name__)
+    ctx = FakeRequestContext(app, ScopeBuilder().get_data()[0])
+    ctx.app = app
+    token = current._init_(ctx)
+    pipe = SessionManager.memory(
+        cookie_name='mem_session',
+        max_sessions=1,
+        shared=shared,
+        shared_name=f'emt_sess_test_{os.getpid()}'
+    )
+    try:
+        await pipe.open_request()
+        ctx.session.foo = 'bar'
+        ctx.session.cart = [1]
+        await pipe.close_request()
+        sid = ctx.session._sid
+
+        #: changes to nested objects are not stored unless saved
+        ctx.session.cart.append(2)
+        ctx.request.cookies = ctx.response.cookies
+        await pipe.open_request()
+        assert ctx.session._sid == sid
+        assert ctx.session.foo == 'bar'
+        assert ctx.session.cart == [1]
+
+        #: evicting live sessions gets logged
+        ctx.request.cookies, ctx.session = {}, None
+        await pipe.open_request()
+        ctx.session.foo = 'baz'
+        await pipe.close_request()
+        assert pipe.store.get(sid) is None
+        assert any('was evicted' in msg for msg in caplog.messages)
+
+        sid = ctx.session._sid
+        pipe.store.touch(sid, -1)
+        assert pipe.store.get(sid) is None
+    finally:
+        current._close_(token)
+        if shared:
+            app.send_signal(Signals.before_shutdown, loop=None)
+    if shared:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=f'emt_sess_test_{os.getpid()}')
@@ -6,9 +6,17 @@
     Test Emmett wrappers module
 """
 
+import asyncio
+
+import pytest
+
+from io import BytesIO
+
 from helpers import current_ctx
 from emmett.asgi.wrappers import Request
+from emmett.http import HTTP
 from emmett.testing.env import ScopeBuilder
+from emmett.wrappers.helpers import parse_header
 from emmett.wrappers.response import Response
 
 
@@ -23,6 +31,45 @@ def test_request():
     assert request.client == '127.0.0.1'
 
 
+def test_request_params():
+    scope, _ = ScopeBuilder(
+        path='/?foo=bar&multi=1&multi=2&blank=&flag&quoted=a%20b+c%2B',
+        method='GET',
+    ).get_data()
+    request = Request(scope, None, None)
+
+    assert request.query_params == {
+        'foo': 'bar',
+        'multi': ['1', '2'],
+        'blank': '',
+        'flag': '',
+        'quoted': 'a b c+'
+    }
+    assert request.query_params.missing is None
+
+
+def test_request_headers_cookies():
+    scope, _ = ScopeBuilder(
+        path='/',
+        method='GET',
+        headers=[
+            ('X-Dup', 'first'),
+            ('X-Dup', 'second'),
+            ('Cookie', 'foo=bar; quoted="a b"; path=/; foo=baz')
+        ]
+    ).get_data()
+    request = Request(scope, None, None)
+
+    assert request.headers['x-dup'] == 'second'
+    assert 'X-DUP' in request.headers
+    assert request.headers.get('missing') is None
+    assert request.cookies['foo'].value == 'baz'
+    assert 'path' not in request.cookies
+    assert request.cookies.get('missing') is None
+    assert sorted(request.cookies) == ['foo', 'quoted']
+    assert request.cookies['quoted'].value == 'a b'
+
+
 def test_response():
     response = Response()
 
@@ -34,3 +81,133 @@ def test_req_ctx():
     with current_ctx('/?foo=bar') as ctx:
         assert isinstance(ctx.request, Request)
         assert isinstance(ctx.response, Response)
+
+
+def _chunked_request(scope, body, size):
+    chunks = [body[idx:idx + size] for idx in range(0, len(body), size)]
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {
+            'type': 'http.request',
+            'body': chunk,
+            'more_body': bool(chunks)
+        }
+    return Request(scope, receive, None)
+
+
+@pytest.mark.asyncio
+async def test_request_multipart():
+    scope, body = ScopeBuilder(
+        path='/',
+        method='POST',
+        data={
+            'foo': 'bar',
+            'multi': ['a', 'b'],
+            'upload': (BytesIO(b'x' * 5000), 'test.txt')
+        }
+    ).get_data()
+    request = _chunked_request(scope, body, 7)
+    request.multipart_spool_size = 1024
+
+    params = await request.body_params
+    files = await request.files
+    assert params == {'foo': 'bar', 'multi': ['a', 'b']}
+    upload = files.upload
+    assert upload.filename == 'test.txt'
+    assert upload.name == 'upload'
+    assert upload.stream.read() == b'x' * 5000
+    assert upload.stream._rolled
+
+
+@pytest.mark.asyncio
+async def test_request_multipart_limits():
+    scope, body = ScopeBuilder(
+        path='/',
+        method='POST',
+        data={'upload': (BytesIO(b'x' * 5000), 'test.txt')}
+    ).get_data()
+    request = _chunked_request(scope, body, 1024)
+    request.multipart_max_file_size = 1024
+
+    with pytest.raises(HTTP) as exc:
+        await request.files
+    assert exc.value.status_code == 413
+
+    request = _chunked_request(scope, body, 1024)
+    request.max_content_length = 2048
+    with pytest.raises(HTTP) as exc:
+        await request.files
+    assert exc.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_request_stream():
+    scope, _ = ScopeBuilder(path='/', method='POST').get_data()
+    request = _chunked_request(scope, b'x' * 100, 30)
+    chunks = [chunk async for chunk in request.stream()]
+    assert [len(chunk) for chunk in chunks] == [30, 30, 30, 10]
+    with pytest.raises(RuntimeError):
+        await request.body
+
+    request = _chunked_request(scope, b'x' * 100, 30)
+    assert await request.body == b'x' * 100
+    assert [chunk async for chunk in request.stream()] == [b'x' * 100]
+
+    request = _chunked_request(scope, b'x' * 100, 30)
+    request.max_content_length = 50
+    with pytest.raises(HTTP) as exc:
+        await request.body
+    assert exc.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_request_min_transfer_rate():
+    scope, _ = ScopeBuilder(path='/', method='POST').get_data()
+    chunks = [b'x' * 10] * 5
+
+    async def receive():
+        await asyncio.sleep(0.05)
+        chunk = chunks.pop(0)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+    request = Request(scope, receive, None, min_transfer_rate=100)
+    request.min_transfer_rate_grace = 0.01
+    with pytest.raises(HTTP) as exc:
+        await request.body
+    assert exc.value.status_code == 408
+
+
+@pytest.mark.asyncio
+async def test_request_body_timeout():
+    scope, _ = ScopeBuilder(path='/', method='POST').get_data()
+
+    def _request():
+        chunks = [b'x' * 10] * 5
+
+        async def receive():
+            await asyncio.sleep(0.03)
+            chunk = chunks.pop(0)
+            return {
+                'type': 'http.request',
+                'body': chunk,
+                'more_body': bool(chunks)
+            }
+        return Request(scope, receive, None, body_timeout=0.1)
+
+    received = []
+    with pytest.raises(HTTP) as exc:
+        async for chunk in _request().stream():
+            received.append(chunk)
+    assert exc.value.status_code == 408
+    assert 0 < len(received) < 5
+
+
+def test_parse_header():
+    assert parse_header('text/html; charset=UTF-8') == (
+        'text/html', {'charset': 'UTF-8'}
+    )
+    assert parse_header('multipart/form-data; boundary="a;b\\"c"') == (
+        'multipart/form-data', {'boundary': 'a;b"c'}
+    )
+    assert parse_header('') == ('', {})